@@ -8,13 +8,19 @@ const IPCamera = () => {
     const [rtspUrl, setRtspUrl] = useState('');
     const [motionDetection, setMotionDetection] = useState(false);
     const [nightMode, setNightMode] = useState(false);
-    const canvasRef = useRef(null);
+    const [motionGate, setMotionGate] = useState(false);
+    const [recordClips, setRecordClips] = useState(false);
+    // Несколько камер: по canvas на camera_id из сообщений анализатора
+    const [cameraIds, setCameraIds] = useState([]);
+    const canvasRefs = useRef({});
     const logsContainerRef = useRef(null);
     
     // Состояние для отображения информации об обнаруженных объектах, движении и сцене
-    const [detectedObjects, setDetectedObjects] = useState([]);
+    const [detectedByCamera, setDetectedByCamera] = useState({});
     const [hasMotion, setHasMotion] = useState(false);
     const [sceneType, setSceneType] = useState(null); // 'day' | 'night' | null
+    // Метрики здоровья потоков (status: 'health') по camera_id
+    const [cameraHealth, setCameraHealth] = useState({});
 
     const models = [
         { id: 'all.pt', name: 'Модель всех объектов' },
@@ -25,8 +31,20 @@ const IPCamera = () => {
         setLogs(prevLogs => [...prevLogs, { message, type, timestamp: new Date().toISOString() }]);
     };
 
-    const drawFrame = (imageData) => {
-        const canvas = canvasRef.current;
+    // Адреса камер - по одному в строке
+    const rtspUrls = rtspUrl.split('\n').map(url => url.trim()).filter(Boolean);
+
+    const setDetectedObjects = (cameraId, objects) => {
+        setDetectedByCamera(prev => ({ ...prev, [cameraId]: objects }));
+    };
+
+    // Объекты всех камер; при нескольких камерах - с префиксом camera_id
+    const detectedObjects = Object.entries(detectedByCamera).flatMap(([cameraId, objects]) =>
+        cameraIds.length > 1 ? objects.map(obj => `${cameraId}: ${obj}`) : objects
+    );
+
+    const drawFrame = (imageData, cameraId) => {
+        const canvas = canvasRefs.current[cameraId];
         if (!canvas) return;
 
         const ctx = canvas.getContext('2d');
@@ -42,7 +60,7 @@ const IPCamera = () => {
     };
 
     const startAnalysis = async () => {
-        if (!rtspUrl) {
+        if (!rtspUrls.length) {
             addLog('Пожалуйста, введите RTSP URL', 'error');
             return;
         }
@@ -52,17 +70,21 @@ const IPCamera = () => {
         addLog(`Параметры: ночной режим = ${nightMode}, датчик движения = ${motionDetection}`);
         
         // Сбрасываем состояние при новом запуске
-        setDetectedObjects([]);
+        setDetectedByCamera({});
+        setCameraIds([]);
+        setCameraHealth({});
         setHasMotion(false);
         setSceneType(null);
 
         try {
             const params = new URLSearchParams({
                 model: selectedModel,
-                rtspUrl: rtspUrl,
                 motionDetection: motionDetection.toString(),
-                nightMode: nightMode.toString()
+                nightMode: nightMode.toString(),
+                motionGate: motionGate.toString(),
+                clips: recordClips.toString()
             });
+            rtspUrls.forEach(url => params.append('rtspUrl', url));
             
             const url = `/api/start-ip-camera?${params.toString()}`;
             console.log('Requesting URL:', url);
@@ -105,13 +127,18 @@ const IPCamera = () => {
                             const jsonStr = line.slice(6); // Убираем "data: " из начала строки
                             const data = JSON.parse(jsonStr);
                             console.log('Parsed data:', data);
+
+                            const cameraId = data.camera_id || 'cam1';
+                            if (data.camera_id) {
+                                setCameraIds(prev => prev.includes(cameraId) ? prev : [...prev, cameraId]);
+                            }
                             
                             switch (data.status) {
                                 case 'info':
-                                    addLog(data.message);
+                                    addLog(data.camera_id ? `[${data.camera_id}] ${data.message}` : data.message);
                                     // Используем структурированные данные из JSON, если они есть
                                     if (data.detections && Array.isArray(data.detections)) {
-                                        setDetectedObjects(data.detections);
+                                        setDetectedObjects(cameraId, data.detections);
                                     } else {
                                         // Fallback: парсим из текста
                                         const msg = data.message || '';
@@ -119,10 +146,10 @@ const IPCamera = () => {
                                             const match = msg.match(/Обнаружено (\d+) объектов?: (.+)/);
                                             if (match) {
                                                 const objects = match[2].split(', ').map(obj => obj.trim());
-                                                setDetectedObjects(objects);
+                                                setDetectedObjects(cameraId, objects);
                                             }
                                         } else if (msg.includes('Объекты не обнаружены')) {
-                                            setDetectedObjects([]);
+                                            setDetectedObjects(cameraId, []);
                                         }
                                     }
                                     
@@ -159,17 +186,20 @@ const IPCamera = () => {
                                     }
                                     break;
                                 case 'warning':
-                                    addLog(data.message, 'warning');
+                                    addLog(data.camera_id ? `[${data.camera_id}] ${data.message}` : data.message, 'warning');
                                     // Проверяем движение в предупреждениях
                                     if (data.message.includes('движение')) {
                                         setHasMotion(true);
                                     }
                                     break;
                                 case 'error':
-                                    addLog(data.message, 'error');
+                                    addLog(data.camera_id ? `[${data.camera_id}] ${data.message}` : data.message, 'error');
                                     break;
                                 case 'frame':
-                                    drawFrame(data.image);
+                                    drawFrame(data.image, cameraId);
+                                    break;
+                                case 'health':
+                                    setCameraHealth(prev => ({ ...prev, [cameraId]: data }));
                                     break;
                                 default:
                                     console.log('Unknown status:', data.status);
@@ -227,8 +257,16 @@ const IPCamera = () => {
 
     return (
         <div className="ip-camera-container">
-            <div className="ip-camera-video-container">
-                <canvas ref={canvasRef} className="ip-camera-feed" />
+            <div className={`ip-camera-grid ${cameraIds.length > 1 ? 'ip-camera-grid-multi' : ''}`}>
+                {(cameraIds.length ? cameraIds : ['cam1']).map(cameraId => (
+                    <div key={cameraId} className="ip-camera-video-container">
+                        <canvas
+                            ref={(el) => { canvasRefs.current[cameraId] = el; }}
+                            className="ip-camera-feed"
+                        />
+                        {cameraIds.length > 1 && <span className="ip-camera-label">{cameraId}</span>}
+                    </div>
+                ))}
             </div>
 
             <div className="ip-camera-controls">
@@ -248,9 +286,9 @@ const IPCamera = () => {
                 </div>
 
                 <div className="ip-camera-rtsp-input">
-                    <label>RTSP URL:</label>
-                    <input
-                        type="text"
+                    <label>RTSP URL (по одному в строке):</label>
+                    <textarea
+                        rows={Math.min(Math.max(rtspUrls.length, 1), 6)}
                         value={rtspUrl}
                         onChange={(e) => setRtspUrl(e.target.value)}
                         placeholder="rtsp://..."
@@ -278,13 +316,33 @@ const IPCamera = () => {
                         />
                         Ночной режим
                     </label>
+
+                    <label className="ip-camera-mode-checkbox">
+                        <input
+                            type="checkbox"
+                            checked={motionGate}
+                            onChange={(e) => setMotionGate(e.target.checked)}
+                            disabled={isProcessing}
+                        />
+                        Анализ только при движении
+                    </label>
+
+                    <label className="ip-camera-mode-checkbox">
+                        <input
+                            type="checkbox"
+                            checked={recordClips}
+                            onChange={(e) => setRecordClips(e.target.checked)}
+                            disabled={isProcessing}
+                        />
+                        Ролики по тревоге
+                    </label>
                 </div>
 
                 <div className="ip-camera-buttons">
                     <button
                         className="ip-camera-start-button"
                         onClick={startAnalysis}
-                        disabled={isProcessing || !rtspUrl}
+                        disabled={isProcessing || !rtspUrls.length}
                     >
                         Начать анализ
                     </button>
@@ -326,6 +384,22 @@ const IPCamera = () => {
                             </div>
                         </div>
                         
+                        {Object.keys(cameraHealth).length > 0 && (
+                            <div className="ip-camera-status-item">
+                                <div className="ip-camera-status-label">Потоки:</div>
+                                <div className="ip-camera-status-value">
+                                    {Object.entries(cameraHealth).map(([cameraId, health]) => (
+                                        <div key={cameraId} className={`ip-camera-health ip-camera-health-${health.state}`}>
+                                            {cameraId}: {health.state === 'online' ? `${health.fps_in} fps` : health.state}
+                                            {health.reconnects > 0 && `, переподключений ${health.reconnects}`}
+                                            {health.seconds_since_frame > 5 && `, нет кадров ${health.seconds_since_frame} сек`}
+                                            {health.gated > 0 && `, модель на ${health.inferred} из ${health.inferred + health.gated} кадров`}
+                                        </div>
+                                    ))}
+                                </div>
+                            </div>
+                        )}
+
                         <div className="ip-camera-status-item">
                             <div className="ip-camera-status-label">Тип сцены:</div>
                             <div className={`ip-camera-status-value ip-camera-scene-${sceneType || 'unknown'}`}>
@@ -502,9 +502,8 @@ function MediaUpload() {
                 // Определяем путь к изображению
                 let imagePath;
                 if (hasNightMotion) {
-                  imagePath = isViolence ?
-                    `/result/detect/predict_violence/${baseName}_night_motion.jpg` :
-                    `/result/detect/predict/${baseName}_night_motion.jpg`;
+                  // Кадр лежит рядом с видео (у каждого запуска своя директория)
+                  imagePath = path.replace(/[^/]+$/, `${baseName}_night_motion.jpg`);
                 } else {
                   const suffix = isViolence ? '_violence' : '_dangerous_object';
                   imagePath = path.replace(/\.[^/.]+$/, `${suffix}.jpg`);
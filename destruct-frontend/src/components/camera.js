@@ -3,6 +3,24 @@ import "../styles/Camera.css";
 
 const baseUrl = '/api';
 
+// Частота отправки кадров подстраивается под скорость обработки на сервере
+const DEFAULT_SEND_INTERVAL_MS = 200;
+const MAX_SEND_INTERVAL_MS = 2000;
+// Не отправлять новый кадр, пока предыдущие не ушли в сеть
+const MAX_BUFFERED_BYTES = 512 * 1024;
+
+// Бинарный кадр от сервера: [u32 длина заголовка][u32 длина JPEG][заголовок JSON][JPEG]
+const textDecoder = new TextDecoder();
+
+function parseBinaryFrame(buffer) {
+  const view = new DataView(buffer);
+  const headerLength = view.getUint32(0);
+  const payloadLength = view.getUint32(4);
+  const header = JSON.parse(textDecoder.decode(new Uint8Array(buffer, 8, headerLength)));
+  const jpeg = new Blob([new Uint8Array(buffer, 8 + headerLength, payloadLength)], { type: 'image/jpeg' });
+  return { header, jpeg };
+}
+
 function Camera() {
   const [cameras, setCameras] = useState([]);
   const [selectedCamera, setSelectedCamera] = useState('');
@@ -15,6 +33,7 @@ function Camera() {
   const canvasRef = useRef(null);
   const wsRef = useRef(null);
   const captureTimerRef = useRef(null);
+  const sendIntervalRef = useRef(DEFAULT_SEND_INTERVAL_MS);
 
   // Список доступных моделей
   const availableModels = [
@@ -140,23 +159,47 @@ function Camera() {
     img.src = `data:image/jpeg;base64,${imageData}`;
   };
 
+  // Отрисовка JPEG из бинарного кадра (декодирование вне основного потока)
+  const drawFrameBlob = async (blob) => {
+    if (!canvasRef.current) return;
+
+    const canvas = canvasRef.current;
+    const ctx = canvas.getContext('2d');
+    const bitmap = await createImageBitmap(blob);
+    canvas.width = bitmap.width;
+    canvas.height = bitmap.height;
+    ctx.drawImage(bitmap, 0, 0);
+    bitmap.close();
+  };
+
   const startWebSocketStream = () => {
     // ws://localhost/api/ws/camera (nginx проксирует на backend /ws/camera)
     const wsProtocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
     const wsUrl = `${wsProtocol}://${window.location.host}${baseUrl}/ws/camera`;
 
     const ws = new WebSocket(wsUrl);
+    // Кадры туда и обратно идут бинарными сообщениями (JPEG без base64)
+    ws.binaryType = 'arraybuffer';
     wsRef.current = ws;
 
     ws.onopen = () => {
       setLogs(prev => [...prev, { message: 'WebSocket подключен', type: 'info' }]);
-      ws.send(JSON.stringify({ type: 'init', model: selectedModel }));
-
-      // Начинаем слать кадры (примерно 5 FPS)
-      captureTimerRef.current = setInterval(() => {
+      ws.send(JSON.stringify({ type: 'init', model: selectedModel, binary: true }));
+
+      // Начинаем слать кадры (примерно 5 FPS, дальше - по статистике сервера)
+      sendIntervalRef.current = DEFAULT_SEND_INTERVAL_MS;
+      const scheduleCapture = () => {
+        captureTimerRef.current = setTimeout(() => {
+          captureFrame();
+          if (wsRef.current === ws && ws.readyState === WebSocket.OPEN) scheduleCapture();
+        }, sendIntervalRef.current);
+      };
+
+      const captureFrame = () => {
         if (!videoRef.current || !canvasRef.current) return;
         const video = videoRef.current;
         if (video.readyState < 2) return;
+        if (ws.bufferedAmount > MAX_BUFFERED_BYTES) return;
 
         const capCanvas = document.createElement('canvas');
         const w = video.videoWidth || 640;
@@ -165,18 +208,39 @@ function Camera() {
         capCanvas.height = h;
         const ctx = capCanvas.getContext('2d');
         ctx.drawImage(video, 0, 0, w, h);
-        const dataUrl = capCanvas.toDataURL('image/jpeg', 0.7);
-        ws.send(JSON.stringify({ type: 'frame', image: dataUrl }));
-      }, 200);
+        capCanvas.toBlob((blob) => {
+          if (blob && ws.readyState === WebSocket.OPEN) ws.send(blob);
+        }, 'image/jpeg', 0.7);
+      };
+
+      scheduleCapture();
     };
 
     ws.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        try {
+          const { jpeg } = parseBinaryFrame(event.data);
+          drawFrameBlob(jpeg).catch((e) => {
+            setLogs(prev => [...prev, { message: `Frame decode error: ${e.message}`, type: 'error' }]);
+          });
+        } catch (e) {
+          setLogs(prev => [...prev, { message: `WS frame parse error: ${e.message}`, type: 'error' }]);
+        }
+        return;
+      }
+
       try {
         const data = JSON.parse(event.data);
         if (data.status === 'frame' && data.image) {
           drawFrame(data.image);
           return;
         }
+        if (data.status === 'stats') {
+          // Сервер не успевает - реже шлем кадры; успевает - возвращаемся к 5 FPS
+          const interval = Math.max(DEFAULT_SEND_INTERVAL_MS, data.suggested_interval_ms || 0);
+          sendIntervalRef.current = Math.min(MAX_SEND_INTERVAL_MS, interval);
+          return;
+        }
         if (data.status && data.message) {
           setLogs(prev => [...prev, { message: data.message, type: data.status }]);
         }
@@ -196,7 +260,7 @@ function Camera() {
 
   const stopWebSocketStream = () => {
     if (captureTimerRef.current) {
-      clearInterval(captureTimerRef.current);
+      clearTimeout(captureTimerRef.current);
       captureTimerRef.current = null;
     }
     if (wsRef.current) {
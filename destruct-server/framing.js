@@ -0,0 +1,76 @@
+// Бинарные кадры канала Node <-> Python (см. yolo11/framing.py):
+// [u32 длина заголовка][u32 длина данных][заголовок JSON utf-8][данные, например JPEG]
+// Числа - big-endian. Кадр без данных - служебное сообщение (info / error / stats).
+const PREFIX_SIZE = 8;
+const MAX_HEADER_SIZE = 1 << 20;
+const MAX_PAYLOAD_SIZE = 64 << 20;
+
+function encodeFrame(header, payload = null) {
+  const headerBuffer = Buffer.from(JSON.stringify(header), 'utf8');
+  const payloadLength = payload ? payload.length : 0;
+  const prefix = Buffer.allocUnsafe(PREFIX_SIZE);
+  prefix.writeUInt32BE(headerBuffer.length, 0);
+  prefix.writeUInt32BE(payloadLength, 4);
+  return payloadLength
+    ? Buffer.concat([prefix, headerBuffer, payload], PREFIX_SIZE + headerBuffer.length + payloadLength)
+    : Buffer.concat([prefix, headerBuffer]);
+}
+
+// Собирает кадры из произвольно нарезанных кусков stdout
+class FrameDecoder {
+  constructor() {
+    this.chunks = [];
+    this.length = 0;
+  }
+
+  // Возвращает массив { header, payload, raw } для всех полностью полученных кадров.
+  // raw - исходные байты кадра, их можно переслать дальше без повторной сериализации
+  push(chunk) {
+    this.chunks.push(chunk);
+    this.length += chunk.length;
+
+    const frames = [];
+    while (this.length >= PREFIX_SIZE) {
+      const buffer = this._peek(PREFIX_SIZE);
+      const headerLength = buffer.readUInt32BE(0);
+      const payloadLength = buffer.readUInt32BE(4);
+      if (headerLength > MAX_HEADER_SIZE || payloadLength > MAX_PAYLOAD_SIZE) {
+        throw new Error(`Frame too large: header ${headerLength}, payload ${payloadLength}`);
+      }
+
+      const frameLength = PREFIX_SIZE + headerLength + payloadLength;
+      if (this.length < frameLength) break;
+
+      const raw = this._take(frameLength);
+      const headerEnd = PREFIX_SIZE + headerLength;
+      frames.push({
+        header: headerLength ? JSON.parse(raw.toString('utf8', PREFIX_SIZE, headerEnd)) : {},
+        payload: raw.subarray(headerEnd),
+        raw
+      });
+    }
+    return frames;
+  }
+
+  // Склеивает куски только когда нужен непрерывный диапазон
+  _peek(size) {
+    if (this.chunks[0].length < size) {
+      this.chunks = [Buffer.concat(this.chunks, this.length)];
+    }
+    return this.chunks[0];
+  }
+
+  _take(size) {
+    const head = this._peek(size);
+    const frame = head.subarray(0, size);
+    if (head.length === size) {
+      this.chunks.shift();
+    } else {
+      this.chunks[0] = head.subarray(size);
+    }
+    this.length -= size;
+    return frame;
+  }
+}
+
+module.exports = { encodeFrame, FrameDecoder };
@@ -7,6 +7,7 @@ const multer = require('multer');
 const { execFile, spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
+const { encodeFrame, FrameDecoder } = require('./framing');
 
 const app = express();
 app.use(compression());
@@ -46,119 +47,197 @@ let ipCameraProcess = null;
 // ----------------------------
 const wss = new WebSocket.Server({ server: httpServer, path: '/ws/camera' });
 
-wss.on('connection', (ws) => {
-  let py = null;
-  let pyStdoutBuffer = '';
-  let currentModel = 'all.pt';
+// Общий сервис инференса камеры (yolo11/camera_service.py): один процесс и одна
+// копия каждой модели на все WebSocket сессии. Кадры всех сессий идут бинарными
+// кадрами framing.js с id сессии в заголовке, ответы возвращаются по этому id.
+const CAMERA_MAX_BATCH = process.env.CAMERA_MAX_BATCH || '4';
+let cameraService = null;
+let cameraSessionCounter = 0;
+// id сессии -> { model, onMessage(frame) }
+const cameraSessions = new Map();
 
-  const startPython = (model) => {
-    if (py) return;
-    currentModel = model || 'all.pt';
-    const scriptPath = path.join(__dirname, 'yolo11', 'camera_analysis.py');
-    // camera_analysis.py сам резолвит модель по имени файла в папке models/
-    py = spawn('python3', [scriptPath, currentModel, '--stdin']);
-    addProcess(py);
-
-    py.stdout.on('data', (data) => {
-      pyStdoutBuffer += data.toString();
-      const lines = pyStdoutBuffer.split('\n');
-      pyStdoutBuffer = lines.pop() || '';
-
-      for (const rawLine of lines) {
-        const line = rawLine.trim();
-        if (!line) continue;
-
-        // camera_analysis.py печатает JSON по строкам
-        if (!line.startsWith('{') || !line.endsWith('}')) {
-          ws.send(JSON.stringify({ status: 'info', message: line }));
-          continue;
-        }
+function getCameraService() {
+  if (cameraService) return cameraService;
 
-        try {
-          const msg = JSON.parse(line);
-          ws.send(JSON.stringify(msg));
-        } catch (e) {
-          ws.send(JSON.stringify({ status: 'error', message: `Bad JSON from python: ${e.message}` }));
-        }
+  const scriptPath = path.join(__dirname, 'yolo11', 'camera_service.py');
+  const proc = spawn('python3', [scriptPath, '--max-batch', CAMERA_MAX_BATCH]);
+  const service = { proc, decoder: new FrameDecoder() };
+  cameraService = service;
+
+  // Добавляем процесс в отслеживание (остановка сервера завершает и сервис)
+  addProcess(proc);
+
+  proc.stdout.on('data', (data) => {
+    let frames;
+    try {
+      frames = service.decoder.push(data);
+    } catch (e) {
+      console.error('Camera service framing error:', e);
+      proc.kill('SIGTERM');
+      return;
+    }
+
+    for (const frame of frames) {
+      const sessionId = frame.header.session;
+      if (sessionId !== undefined) {
+        const session = cameraSessions.get(sessionId);
+        if (session) session.onMessage(frame);
+        continue;
       }
-    });
 
-    py.stderr.on('data', (data) => {
-      ws.send(JSON.stringify({ status: 'error', message: data.toString() }));
-    });
+      if (frame.header.status === 'service_ready') {
+        console.log('Camera service ready:', frame.header);
+        continue;
+      }
+
+      // Сообщения сервиса без сессии (например, ошибка загрузки модели) - всем клиентам
+      cameraSessions.forEach(session => session.onMessage(frame));
+    }
+  });
+
+  proc.stderr.on('data', (data) => {
+    console.error('Camera service:', data.toString());
+  });
+
+  proc.stdin.on('error', (err) => {
+    // EPIPE - сервис уже завершился, сессии узнают об этом в обработчике close
+    if (err.code !== 'EPIPE') {
+      console.error('Camera service stdin error:', err);
+    }
+  });
+
+  const handleExit = (reason) => {
+    if (cameraService !== service) return;
+    cameraService = null;
+    const frame = {
+      header: { status: 'error', message: `Сервис анализа камеры завершился (${reason}), перезапуск со следующим кадром` },
+      payload: Buffer.alloc(0)
+    };
+    cameraSessions.forEach(session => session.onMessage(frame));
+  };
+
+  proc.on('close', (code) => {
+    console.log('Camera service closed with code:', code);
+    handleExit(`code ${code}`);
+  });
+
+  proc.on('error', (err) => {
+    console.error('Camera service process error:', err);
+    handleExit(err.message);
+  });
+
+  // После перезапуска сервиса заново открываем уже подключенные сессии
+  cameraSessions.forEach((session, id) => {
+    proc.stdin.write(encodeFrame({ type: 'open', session: id, model: session.model }));
+  });
+
+  return service;
+}
+
+function writeToCameraService(data) {
+  const service = getCameraService();
+  if (!service.proc.stdin.writable) return false;
+  service.proc.stdin.write(data);
+  return true;
+}
 
-    py.stdin.on('error', (err) => {
-      // Игнорируем EPIPE - это нормально когда процесс завершается
-      if (err.code !== 'EPIPE') {
-        ws.send(JSON.stringify({ status: 'error', message: `Stdin error: ${err.message}` }));
+wss.on('connection', (ws) => {
+  const sessionId = ++cameraSessionCounter;
+  // binary: кадры идут бинарными WS сообщениями (JPEG без base64 и JSON в обе стороны)
+  let binaryMode = false;
+  let opened = false;
+
+  const sendToClient = (data) => {
+    if (ws.readyState === WebSocket.OPEN) ws.send(data);
+  };
+
+  const session = {
+    model: 'all.pt',
+    onMessage: (frame) => {
+      if (!frame.payload.length) {
+        // Служебные сообщения остаются текстовыми JSON
+        sendToClient(JSON.stringify(frame.header));
+      } else if (binaryMode) {
+        // Кадр с JPEG пересылается браузеру как есть, в той же разметке
+        sendToClient(frame.raw);
+      } else {
+        sendToClient(JSON.stringify({ ...frame.header, image: frame.payload.toString('base64') }));
       }
-    });
+    }
+  };
 
-    py.on('close', () => {
-      py = null;
-    });
+  const openSession = (model) => {
+    if (opened) return;
+    session.model = model || 'all.pt';
+    opened = true;
+    // Сессия попадает в карту после записи: при запуске сервиса он переоткрывает только старые сессии
+    writeToCameraService(encodeFrame({ type: 'open', session: sessionId, model: session.model }));
+    cameraSessions.set(sessionId, session);
+  };
 
-    py.on('error', (err) => {
-      ws.send(JSON.stringify({ status: 'error', message: `Python process error: ${err.message}` }));
-      py = null;
-    });
+  const closeSession = () => {
+    if (!opened) return;
+    opened = false;
+    cameraSessions.delete(sessionId);
+    if (cameraService && cameraService.proc.stdin.writable) {
+      cameraService.proc.stdin.write(encodeFrame({ type: 'close', session: sessionId }));
+    }
+  };
+
+  const sendFrame = (jpeg) => {
+    if (!opened) openSession(session.model);
+    if (!writeToCameraService(encodeFrame({ type: 'frame', session: sessionId }, jpeg))) {
+      sendToClient(JSON.stringify({ status: 'error', message: 'Сервис анализа камеры недоступен' }));
+    }
   };
 
-  ws.on('message', (raw) => {
+  ws.on('message', (raw, isBinary) => {
+    // Бинарное сообщение - JPEG кадр без обертки
+    if (isBinary) {
+      if (!binaryMode) {
+        sendToClient(JSON.stringify({ status: 'error', message: 'Binary frames require init with binary: true' }));
+        return;
+      }
+      sendFrame(raw);
+      return;
+    }
+
     let msg;
     try {
       msg = JSON.parse(raw.toString());
     } catch (_) {
-      ws.send(JSON.stringify({ status: 'error', message: 'Invalid JSON message' }));
+      sendToClient(JSON.stringify({ status: 'error', message: 'Invalid JSON message' }));
       return;
     }
 
     if (msg.type === 'init') {
-      startPython(msg.model);
-      ws.send(JSON.stringify({ status: 'info', message: `WS camera session started (model=${currentModel})` }));
+      if (!opened) binaryMode = Boolean(msg.binary);
+      openSession(msg.model);
+      sendToClient(JSON.stringify({
+        status: 'info',
+        message: `WS camera session ${sessionId} started (model=${session.model}, transport=${binaryMode ? 'binary' : 'json'})`
+      }));
       return;
     }
 
     if (msg.type === 'frame') {
-      if (!py) startPython(currentModel);
-      if (!py || !py.stdin.writable) return;
-
       // msg.image может быть dataURL или base64
       let image = msg.image || '';
       if (image.startsWith('data:image')) {
         const comma = image.indexOf(',');
         if (comma !== -1) image = image.slice(comma + 1);
       }
-
-      try {
-        py.stdin.write(JSON.stringify({ image }) + '\n');
-      } catch (err) {
-        // EPIPE возникает когда python процесс уже закрыт
-        if (err.code === 'EPIPE') {
-          py = null;
-          ws.send(JSON.stringify({ status: 'error', message: 'Python процесс завершился' }));
-        } else {
-          ws.send(JSON.stringify({ status: 'error', message: `Ошибка записи в stdin: ${err.message}` }));
-        }
-      }
+      if (image) sendFrame(Buffer.from(image, 'base64'));
       return;
     }
 
     if (msg.type === 'stop') {
-      if (py) {
-        try { py.kill('SIGTERM'); } catch (_) { }
-        py = null;
-      }
+      closeSession();
       ws.close();
     }
   });
 
-  ws.on('close', () => {
-    if (py) {
-      try { py.kill('SIGTERM'); } catch (_) { }
-      py = null;
-    }
-  });
+  ws.on('close', closeSession);
 });
 
 // Статика с кэшированием (результаты и загрузки редко меняются по одному URL)
@@ -184,6 +263,14 @@ function ensureDirectoryExists(dirPath) {
   }
 }
 
+// Уведомления model_backend.py о выбранной модели (INT8 вариант, откат на fp32/pytorch)
+// идут в stderr, но ошибками не являются
+const MODEL_BACKEND_NOTICE = 'Model backend:';
+
+function isModelBackendNotice(message) {
+  return message.trim().startsWith(MODEL_BACKEND_NOTICE);
+}
+
 // Функция для записи логов в файл
 function writeLogToFile(logPath, message) {
   // Создаем директорию для логов, если она не существует
@@ -220,7 +307,24 @@ function findLatestPredictDirs() {
   }
 }
 
-// Функция для очистки старых директорий
+// Каждый запуск анализа пишет в свои директории (predict_<id>, predict_violence_<id>,
+// emotions_<id>): задачи пула воркеров идут параллельно, и скрипты очищают
+// свою выходную директорию при старте - общие директории затирали бы чужие результаты
+const activeRuns = new Set();
+
+function createRunId() {
+  return `${Date.now().toString(36)}${Math.random().toString(36).slice(2, 6)}`;
+}
+
+function runDirs(runId) {
+  return {
+    predict: `predict_${runId}`,
+    violence: `predict_violence_${runId}`,
+    emotions: `emotions_${runId}`
+  };
+}
+
+// Функция для очистки старых директорий (директории идущих запусков не трогаем)
 function cleanupOldDirectories() {
   const detectDir = path.join(__dirname, 'runs', 'detect');
   if (!fs.existsSync(detectDir)) {
@@ -229,7 +333,10 @@ function cleanupOldDirectories() {
 
   const dirs = fs.readdirSync(detectDir);
   dirs.forEach(dir => {
-    if (dir.startsWith('predict') || dir.startsWith('predict_violence')) {
+    if (Array.from(activeRuns).some(runId => dir.endsWith(`_${runId}`))) {
+      return;
+    }
+    if (dir.startsWith('predict') || dir.startsWith('emotions')) {
       const dirPath = path.join(detectDir, dir);
       if (fs.existsSync(dirPath)) {
         fs.rmSync(dirPath, { recursive: true, force: true });
@@ -278,10 +385,28 @@ app.get('/run-python', async (req, res) => {
   // Сбрасываем флаг остановки при новом запуске
   isStopping = false;
 
+  const runId = createRunId();
+  const dirs = runDirs(runId);
+  const fileName = path.basename(filePath);
+  const detectResultPaths = [
+    `/result/detect/${dirs.predict}/${fileName}`,
+    `/result/detect/${dirs.violence}/${fileName}`
+  ];
+
   res.setHeader('Content-Type', 'text/event-stream');
   res.setHeader('Cache-Control', 'no-cache');
   res.setHeader('Connection', 'keep-alive');
 
+  // Задачи воркеров этого запроса: если клиент ушел до конца анализа,
+  // отменяются только они, а не задачи других пользователей
+  const requestJobs = new Set();
+  res.on('close', () => {
+    if (!res.writableEnded) {
+      requestJobs.forEach(job => cancelJob(job));
+    }
+    activeRuns.delete(runId);
+  });
+
   const sendSSE = (data) => {
     try {
       // Убеждаемся, что все строки в data правильно экранированы
@@ -299,52 +424,34 @@ app.get('/run-python', async (req, res) => {
   try {
     // Очищаем старые директории перед запуском
     cleanupOldDirectories();
+    activeRuns.add(runId);
 
-    // Запускаем модели последовательно
-    const allModelResult = await runModel('all.pt', filePath, sendSSE, {
+    // Обе модели работают за один проход: каждый кадр декодируется один раз
+    const modelResult = await runModel(['all.pt', 'violence.pt'], filePath, sendSSE, {
       motionDetection,
       nightMode,
-      quickSearch
+      quickSearch,
+      runId,
+      jobs: requestJobs
     });
 
-    // Проверяем флаг остановки перед запуском второй модели
+    // Проверяем флаг остановки перед отправкой результатов
     if (isStopping) {
       sendSSE({
         status: 'complete',
         message: 'Обработка остановлена',
-        resultPaths: [`/result/detect/predict/${path.basename(filePath)}`]
+        resultPaths: detectResultPaths
       });
       res.end();
       return;
     }
 
     // Если в режиме быстрого поиска нашли опасный объект, прекращаем обработку
-    if (quickSearch && allModelResult.includes('WARNING: Dangerous objects detected')) {
+    if (quickSearch && modelResult.includes('WARNING: Dangerous objects detected')) {
       sendSSE({
         status: 'complete',
         message: 'Обработка остановлена: обнаружен опасный объект',
-        resultPaths: [`/result/detect/predict/${path.basename(filePath)}`]
-      });
-      res.end();
-      return;
-    }
-
-    // Запускаем модель violence.pt только если не было обнаружено опасных объектов
-    const violenceModelResult = await runModel('violence.pt', filePath, sendSSE, {
-      motionDetection,
-      nightMode,
-      quickSearch
-    });
-
-    // Проверяем флаг остановки перед отправкой результатов
-    if (isStopping) {
-      sendSSE({
-        status: 'complete',
-        message: 'Обработка остановлена',
-        resultPaths: [
-          `/result/detect/predict/${path.basename(filePath)}`,
-          `/result/detect/predict_violence/${path.basename(filePath)}`
-        ]
+        resultPaths: detectResultPaths
       });
       res.end();
       return;
@@ -353,18 +460,15 @@ app.get('/run-python', async (req, res) => {
     // Запускаем распознавание эмоций, если включено и не было обнаружено опасных объектов
     let emotionResult = null;
     if (emotionDetection) {
-      emotionResult = await runEmotionDetection(filePath, sendSSE);
+      emotionResult = await runEmotionDetection(filePath, sendSSE, { runId, jobs: requestJobs });
     }
 
     // Получаем пути к сохраненным результатам
-    const resultPaths = [
-      `/result/detect/predict/${path.basename(filePath)}`,
-      `/result/detect/predict_violence/${path.basename(filePath)}`
-    ];
+    const resultPaths = [...detectResultPaths];
 
     // Добавляем путь к результатам эмоций, если они есть
     if (emotionResult) {
-      resultPaths.push(`/result/detect/emotions/${path.basename(filePath)}`);
+      resultPaths.push(`/result/detect/${dirs.emotions}/${fileName}`);
     }
 
     console.log('Sending result paths:', resultPaths);
@@ -374,8 +478,7 @@ app.get('/run-python', async (req, res) => {
       status: 'complete',
       message: 'Обработка завершена',
       resultPaths: resultPaths,
-      allModelResult,
-      violenceModelResult,
+      modelResult,
       emotionResult
     });
 
@@ -539,6 +642,11 @@ app.get('/start-camera-analysis', async (req, res) => {
     });
 
     cameraProcess.stderr.on('data', (data) => {
+      if (isModelBackendNotice(data.toString())) {
+        console.log('Camera process:', data.toString());
+        sendSSE({ status: 'info', message: data.toString().trim() });
+        return;
+      }
       console.error('Camera process error:', data.toString());
       sendSSE({ status: 'error', message: data.toString() });
     });
@@ -582,19 +690,34 @@ app.get('/stop-camera-analysis', (req, res) => {
 // Обработчик запуска анализа IP-камеры
 app.get('/start-ip-camera', async (req, res) => {
   const model = req.query.model;
-  const rtspUrl = req.query.rtspUrl;
+  // Несколько камер: повторяющийся rtspUrl или адреса через перевод строки / запятую
+  const rtspUrls = [].concat(req.query.rtspUrl || [])
+    .flatMap((value) => String(value).split(/[\n,]/))
+    .map((value) => value.trim())
+    .filter(Boolean);
   const motionDetection = req.query.motionDetection === 'true';
   const nightMode = req.query.nightMode === 'true';
+  // Модель запускается только после движения в кадре (плюс редкий контрольный инференс)
+  const motionGate = req.query.motionGate === 'true';
+  // Ролики MP4 с pre/post-roll вокруг тревоги (помимо снимков)
+  const clips = req.query.clips === 'true';
+  // Области интереса по порядку камер: 'x1,y1,x2,y2' в долях кадра или 'full'
+  const rois = [].concat(req.query.roi || []).map((value) => String(value).trim() || 'full');
+  const imgsz = parseInt(req.query.imgsz, 10);
 
   console.log('Starting IP camera analysis with:', {
     model,
-    rtspUrl,
+    rtspUrls,
+    rois,
+    imgsz,
     motionDetection,
     nightMode,
+    motionGate,
+    clips,
     rawNightMode: req.query.nightMode
   });
 
-  if (!model || !rtspUrl) {
+  if (!model || !rtspUrls.length) {
     console.log('Missing required parameters');
     return res.status(400).send('Model and RTSP URL are required');
   }
@@ -653,10 +776,14 @@ app.get('/start-ip-camera', async (req, res) => {
     const args = [
       scriptPath,
       model,  // Передаем только имя модели, путь будет обработан в скрипте
-      rtspUrl,
-      motionDetection.toString(),
-      nightMode.toString()
+      ...rtspUrls.flatMap((url) => ['--rtsp-url', url])
     ];
+    if (motionDetection) args.push('--motion-detection');
+    if (nightMode) args.push('--night-mode');
+    if (motionGate) args.push('--motion-gate');
+    if (clips) args.push('--clips');
+    rois.forEach((roi) => args.push(`--roi=${roi}`));
+    if (imgsz > 0) args.push('--imgsz', String(imgsz));
 
     console.log('Starting Python script with args:', args);
 
@@ -701,6 +828,11 @@ app.get('/start-ip-camera', async (req, res) => {
 
     ipCameraProcess.stderr.on('data', (data) => {
       const errorMessage = data.toString();
+      if (isModelBackendNotice(errorMessage)) {
+        console.log('IP camera process:', errorMessage);
+        sendSSE({ status: 'info', message: errorMessage.trim() });
+        return;
+      }
       console.error('IP camera process error:', errorMessage);
       sendSSE({ status: 'error', message: errorMessage });
     });
@@ -766,12 +898,213 @@ function stopAllProcesses() {
   currentProcesses.clear();
 }
 
-async function runModel(modelName, filePath, sendSSE, options = {}) {
+// ----------------------------
+// Пулы долгоживущих Python воркеров: каждый воркер загружает модели один раз,
+// задачи передаются по stdin JSON-строками {"id", ...}, конец задачи - строка
+// {"status": "job_done", "id", "code", "elapsed"}. Воркер выполняет одну задачу
+// за раз; остальные ждут в очереди пула и уходят первому освободившемуся воркеру,
+// так что одно большое видео не держит анализы других пользователей
+// ----------------------------
+let jobCounter = 0;
+
+function spawnJobWorker(label, scriptArgs, onJobDone, onExit) {
+  const proc = spawn('python3', scriptArgs);
+  const worker = { label, proc, job: null, stdoutBuffer: '', cancelled: false, exited: false };
+
+  // Добавляем процесс в отслеживание (остановка сервера завершает и воркер)
+  addProcess(proc);
+
+  proc.stdout.on('data', (data) => {
+    worker.stdoutBuffer += data.toString();
+    const lines = worker.stdoutBuffer.split('\n');
+    worker.stdoutBuffer = lines.pop() || '';
+
+    for (const rawLine of lines) {
+      const line = rawLine.trim();
+      if (!line) continue;
+
+      // Воркер выполняет одну задачу за раз: весь вывод относится к ней
+      const job = worker.job;
+
+      if (line.startsWith('{"status": "job_done"')) {
+        let msg = {};
+        try {
+          msg = JSON.parse(line);
+        } catch (_) { }
+        worker.job = null;
+        if (job) {
+          console.log(`${label} job ${msg.id} done in ${msg.elapsed}s`);
+          onJobDone(worker, job, msg.code, msg);
+        }
+        continue;
+      }
+
+      if (line.startsWith('{"status": "worker_ready"')) {
+        console.log(`${label} worker ready:`, line);
+        continue;
+      }
+
+      if (job) {
+        job.onLine(line);
+      } else {
+        console.log(`${label} worker:`, line);
+      }
+    }
+  });
+
+  proc.stderr.on('data', (data) => {
+    if (worker.job) {
+      worker.job.onStderr(data.toString());
+    } else {
+      console.error(`${label} worker error:`, data.toString());
+    }
+  });
+
+  proc.stdin.on('error', (err) => {
+    // EPIPE - воркер уже завершился, задача будет завершена в обработчике close
+    if (err.code !== 'EPIPE') {
+      console.error(`${label} worker stdin error:`, err);
+    }
+  });
+
+  const handleExit = (code) => {
+    if (worker.exited) return;
+    worker.exited = true;
+    onExit(worker, code);
+  };
+
+  proc.on('close', (code) => {
+    console.log(`${label} worker closed with code:`, code);
+    handleExit(code);
+  });
+
+  proc.on('error', (err) => {
+    console.error(`${label} worker process error:`, err);
+    handleExit(1);
+  });
+
+  return worker;
+}
+
+function createWorkerPool(label, scriptArgs, size) {
+  const pool = { label, size: Math.max(1, size || 1), workers: [], queue: [] };
+
+  const finishJob = (job, code, msg = {}) => {
+    if (job.done) return;
+    job.done = true;
+    job.onDone(code, msg);
+  };
+
+  const spawnWorker = () => {
+    const worker = spawnJobWorker(label, scriptArgs, (_, job, code, msg) => {
+      finishJob(job, code, msg);
+      dispatch();
+    }, (exited, code) => {
+      pool.workers = pool.workers.filter(w => w !== exited);
+      const job = exited.job;
+      exited.job = null;
+      if (job) {
+        // Воркер остановлен ради отмены его задачи - это не ошибка
+        finishJob(job, exited.cancelled ? null : code, { cancelled: exited.cancelled });
+      }
+      // Задачи очереди еще не начинались - их возьмет новый воркер
+      dispatch();
+    });
+    pool.workers.push(worker);
+    return worker;
+  };
+
+  const dispatch = () => {
+    while (pool.queue.length > 0) {
+      let worker = pool.workers.find(w => !w.job && !w.cancelled);
+      if (!worker && pool.workers.length < pool.size) {
+        worker = spawnWorker();
+      }
+      if (!worker) return;
+      const job = pool.queue.shift();
+      job.worker = worker;
+      worker.job = job;
+      worker.proc.stdin.write(JSON.stringify({ id: job.id, ...job.payload }) + '\n');
+    }
+  };
+
+  // Прогрев: запускает все воркеры пула, чтобы первые задачи не ждали загрузки моделей
+  pool.start = () => {
+    while (pool.workers.length < pool.size) {
+      spawnWorker();
+    }
+  };
+
+  // Возвращает задачу; job.queuePosition - место в очереди пула (0 - уже выполняется)
+  pool.submit = (payload, handlers) => {
+    const job = { id: `job-${++jobCounter}`, pool, payload, worker: null, done: false, ...handlers };
+    pool.queue.push(job);
+    dispatch();
+    job.queuePosition = job.worker ? 0 : pool.queue.indexOf(job) + 1;
+    if (job.queuePosition > 0) {
+      console.log(`${label} job ${job.id} queued at position ${job.queuePosition}`);
+    }
+    return job;
+  };
+
+  // Отмена одной задачи: из очереди она просто убирается, а выполняющаяся
+  // останавливается вместе со своим воркером (остальные воркеры и задачи не трогаются)
+  pool.cancel = (job) => {
+    if (job.done) return;
+    const index = pool.queue.indexOf(job);
+    if (index >= 0) {
+      pool.queue.splice(index, 1);
+      finishJob(job, null, { cancelled: true });
+      return;
+    }
+    if (job.worker && job.worker.job === job) {
+      console.log(`${label} job ${job.id} cancelled, stopping its worker`);
+      job.worker.cancelled = true;
+      job.worker.proc.kill('SIGTERM');
+    }
+  };
+
+  return pool;
+}
+
+function cancelJob(job) {
+  job.pool.cancel(job);
+}
+
+// Воркеры детекции (yolo11/worker.py): задачи detect.py/quick_detect.py.
+// Каждый воркер держит свою копию моделей - память растет с размером пула
+const DETECT_WORKER_POOL = parseInt(process.env.DETECT_WORKER_POOL || '2', 10);
+const detectPool = createWorkerPool('Detect', [path.join(__dirname, 'yolo11', 'worker.py'), '--preload'],
+  DETECT_WORKER_POOL);
+
+function runDetectJob(script, args, handlers) {
+  return detectPool.submit({ script, args }, handlers);
+}
+
+// Воркеры эмоций (yolo11/emotion_detect.py --worker): TensorFlow, детектор лиц
+// и модель эмоций загружаются один раз, а не на каждую загрузку файла
+const EMOTION_WORKER_POOL = parseInt(process.env.EMOTION_WORKER_POOL || '1', 10);
+const emotionPool = createWorkerPool('Emotion', [path.join(__dirname, 'yolo11', 'emotion_detect.py'), '--worker'],
+  EMOTION_WORKER_POOL);
+
+function runEmotionJob(args, handlers) {
+  return emotionPool.submit({ args }, handlers);
+}
+
+// Сколько кадров видео отдавать модели за один батчевый прогон (--batch в detect.py)
+const DETECT_BATCH = process.env.DETECT_BATCH || '4';
+// Прореживание кадров длинных видео: целевая частота анализа и адаптивный режим (смена сцены/движение)
+const DETECT_ANALYSIS_FPS = process.env.DETECT_ANALYSIS_FPS || '';
+const DETECT_ADAPTIVE = process.env.DETECT_ADAPTIVE === 'true';
+// Сколько процессов параллельно обрабатывают одно видео (диапазоны кадров, --workers)
+const DETECT_WORKERS = process.env.DETECT_WORKERS || '1';
+
+async function runModel(modelNames, filePath, sendSSE, options = {}) {
   return new Promise((resolve, reject) => {
-    const scriptPath = path.join(__dirname, 'yolo11', options.quickSearch ? 'quick_detect.py' : 'detect.py');
-    const modelPath = path.join(__dirname, 'yolo11', 'models', modelName);
+    const modelPaths = modelNames.map(name => path.join(__dirname, 'yolo11', 'models', name));
     const projectPath = path.join(__dirname, 'runs', 'detect');
     const sourcePath = resolveLocalPath(filePath);
+    const modelName = modelNames.join(', ');
 
     // Создаем директорию для результатов, если она не существует
     if (!fs.existsSync(projectPath)) {
@@ -786,26 +1119,37 @@ async function runModel(modelName, filePath, sendSSE, options = {}) {
       return;
     }
 
-    // Используем разные имена директорий для разных моделей
-    const predictDir = modelName === 'all.pt' ? 'predict' : 'predict_violence';
+    // Используем разные имена директорий для разных моделей (со своим id у каждого запуска)
+    const dirs = runDirs(options.runId || createRunId());
+    const predictDirs = modelNames.map(name => name === 'all.pt' ? dirs.predict : dirs.violence);
 
+    // Аргументы detect.py / quick_detect.py (выполняются в долгоживущем воркере)
     const args = [
-      scriptPath,
-      '--weights', modelPath,
+      '--weights', ...modelPaths,
       '--source', sourcePath,
       '--conf', '0.40',
       '--save-txt',
       '--save',
       '--project', projectPath,
-      '--name', predictDir,
+      '--name', ...predictDirs,
+      '--batch', DETECT_BATCH,
+      '--workers', DETECT_WORKERS,
       '--stream-frames'
     ];
 
-    // Добавляем исключение классов только для модели all.pt
-    if (modelName === 'all.pt') {
+    // Фильтр классов применяется только к модели all.pt (у violence.pt этих классов нет)
+    if (modelNames.includes('all.pt')) {
       args.push('--classes', 'antifa,bus,car,cat,celtic_cross,cigarette,cocaine,confederate-flag,destroy,dog,elephant,face,fire,glass-defect,gorilla,graffiti,gun,heroin,isis,knife,lion,marijuana,motorcycle,rocket,shrooms,smoke,squirrel,swastika,truck,wolfsangel,zebra');
     }
 
+    if (DETECT_ANALYSIS_FPS) {
+      args.push('--analysis-fps', DETECT_ANALYSIS_FPS);
+    }
+
+    if (DETECT_ADAPTIVE) {
+      args.push('--adaptive');
+    }
+
     if (options.motionDetection) {
       args.push('--motion-detection');
       sendSSE({ status: 'info', message: 'Датчик движения активирован' });
@@ -816,160 +1160,145 @@ async function runModel(modelName, filePath, sendSSE, options = {}) {
       sendSSE({ status: 'info', message: 'Ночной режим активирован' });
     }
 
-    console.log('Running command:', 'python3', ...args);
-
-    const pythonProcess = spawn('python3', args);
-
-    // Добавляем процесс в отслеживание
-    addProcess(pythonProcess);
+    const script = options.quickSearch ? 'quick_detect' : 'detect';
+    console.log('Running detect job:', script, ...args);
 
     let output = '';
     let detectedClasses = new Set();
     let dangerousObjectDetected = false;
-    let stdoutBuffer = '';
+    // Задача могла завершиться раньше (быстрый поиск) — остальной вывод игнорируем
+    let finished = false;
 
-    pythonProcess.stdout.on('data', (data) => {
-      const chunk = data.toString();
-      output += chunk;
-      stdoutBuffer += chunk;
-
-      // Обрабатываем stdout построчно (важно: JSON/base64 часто приходит разрезанным по чанкам)
-      const lines = stdoutBuffer.split('\n');
-      stdoutBuffer = lines.pop() || '';
-
-      for (const rawLine of lines) {
-        const line = rawLine.trim();
-        if (!line) continue;
-
-        // 1) JSON кадры с боксами
-        if (line.startsWith('{')) {
-          try {
-            const jsonData = JSON.parse(line);
-            if (jsonData.status === 'frame' && jsonData.image) {
-              sendSSE({
-                status: 'frame',
-                image: jsonData.image,
-                frame_number: jsonData.frame_number,
-                total_frames: jsonData.total_frames
-              });
-              continue;
-            }
-          } catch (_) {
-            // Не JSON строка (или пришло не полностью) — пропускаем, она может быть логом
-          }
-        }
-
-        // 2) Остальные текстовые логи
-        console.log(line);
+    const finishEarly = (message) => {
+      finished = true;
+      sendSSE({
+        status: 'complete',
+        message,
+        resultPaths: predictDirs.map(dir => `/result/detect/${dir}/${path.basename(filePath)}`)
+      });
+      resolve(output);
+    };
 
-        // Проверяем на специальные сообщения режимов
-        if (line.includes('Motion detected')) {
-          sendSSE({ status: 'info', message: 'Motion detected: ' + line });
-          continue;
-        }
-        if (line.includes('Night mode detected')) {
-          sendSSE({ status: 'info', message: 'Night mode detected: ' + line });
-          continue;
-        }
-        if (line.includes('WARNING: Motion detected in night scene!')) {
-          dangerousObjectDetected = true;
-          sendSSE({
-            status: 'danger',
-            message: 'Обнаружено движение в ночной сцене!'
-          });
+    // stdout воркера уже разрезан на строки (JSON/base64 кадры приходят целиком)
+    const handleLine = (line) => {
+      if (finished) return;
+      output += line + '\n';
 
-          if (options.quickSearch) {
-            console.log('Motion detected in night scene, stopping process...');
-            pythonProcess.kill('SIGTERM');
+      // 1) JSON кадры с боксами
+      if (line.startsWith('{')) {
+        try {
+          const jsonData = JSON.parse(line);
+          if (jsonData.status === 'frame' && jsonData.image) {
             sendSSE({
-              status: 'complete',
-              message: 'Обработка остановлена: обнаружено движение в ночной сцене',
-              resultPaths: [`/result/detect/${predictDir}/${path.basename(filePath)}`]
+              status: 'frame',
+              image: jsonData.image,
+              frame_number: jsonData.frame_number,
+              total_frames: jsonData.total_frames
             });
-            resolve(output);
             return;
           }
-          continue;
+        } catch (_) {
+          // Не JSON строка — пропускаем, она может быть логом
         }
-        if (line.includes('WARNING: Dangerous objects detected')) {
-          dangerousObjectDetected = true;
-          sendSSE({
-            status: 'danger',
-            message: line
-          });
+      }
 
-          if (options.quickSearch) {
-            console.log('Dangerous object detected in quick search mode, stopping process...');
-            pythonProcess.kill('SIGTERM');
-            sendSSE({
-              status: 'complete',
-              message: 'Обработка остановлена: обнаружен опасный объект',
-              resultPaths: [`/result/detect/${predictDir}/${path.basename(filePath)}`]
-            });
-            resolve(output);
-            return;
-          }
-          continue;
-        }
-        if (line.includes('Successfully saved frame to:')) {
-          console.log('Frame saved:', line);
-          sendSSE({ status: 'info', message: 'Результаты сохранены' });
-          continue;
-        }
-        if (line.includes('Exiting process due to')) {
-          console.log('Process is exiting:', line);
-          pythonProcess.kill('SIGTERM');
-          continue;
-        }
+      // 2) Остальные текстовые логи
+      console.log(line);
 
-        // Ищем информацию о классах в выводе
-        const classMatch = line.match(/detected (\d+) objects: (.+)/);
-        if (classMatch) {
-          const [, count, classes] = classMatch;
-          const classList = classes.split(', ').map(c => c.trim());
-          classList.forEach(c => detectedClasses.add(c));
-          sendSSE({
-            status: 'info',
-            message: `Обнаружено ${count} объектов: ${classList.join(', ')}`,
-            classes: classList
-          });
-        } else {
-          sendSSE({ status: 'info', message: line });
-        }
+      // Проверяем на специальные сообщения режимов
+      if (line.includes('Motion detected')) {
+        sendSSE({ status: 'info', message: 'Motion detected: ' + line });
+        return;
+      }
+      if (line.includes('Night mode detected')) {
+        sendSSE({ status: 'info', message: 'Night mode detected: ' + line });
+        return;
+      }
+      if (line.includes('WARNING: Motion detected in night scene!')) {
+        dangerousObjectDetected = true;
+        sendSSE({
+          status: 'danger',
+          message: 'Обнаружено движение в ночной сцене!'
+        });
 
-        const progressMatch = line.match(/video 1\/1 \(frame (\d+)\/(\d+)\)/);
-        if (progressMatch) {
-          const [, currentFrame, totalFrames] = progressMatch;
-          const progress = Math.round((currentFrame / totalFrames) * 100);
-          const detections = line.match(/detected (\d+) objects/);
-          const detectedObjects = detections ? detections[1] : '0';
-          sendSSE({
-            status: 'progress',
-            progress,
-            currentFrame,
-            totalFrames,
-            detectedObjects,
-            model: modelName
-          });
+        if (options.quickSearch) {
+          // Скрипт сам прекращает обработку, воркер при этом продолжает жить
+          console.log('Motion detected in night scene, stopping job...');
+          finishEarly('Обработка остановлена: обнаружено движение в ночной сцене');
         }
+        return;
+      }
+      if (line.includes('WARNING: Dangerous objects detected')) {
+        dangerousObjectDetected = true;
+        sendSSE({
+          status: 'danger',
+          message: line
+        });
 
-        // Прогресс для изображений (в логах YOLO есть строка вида "image 1/1 ...")
-        if (line.includes('image 1/1')) {
-          sendSSE({
-            status: 'progress',
-            progress: 100,
-            currentFrame: 1,
-            totalFrames: 1,
-            model: modelName
-          });
+        if (options.quickSearch) {
+          console.log('Dangerous object detected in quick search mode, stopping job...');
+          finishEarly('Обработка остановлена: обнаружен опасный объект');
         }
+        return;
+      }
+      if (line.includes('Successfully saved frame to:')) {
+        console.log('Frame saved:', line);
+        sendSSE({ status: 'info', message: 'Результаты сохранены' });
+        return;
+      }
+      if (line.includes('Exiting process due to')) {
+        console.log('Job is stopping:', line);
+        return;
       }
-    });
 
-    pythonProcess.stderr.on('data', (data) => {
-      const errorMessage = data.toString();
+      // Ищем информацию о классах в выводе
+      const classMatch = line.match(/detected (\d+) objects: (.+)/);
+      if (classMatch) {
+        const [, count, classes] = classMatch;
+        const classList = classes.split(', ').map(c => c.trim());
+        classList.forEach(c => detectedClasses.add(c));
+        sendSSE({
+          status: 'info',
+          message: `Обнаружено ${count} объектов: ${classList.join(', ')}`,
+          classes: classList
+        });
+      } else {
+        sendSSE({ status: 'info', message: line });
+      }
+
+      const progressMatch = line.match(/video 1\/1 \(frame (\d+)\/(\d+)\)/);
+      if (progressMatch) {
+        const [, currentFrame, totalFrames] = progressMatch;
+        const progress = Math.round((currentFrame / totalFrames) * 100);
+        const detections = line.match(/detected (\d+) objects/);
+        const detectedObjects = detections ? detections[1] : '0';
+        sendSSE({
+          status: 'progress',
+          progress,
+          currentFrame,
+          totalFrames,
+          detectedObjects,
+          model: modelName
+        });
+      }
+
+      // Прогресс для изображений (в логах YOLO есть строка вида "image 1/1 ...")
+      if (line.includes('image 1/1')) {
+        sendSSE({
+          status: 'progress',
+          progress: 100,
+          currentFrame: 1,
+          totalFrames: 1,
+          model: modelName
+        });
+      }
+    };
+
+    const handleStderr = (errorMessage) => {
+      if (finished) return;
       // Фильтруем информационные сообщения, которые выводятся в stderr, но не являются ошибками
-      if (errorMessage.includes('Downloading...') ||
+      if (isModelBackendNotice(errorMessage) ||
+        errorMessage.includes('Downloading...') ||
         errorMessage.includes('will be downloaded') ||
         errorMessage.includes('%|') ||
         errorMessage.includes('From:') ||
@@ -983,9 +1312,15 @@ async function runModel(modelName, filePath, sendSSE, options = {}) {
         console.error(`Error: ${errorMessage}`);
         sendSSE({ status: 'error', message: errorMessage });
       }
-    });
-
-    pythonProcess.on('close', (code) => {
+    };
+
+    const handleDone = (code, msg = {}) => {
+      if (finished) return;
+      finished = true;
+      if (msg.cancelled) {
+        reject(new Error('Detect job cancelled'));
+        return;
+      }
       if (code === 0 || (code === null && dangerousObjectDetected)) {
         // Отправляем итоговый список обнаруженных классов
         if (detectedClasses.size > 0) {
@@ -999,14 +1334,24 @@ async function runModel(modelName, filePath, sendSSE, options = {}) {
       } else {
         reject(new Error(`Python script exited with code ${code}`));
       }
+    };
+
+    const job = runDetectJob(script, args, {
+      onLine: handleLine,
+      onStderr: handleStderr,
+      onDone: handleDone
     });
+    // Отмена по уходу клиента затрагивает только его задачи
+    if (options.jobs) options.jobs.add(job);
+    if (job.queuePosition > 0) {
+      sendSSE({ status: 'info', message: `Анализ в очереди: место ${job.queuePosition}, все воркеры заняты` });
+    }
   });
 }
 
 // Добавляем функцию для запуска распознавания эмоций
-async function runEmotionDetection(filePath, sendSSE) {
+async function runEmotionDetection(filePath, sendSSE, options = {}) {
   return new Promise((resolve, reject) => {
-    const scriptPath = path.join(__dirname, 'yolo11', 'emotion_detect.py');
     const projectPath = path.join(__dirname, 'runs', 'detect');
     const sourcePath = resolveLocalPath(filePath);
 
@@ -1024,95 +1369,81 @@ async function runEmotionDetection(filePath, sendSSE) {
     }
 
     const args = [
-      scriptPath,
       '--source', sourcePath,
       '--save',
       '--project', projectPath,
-      '--name', 'emotions',
-      '--stream-frames'
+      '--name', runDirs(options.runId || createRunId()).emotions,
+      '--stream-frames',
+      '--summary'
     ];
 
-    console.log('Running emotion detection:', 'python3', ...args);
-
-    const pythonProcess = spawn('python3', args);
+    console.log('Running emotion detection job:', ...args);
+    const submittedAt = Date.now();
 
     let output = '';
     let detectedEmotions = new Set();
-    let stdoutBuffer = '';
     let collectingEmotionBlock = false;
     let emotionBlockLines = [];
     let emotionScoreLines = 0;
 
-    pythonProcess.stdout.on('data', (data) => {
-      const chunk = data.toString();
-      output += chunk;
-      stdoutBuffer += chunk;
-
-      // Режем stdout по строкам, чтобы корректно ловить JSON и обычные логи
-      const lines = stdoutBuffer.split('\n');
-      stdoutBuffer = lines.pop() || '';
+    const handleLine = (line) => {
+      output += line + '\n';
 
-      for (const rawLine of lines) {
-        const line = rawLine.trim();
-        if (!line) continue;
+      // Если собираем эмоции — не спамим по строке, а формируем один блок
+      if (collectingEmotionBlock) {
+        emotionBlockLines.push(line);
+        if (/^- \w+:\s*[\d.]+%$/.test(line)) {
+          emotionScoreLines += 1;
+        }
 
-        // Если собираем эмоции — не спамим по строке, а формируем один блок
-        if (collectingEmotionBlock) {
-          emotionBlockLines.push(line);
-          if (/^- \w+:\s*[\d.]+%$/.test(line)) {
-            emotionScoreLines += 1;
+        // DeepFace по умолчанию печатает 7 эмоций (angry, disgust, fear, happy, sad, surprise, neutral)
+        if (emotionScoreLines >= 7) {
+          const block = emotionBlockLines.join('\n');
+          const domLine = emotionBlockLines.find(l => l.includes('Доминирующая эмоция:'));
+          if (domLine) {
+            const emotion = domLine.split('Доминирующая эмоция:')[1]?.trim();
+            if (emotion) detectedEmotions.add(emotion);
           }
 
-          // DeepFace по умолчанию печатает 7 эмоций (angry, disgust, fear, happy, sad, surprise, neutral)
-          if (emotionScoreLines >= 7) {
-            const block = emotionBlockLines.join('\n');
-            const domLine = emotionBlockLines.find(l => l.includes('Доминирующая эмоция:'));
-            if (domLine) {
-              const emotion = domLine.split('Доминирующая эмоция:')[1]?.trim();
-              if (emotion) detectedEmotions.add(emotion);
-            }
-
-            sendSSE({ status: 'info', message: block });
-            collectingEmotionBlock = false;
-            emotionBlockLines = [];
-            emotionScoreLines = 0;
-          }
-          continue;
+          sendSSE({ status: 'info', message: block });
+          collectingEmotionBlock = false;
+          emotionBlockLines = [];
+          emotionScoreLines = 0;
         }
+        return;
+      }
 
-        // 1) JSON-кадры с эмоциями (base64 картинка с боксами)
-        if (line.startsWith('{')) {
-          try {
-            const jsonData = JSON.parse(line);
-            if (jsonData.status === 'frame' && jsonData.image) {
-              sendSSE({
-                status: 'frame',
-                image: jsonData.image,
-                frame_number: jsonData.frame_number,
-                total_frames: jsonData.total_frames
-              });
-              continue;
-            }
-          } catch (_) {
-            // Не JSON — просто упадём в текстовую обработку ниже
+      // 1) JSON-кадры с эмоциями (base64 картинка с боксами)
+      if (line.startsWith('{')) {
+        try {
+          const jsonData = JSON.parse(line);
+          if (jsonData.status === 'frame' && jsonData.image) {
+            sendSSE({
+              status: 'frame',
+              image: jsonData.image,
+              frame_number: jsonData.frame_number,
+              total_frames: jsonData.total_frames
+            });
+            return;
           }
+        } catch (_) {
+          // Не JSON — просто упадём в текстовую обработку ниже
         }
+      }
 
-        // 2) Текстовые сообщения об эмоциях: собираем блок целиком (для фронта)
-        if (line.includes('Обнаружено лицо с эмоциями:')) {
-          collectingEmotionBlock = true;
-          emotionBlockLines = [line];
-          emotionScoreLines = 0;
-          continue;
-        }
-
-        // fallback: обычный текстовый лог
-        sendSSE({ status: 'info', message: line });
+      // 2) Текстовые сообщения об эмоциях: собираем блок целиком (для фронта)
+      if (line.includes('Обнаружено лицо с эмоциями:')) {
+        collectingEmotionBlock = true;
+        emotionBlockLines = [line];
+        emotionScoreLines = 0;
+        return;
       }
-    });
 
-    pythonProcess.stderr.on('data', (data) => {
-      const errorMessage = data.toString();
+      // fallback: обычный текстовый лог
+      sendSSE({ status: 'info', message: line });
+    };
+
+    const handleStderr = (errorMessage) => {
       // Фильтруем информационные сообщения, которые выводятся в stderr, но не являются ошибками
       if (errorMessage.includes('Downloading...') ||
         errorMessage.includes('will be downloaded') ||
@@ -1128,15 +1459,30 @@ async function runEmotionDetection(filePath, sendSSE) {
         console.error(`Error: ${errorMessage}`);
         sendSSE({ status: 'error', message: errorMessage });
       }
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
+    };
+
+    const handleDone = (code, msg = {}) => {
+      // Полное время задачи включает ожидание в очереди и, для первой задачи, загрузку воркера
+      const totalSeconds = (Date.now() - submittedAt) / 1000;
+      console.log(`Emotion detection: ${msg.elapsed ?? '?'}s processing, ${totalSeconds.toFixed(2)}s total`);
+      if (msg.cancelled) {
+        reject(new Error('Emotion detection job cancelled'));
+      } else if (code === 0) {
         resolve(output);
       } else {
         reject(new Error(`Emotion detection script exited with code ${code}`));
       }
+    };
+
+    const job = runEmotionJob(args, {
+      onLine: handleLine,
+      onStderr: handleStderr,
+      onDone: handleDone
     });
+    if (options.jobs) options.jobs.add(job);
+    if (job.queuePosition > 0) {
+      sendSSE({ status: 'info', message: `Распознавание эмоций в очереди: место ${job.queuePosition}, все воркеры заняты` });
+    }
   });
 }
 
@@ -1225,4 +1571,10 @@ const PORT = process.env.PORT || 3001;
 const HOST = process.env.HOST || '0.0.0.0';
 httpServer.listen(PORT, HOST, () => {
   console.log(`Сервер запущен на ${HOST}:${PORT}`);
+  // Прогреваем воркеры детекции, чтобы первые анализы не ждали загрузки моделей
+  detectPool.start();
+  // Воркер эмоций держит TensorFlow в памяти - прогреваем только по запросу
+  if (process.env.EMOTION_WORKER_PRELOAD === 'true') {
+    emotionPool.start();
+  }
 });
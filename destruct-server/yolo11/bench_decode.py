@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import numpy as np
+
+from frame_source import DECODERS, FFmpegFrameSource, convert_frame, open_capture, recycle_frame
+
+# Сравнение декодеров frame_source.py: сколько кадров в секунду получает Python
+# и сколько CPU тратит сам процесс Python (ffmpeg декодирует в дочернем процессе).
+# --busy-threads нагружает GIL потоками с numpy, как поток инференса в анализаторах.
+
+def _child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _busy(stop):
+    # Чистый Python под GIL - так декодирование OpenCV конкурирует с остальной работой процесса
+    data = np.zeros((256, 256), dtype=np.float32)
+    while not stop.is_set():
+        for _ in range(200):
+            data[0, 0] += 1.0
+
+def bench(source, decoder, size, frames, pix_fmt, busy_threads):
+    stop = threading.Event()
+    threads = [threading.Thread(target=_busy, args=(stop,), daemon=True) for _ in range(busy_threads)]
+    for thread in threads:
+        thread.start()
+
+    child_before = _child_cpu()
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+
+    cap = open_capture(source, decoder, size=size, pix_fmt=pix_fmt)
+    actual = 'ffmpeg' if isinstance(cap, FFmpegFrameSource) else 'opencv'
+    count = 0
+    first_frame_ms = None
+    shape = None
+    try:
+        while count < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # OpenCV отдает BGR в исходном размере - доводим до того же вида, что и ffmpeg
+            frame = convert_frame(cap, frame, size, pix_fmt)
+            if first_frame_ms is None:
+                first_frame_ms = (time.perf_counter() - started) * 1000
+                shape = list(frame.shape)
+            count += 1
+            recycle_frame(cap, frame)
+    finally:
+        cap.release()
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    elapsed = time.perf_counter() - started
+    python_cpu = time.process_time() - cpu_before
+    return {
+        'decoder': actual,
+        'frames': count,
+        'shape': shape,
+        'fps': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        'first_frame_ms': round(first_frame_ms or 0.0, 1),
+        'python_cpu_s': round(python_cpu, 2),
+        'decoder_process_cpu_s': round(_child_cpu() - child_before, 2),
+        'busy_threads': busy_threads
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OpenCV and FFmpeg pipe frame decoding')
+    parser.add_argument('--source', type=str, required=True, help='Video file or RTSP URL')
+    parser.add_argument('--decoders', type=str, nargs='+', choices=DECODERS, default=list(DECODERS))
+    parser.add_argument('--size', type=int, default=640, help='Longer side of decoded frames (0 - source size)')
+    parser.add_argument('--pix-fmt', type=str, choices=['bgr24', 'rgb24', 'gray'], default='bgr24')
+    parser.add_argument('--frames', type=int, default=500, help='Maximum number of frames per run')
+    parser.add_argument('--busy-threads', type=int, default=0,
+                        help='Python threads competing for the GIL while decoding')
+    parser.add_argument('--json', type=str, default=None, help='Save the report to this file')
+    args = parser.parse_args()
+
+    if not args.source.startswith(('rtsp://', 'rtsps://', 'http://', 'https://')) and not os.path.exists(args.source):
+        print(f"Source not found: {args.source}")
+        sys.exit(2)
+
+    report = []
+    for decoder in args.decoders:
+        result = bench(args.source, decoder, args.size or None, args.frames, args.pix_fmt, args.busy_threads)
+        report.append(result)
+        print(f"{decoder:>7}: {result['frames']} frames {result['shape']}, {result['fps']} fps, "
+              f"first frame {result['first_frame_ms']} ms, python CPU {result['python_cpu_s']} s, "
+              f"decoder process CPU {result['decoder_process_cpu_s']} s"
+              + (f" (fell back to {result['decoder']})" if result['decoder'] != decoder else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to: {args.json}")
+
+if __name__ == '__main__':
+    main()
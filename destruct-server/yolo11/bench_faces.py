@@ -0,0 +1,127 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import cv2
+
+from face_detection import FACE_DETECTORS, create_face_detector
+from tracking import iou_matrix
+
+# Сравнение детекторов лиц face_detection.py на локальных файлах: ms на кадр и
+# recall относительно эталона (по умолчанию MTCNN на полном кадре) - доля лиц
+# эталона, найденных детектором с IoU не ниже --iou.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp')
+
+def load_frames(paths, every, max_frames):
+    """Кадры из изображений и видео: у видео каждый every-й кадр, всего не больше max_frames"""
+    frames = []
+    for path in paths:
+        if len(frames) >= max_frames:
+            break
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+            continue
+        cap = cv2.VideoCapture(path)
+        index = 0
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % every == 0:
+                frames.append(frame)
+            index += 1
+        cap.release()
+    return frames
+
+def parse_config(value):
+    """mtcnn | yunet:320 -> (имя, размер или None)"""
+    name, _, size = value.partition(':')
+    if name not in FACE_DETECTORS:
+        raise argparse.ArgumentTypeError(f"unknown face detector: {name}")
+    return name, int(size) if size else None
+
+def to_xyxy(faces):
+    return [(x, y, x + w, y + h) for x, y, w, h, _ in faces]
+
+def bench(detector, frames):
+    """Лица каждого кадра и среднее время на кадр в ms (первый кадр - прогрев)"""
+    detector.detect(frames[0])
+    faces = []
+    started = time.perf_counter()
+    for frame in frames:
+        faces.append(detector.detect(frame))
+    return faces, (time.perf_counter() - started) * 1000 / len(frames)
+
+def recall(faces, reference, iou_threshold):
+    found = total = 0
+    for frame_faces, frame_reference in zip(faces, reference):
+        total += len(frame_reference)
+        if not frame_faces or not frame_reference:
+            continue
+        ious = iou_matrix(to_xyxy(frame_reference), to_xyxy(frame_faces))
+        found += int((ious.max(axis=1) >= iou_threshold).sum())
+    return found / total if total else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare face detectors: recall vs reference and ms/frame')
+    parser.add_argument('--source', type=str, nargs='+', required=True,
+                        help='Images, videos or directories with them')
+    parser.add_argument('--detectors', type=parse_config, nargs='+',
+                        default=[('mtcnn', 640), ('yunet', 320), ('yunet', 640)],
+                        help='Detectors to compare as name[:size], e.g. mtcnn yunet:320')
+    parser.add_argument('--reference', type=parse_config, default=('mtcnn', 0),
+                        help='Reference detector for recall (default: mtcnn on the full frame)')
+    parser.add_argument('--iou', type=float, default=0.4, help='IoU at which a reference face counts as found')
+    parser.add_argument('--every', type=int, default=10, help='Take every N-th video frame')
+    parser.add_argument('--frames', type=int, default=200, help='Maximum number of frames')
+    parser.add_argument('--json', type=str, default=None, help='Save the report to this file')
+    args = parser.parse_args()
+
+    paths = []
+    for source in args.source:
+        if os.path.isdir(source):
+            paths.extend(sorted(p for p in glob.glob(os.path.join(source, '*')) if os.path.isfile(p)))
+        else:
+            paths.append(source)
+    frames = load_frames(paths, max(1, args.every), args.frames)
+    if not frames:
+        print("No frames loaded")
+        sys.exit(2)
+    print(f"{len(frames)} frames from {len(paths)} files")
+
+    reference, reference_ms = bench(create_face_detector(*args.reference), frames)
+    reference_faces = sum(len(faces) for faces in reference)
+    report = [{
+        'detector': args.reference[0], 'size': args.reference[1] or None, 'reference': True,
+        'ms_per_frame': round(reference_ms, 2), 'faces': reference_faces, 'recall': 1.0
+    }]
+
+    for name, size in args.detectors:
+        faces, ms = bench(create_face_detector(name, size), frames)
+        value = recall(faces, reference, args.iou)
+        report.append({
+            'detector': name, 'size': size, 'reference': False,
+            'ms_per_frame': round(ms, 2), 'faces': sum(len(f) for f in faces),
+            'recall': round(value, 3) if value is not None else None
+        })
+
+    print(f"reference faces: {reference_faces}")
+    for item in report:
+        size = item['size'] or 'full'
+        recall_text = f"{item['recall']:.3f}" if item['recall'] is not None else '-'
+        marker = ' (reference)' if item['reference'] else ''
+        print(f"{item['detector']:>6} @ {size!s:>4}: {item['ms_per_frame']:8.2f} ms/frame, "
+              f"{item['faces']:>5} faces, recall {recall_text}{marker}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+from core import Pipeline, VideoSource, YoloDetector
+from frame_source import DECODERS
+from model_backend import BACKENDS, EXPORT_IMGSZ, load_model
+
+# Замер конвейера core.pipeline (декодирование -> батчевый инференс -> разбор
+# детекций) на одном видео: сколько кадров в секунду и где уходит время при
+# разных размерах батча. Те же стадии используют скрипты анализа.
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the FrameSource -> Detector -> Sink pipeline')
+    parser.add_argument('--weights', type=str, required=True, help='Model weights (.pt)')
+    parser.add_argument('--source', type=str, required=True, help='Video file or stream URL')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 8], help='Batch sizes to compare')
+    parser.add_argument('--frames', type=int, default=300, help='Maximum number of frames per run')
+    parser.add_argument('--imgsz', type=int, default=EXPORT_IMGSZ, help='Inference size')
+    parser.add_argument('--decoder', type=str, choices=DECODERS, default=None,
+                        help='Frame decoder (default: YOLO_DECODER env or opencv)')
+    parser.add_argument('--decode-size', type=int, default=None,
+                        help='Scale decoded frames so that the longer side is this many pixels')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help='Inference backend (default: YOLO_BACKEND env or pytorch)')
+    parser.add_argument('--int8', action='store_true', default=None,
+                        help='Use the INT8 variant made by quantize.py (default: YOLO_INT8 env)')
+    parser.add_argument('--json', type=str, default=None, help='Save the report to this file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        print(f"Weights not found: {args.weights}")
+        sys.exit(2)
+
+    model = load_model(args.weights, args.backend, int8=args.int8)
+    detector = YoloDetector(model, imgsz=args.imgsz)
+
+    # Прогрев: первый прогон включает инициализацию модели и не показателен
+    Pipeline(VideoSource(args.source, args.decoder, args.decode_size, max_frames=2), detector).run()
+
+    report = []
+    for batch in args.batch:
+        source = VideoSource(args.source, args.decoder, args.decode_size, max_frames=args.frames)
+        stats = Pipeline(source, detector, batch_size=batch).run()
+        stats = {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+        stats['batch'] = batch
+        report.append(stats)
+        print(f"batch {batch:>3}: {stats['frames']} frames, {stats['fps']} fps "
+              f"(decode {stats['decode_s']} s, detect {stats['detect_s']} s, sinks {stats['sink_s']} s)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
+from frame_source import DECODERS, convert_frame, open_capture, resolve_decoder
+from framing import claim_stdout, read_frame, write_frame
+from model_backend import BACKENDS, load_model
+from preview import PreviewPublisher, draw_detections
+from core import Detections, safe_json_dumps
+from tracking import AlertPolicy, IoUTracker
 import time
 import json
 import sys
@@ -13,76 +18,84 @@ from datetime import datetime
 import base64
 import argparse
 
-def safe_json_dumps(data):
-    try:
-        # Ensure all strings are properly escaped
-        return json.dumps(data, ensure_ascii=False).replace('\n', '\\n').replace('\r', '\\r')
-    except Exception as e:
-        return json.dumps({
-            "status": "error",
-            "message": f"JSON serialization error: {str(e)}"
-        })
-
 class CameraAnalyzer:
-    def __init__(self, model_path, camera_id=0, show_video=True):
-        print(safe_json_dumps({"status": "info", "message": f"Инициализация с моделью: {model_path}, камера: {camera_id}"}))
+    def __init__(self, model_path, camera_id=0, show_video=True, backend=None, int8=None, decoder=None, decode_size=None,
+                 track_cooldown=300.0, class_cooldown=30.0, preview_fps=10.0, preview_size=640, preview_quality=70):
+        # Пишут поток обработки, поток захвата и поток превью - строки JSON не должны перемешиваться
+        self.print_lock = threading.Lock()
+        self._send({"status": "info", "message": f"Инициализация с моделью: {model_path}, камера: {camera_id}"})
         
         # Инициализируем атрибуты
         self.camera_id = camera_id
         self.show_video = show_video
+        self.decoder = resolve_decoder(decoder)
+        self.decode_size = decode_size
         self.cap = None
         self.is_running = False
         self.frame_queue = Queue(maxsize=2)
         self.result_queue = Queue()
         self.processing_thread = None
         self.capture_thread = None
+        # Треки объектов: тревога и снимок - один раз на трек, с кулдауном по классу
+        self.tracker = IoUTracker()
+        self.alerts = AlertPolicy(track_cooldown, class_cooldown)
+        # Кадры с боксами кодирует и отправляет поток превью, а не поток инференса
+        self.preview = None
+        if show_video and preview_fps > 0:
+            self.preview = PreviewPublisher(lambda key, message: self._send(message),
+                                            fps=preview_fps, size=preview_size, quality=preview_quality)
         
         # Создаем директорию для сохранения результатов
         self.save_dir = os.path.join('runs', 'detect', 'camera')
         os.makedirs(self.save_dir, exist_ok=True)
-        print(safe_json_dumps({"status": "info", "message": f"Директория для сохранения: {self.save_dir}"}))
+        self._send({"status": "info", "message": f"Директория для сохранения: {self.save_dir}"})
 
         # Проверяем существование модели
         if not os.path.exists(model_path):
-            print(safe_json_dumps({
+            self._send({
                 "status": "error",
                 "message": f"Модель не найдена: {model_path}"
-            }))
+            })
             return
 
         try:
-            print(safe_json_dumps({"status": "info", "message": "Загрузка модели YOLO..."}))
-            self.model = YOLO(model_path)
-            print(safe_json_dumps({"status": "info", "message": "Модель успешно загружена"}))
+            self._send({"status": "info", "message": "Загрузка модели YOLO..."})
+            self.model = load_model(model_path, backend, int8=int8)
+            self._send({"status": "info", "message": "Модель успешно загружена"})
         except Exception as e:
-            print(safe_json_dumps({
+            self._send({
                 "status": "error",
                 "message": f"Ошибка загрузки модели: {str(e)}"
-            }))
+            })
             return
 
+    def _send(self, message):
+        """Печатает JSON сообщение"""
+        with self.print_lock:
+            print(safe_json_dumps(message), flush=True)
+
     def start(self):
-        print(safe_json_dumps({"status": "info", "message": f"Попытка открыть камеру {self.camera_id}..."}))
+        self._send({"status": "info", "message": f"Попытка открыть камеру {self.camera_id}..."})
         self.is_running = True
         
         # Пробуем открыть камеру несколько раз
         for attempt in range(3):
             try:
-                self.cap = cv2.VideoCapture(self.camera_id)
+                self.cap = open_capture(self.camera_id, self.decoder, size=self.decode_size)
                 if self.cap.isOpened():
                     # Устанавливаем RGB режим для камеры
                     self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
-                    print(safe_json_dumps({"status": "info", "message": f"Камера успешно открыта с попытки {attempt + 1}"}))
+                    self._send({"status": "info", "message": f"Камера успешно открыта с попытки {attempt + 1}"})
                     break
                 else:
-                    print(safe_json_dumps({"status": "warning", "message": f"Попытка {attempt + 1} открыть камеру не удалась"}))
+                    self._send({"status": "warning", "message": f"Попытка {attempt + 1} открыть камеру не удалась"})
                     time.sleep(1)
             except Exception as e:
-                print(safe_json_dumps({"status": "error", "message": f"Ошибка при открытии камеры: {str(e)}"}))
+                self._send({"status": "error", "message": f"Ошибка при открытии камеры: {str(e)}"})
                 time.sleep(1)
         
         if not self.cap.isOpened():
-            print(safe_json_dumps({"status": "error", "message": "Не удалось открыть камеру после всех попыток"}))
+            self._send({"status": "error", "message": "Не удалось открыть камеру после всех попыток"})
             return False
 
         # Запускаем потоки для захвата и обработки кадров
@@ -91,12 +104,16 @@ class CameraAnalyzer:
         
         self.capture_thread.start()
         self.processing_thread.start()
+        if self.preview is not None:
+            self.preview.start()
         
-        print(safe_json_dumps({"status": "info", "message": "Потоки обработки запущены"}))
+        self._send({"status": "info", "message": "Потоки обработки запущены"})
         return True
 
     def stop(self):
         self.is_running = False
+        if self.preview is not None:
+            self.preview.stop()
         if self.cap is not None:
             self.cap.release()
         cv2.destroyAllWindows()
@@ -113,19 +130,22 @@ class CameraAnalyzer:
             try:
                 ret, frame = self.cap.read()
                 if not ret:
-                    print(safe_json_dumps({"status": "error", "message": "Ошибка чтения кадра"}))
+                    self._send({"status": "error", "message": "Ошибка чтения кадра"})
                     time.sleep(0.1)
                     continue
 
                 # Проверяем формат кадра
                 if frame is not None and frame.size > 0:
                     if len(frame.shape) != 3 or frame.shape[2] != 3:
-                        print(safe_json_dumps({"status": "error", "message": "Неправильный формат кадра"}))
+                        self._send({"status": "error", "message": "Неправильный формат кадра"})
                         continue
+                    frame = convert_frame(self.cap, frame, self.decode_size)
+                    if self.preview is not None:
+                        self.preview.update_frame(self.camera_id, frame)
 
                 frame_count += 1
                 if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                    print(safe_json_dumps({"status": "info", "message": f"Обработано кадров: {frame_count}"}))
+                    self._send({"status": "info", "message": f"Обработано кадров: {frame_count}"})
 
                 # Очищаем очередь, если она полная
                 if self.frame_queue.full():
@@ -136,7 +156,7 @@ class CameraAnalyzer:
 
                 self.frame_queue.put(frame)
             except Exception as e:
-                print(safe_json_dumps({"status": "error", "message": f"Ошибка в потоке захвата: {str(e)}"}))
+                self._send({"status": "error", "message": f"Ошибка в потоке захвата: {str(e)}"})
                 time.sleep(0.1)
 
     def _process_frames(self):
@@ -150,7 +170,7 @@ class CameraAnalyzer:
                     continue
 
                 if frame is None or frame.size == 0:
-                    print(safe_json_dumps({"status": "error", "message": "Получен пустой кадр"}))
+                    self._send({"status": "error", "message": "Получен пустой кадр"})
                     continue
 
                 frame_count += 1
@@ -164,263 +184,313 @@ class CameraAnalyzer:
                     
                     # Обрабатываем результаты
                     for result in results:
-                        boxes = result.boxes
-                        if len(boxes) > 0:
-                            # Получаем информацию об обнаруженных объектах
-                            detections = []
-                            for box in boxes:
-                                try:
-                                    cls = int(box.cls[0])
-                                    conf = float(box.conf[0])
-                                    name = result.names[cls]
-                                    detections.append({
-                                        "class": name,
-                                        "confidence": conf
-                                    })
-                                    
-                                    # Рисуем рамку и подпись
-                                    if self.show_video:
-                                        try:
-                                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                            # Проверяем, что координаты находятся в пределах изображения
-                                            h, w = frame.shape[:2]
-                                            x1 = max(0, min(x1, w-1))
-                                            y1 = max(0, min(y1, h-1))
-                                            x2 = max(0, min(x2, w-1))
-                                            y2 = max(0, min(y2, h-1))
-                                            
-                                            # Рисуем рамку
-                                            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                            
-                                            # Подготавливаем текст
-                                            text = f"{name} {conf:.2f}"
-                                            font = cv2.FONT_HERSHEY_SIMPLEX
-                                            font_scale = 0.5
-                                            thickness = 2
-                                            
-                                            # Получаем размеры текста
-                                            (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                                            
-                                            # Рисуем фон для текста
-                                            cv2.rectangle(frame, 
-                                                        (x1, y1 - text_height - 10),
-                                                        (x1 + text_width, y1),
-                                                        (0, 255, 0),
-                                                        -1)
-                                            
-                                            # Рисуем текст
-                                            cv2.putText(frame,
-                                                      text,
-                                                      (x1, y1 - 5),
-                                                      font,
-                                                      font_scale,
-                                                      (0, 0, 0),
-                                                      thickness)
-                                        except Exception as e:
-                                            print(safe_json_dumps({
-                                                "status": "error",
-                                                "message": f"Ошибка отрисовки бокса: {str(e)}"
-                                            }))
-                                            continue
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка обработки бокса: {str(e)}"
-                                    }))
-                                    continue
-                            
-                            # Отправляем результаты
-                            print(safe_json_dumps({
-                                "status": "info",
-                                "message": f"Обнаружено {len(detections)} объектов: {', '.join([d['class'] for d in detections])}"
-                            }))
-                            
-                            # Отправляем кадр с боксами в base64
-                            try:
-                                # Проверяем, что кадр не пустой и имеет правильный формат
-                                if frame is not None and frame.size > 0:
-                                    # Создаем копию кадра для обработки
-                                    frame_copy = frame.copy()
-                                    
-                                    # Устанавливаем параметры сжатия JPEG
-                                    encode_params = [
-                                        cv2.IMWRITE_JPEG_QUALITY, 95,
-                                        cv2.IMWRITE_JPEG_OPTIMIZE, 1
-                                    ]
-                                    
-                                    # Кодируем изображение
-                                    success, jpeg = cv2.imencode('.jpg', frame_copy, encode_params)
-                                    
-                                    if success:
-                                        b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
-                                        print(safe_json_dumps({
-                                            "status": "frame",
-                                            "image": b64
-                                        }))
-                                    else:
-                                        print(safe_json_dumps({
-                                            "status": "error",
-                                            "message": "Ошибка кодирования JPEG"
-                                        }))
-                            except Exception as e:
-                                print(safe_json_dumps({
-                                    "status": "error",
-                                    "message": f"Ошибка кодирования кадра: {str(e)}"
-                                }))
-                            
-                            # Если обнаружены опасные объекты
-                            dangerous_objects = [d for d in detections if d['class'] in {
-                                'antifa', 'cocaine', 'confederate-flag', 'destroy',
-                                'fire', 'glass-defect', 'gun', 'heroin', 'isis',
-                                'knife', 'marijuana', 'rocket', 'shrooms', 'smoke', 'swastika',
-                                'wolfsangel', 'celtic_cross', 'Violence', 'graffiti'
-                            }]
-                            if dangerous_objects:
-                                print(safe_json_dumps({
-                                    "status": "warning",
-                                    "message": f"Обнаружены потенциально опасные объекты: {', '.join([d['class'] for d in dangerous_objects])}"
-                                }))
-                                
-                                # Сохраняем кадр с обнаруженными объектами
-                                try:
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                    save_path = os.path.join(self.save_dir, f'detection_{timestamp}.jpg')
-                                    cv2.imwrite(save_path, frame)
-                                    
-                                    print(safe_json_dumps({
-                                        "status": "info",
-                                        "message": f"Сохранен кадр с обнаруженными объектами: {save_path}"
-                                    }))
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка сохранения кадра: {str(e)}"
-                                    }))
-                        else:
+                        # Получаем информацию об обнаруженных объектах (боксы обрезаны по кадру)
+                        h, w = frame.shape[:2]
+                        detections = Detections.from_result(result, frame_size=(w, h)).to_dicts()
+
+                        # Пустой кадр тоже учитывается - пропавшие треки стареют
+                        self.tracker.update(detections)
+                        # Боксы на превью рисует поток превью
+                        if self.preview is not None:
+                            self.preview.update_results(self.camera_id, detections)
+
+                        if not detections:
                             if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                                print(safe_json_dumps({
+                                self._send({
                                     "status": "info",
                                     "message": "Объекты не обнаружены"
-                                }))
-                                
-                                # Отправляем кадр даже если объекты не обнаружены
-                                try:
-                                    if frame is not None and frame.size > 0:
-                                        # Создаем копию кадра для обработки
-                                        frame_copy = frame.copy()
-                                        
-                                        # Устанавливаем параметры сжатия JPEG
-                                        encode_params = [
-                                            cv2.IMWRITE_JPEG_QUALITY, 95,
-                                            cv2.IMWRITE_JPEG_OPTIMIZE, 1
-                                        ]
-                                        
-                                        # Кодируем изображение
-                                        success, jpeg = cv2.imencode('.jpg', frame_copy, encode_params)
-                                        
-                                        if success:
-                                            b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
-                                            print(safe_json_dumps({
-                                                "status": "frame",
-                                                "image": b64
-                                            }))
-                                        else:
-                                            print(safe_json_dumps({
-                                                "status": "error",
-                                                "message": "Ошибка кодирования JPEG"
-                                            }))
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка кодирования кадра: {str(e)}"
-                                    }))
+                                })
+                            continue
+
+                        # Отправляем результаты
+                        self._send({
+                            "status": "info",
+                            "message": f"Обнаружено {len(detections)} объектов: {', '.join([d['class'] for d in detections])}",
+                            "track_ids": [d['track_id'] for d in detections]
+                        })
+
+                        # Если появились новые опасные объекты (по уже оповещенным трекам тревога не повторяется)
+                        dangerous_objects = [d for d in detections if d['dangerous']
+                                             and self.alerts.should_alert(d['track_id'], d['class'])]
+                        if dangerous_objects:
+                            self._send({
+                                "status": "warning",
+                                "message": f"Обнаружены потенциально опасные объекты: {', '.join([d['class'] for d in dangerous_objects])}",
+                                "track_ids": [d['track_id'] for d in dangerous_objects]
+                            })
+
+                            # Сохраняем кадр с обнаруженными объектами (рамки рисуются только на нем)
+                            try:
+                                draw_detections(frame, detections)
+                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                                save_path = os.path.join(self.save_dir, f'detection_{timestamp}.jpg')
+                                cv2.imwrite(save_path, frame)
+
+                                self._send({
+                                    "status": "info",
+                                    "message": f"Сохранен кадр с обнаруженными объектами: {save_path}"
+                                })
+                            except Exception as e:
+                                self._send({
+                                    "status": "error",
+                                    "message": f"Ошибка сохранения кадра: {str(e)}"
+                                })
                 except Exception as e:
-                    print(safe_json_dumps({
+                    self._send({
                         "status": "error",
                         "message": f"Ошибка обработки кадра: {str(e)}"
-                    }))
+                    })
                     continue
                 
                 # Вычисляем время обработки
                 process_time = time.time() - start_time
                 if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                    print(safe_json_dumps({
+                    self._send({
                         "status": "info",
                         "message": f"Время обработки: {process_time:.2f} сек"
-                    }))
+                    })
                 
             except Exception as e:
-                print(safe_json_dumps({
+                self._send({
                     "status": "error",
                     "message": f"Ошибка в основном цикле обработки: {str(e)}"
-                }))
+                })
                 time.sleep(0.1)  # Добавляем небольшую задержку при ошибке
 
+def result_detections(result):
+    """Список детекций одного результата YOLO для отправки клиенту"""
+    return Detections.from_result(result).to_dicts(boxes=False)
+
+def analyze_frame(model, frame):
+    """Инференс одного кадра: (кадр с боксами, список детекций)"""
+    results = model(frame, verbose=False)
+    annotated = frame
+    detections = []
+    for result in results:
+        annotated = result.plot()
+        detections = result_detections(result)
+        break
+    return annotated, detections
+
+class LatestFrameSlot:
+    """Буфер на один кадр между потоком чтения stdin и инференсом.
+
+    Новый кадр вытесняет еще не обработанный: если клиент шлет быстрее, чем
+    успевает модель, устаревшие кадры отбрасываются, а не копятся в pipe.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.received += 1
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def get(self):
+        """Ждет следующий кадр; None - stdin закрыт и кадров больше нет"""
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+            item, self._item = self._item, None
+            return item
+
+class StdinStats:
+    """Статистика потока кадров для клиента: сколько отброшено и насколько отстает обработка.
+
+    suggested_interval_ms - интервал отправки кадров, при котором модель успевает
+    обрабатывать каждый кадр; браузер подстраивает под него частоту отправки.
+    """
+
+    def __init__(self, slot, report_interval=1.0, smoothing=0.2):
+        self.slot = slot
+        self.report_interval = report_interval
+        self.smoothing = smoothing
+        self.processed = 0
+        self.processing_ms = None
+        self.lag_ms = None
+        self.last_report = time.time()
+
+    def _average(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def record(self, received_at, started_at):
+        """Учитывает обработанный кадр и возвращает его задержку (мс от получения до ответа)"""
+        now = time.time()
+        lag = (now - received_at) * 1000
+        self.processing_ms = self._average(self.processing_ms, (now - started_at) * 1000)
+        self.lag_ms = self._average(self.lag_ms, lag)
+        self.processed += 1
+        return lag
+
+    def report(self, force=False):
+        """Сообщение со статистикой раз в report_interval секунд (иначе None)"""
+        now = time.time()
+        if not force and now - self.last_report < self.report_interval:
+            return None
+        self.last_report = now
+        return {
+            "status": "stats",
+            "received": self.slot.received,
+            "processed": self.processed,
+            "dropped": self.slot.dropped,
+            "processing_ms": round(self.processing_ms or 0, 1),
+            "lag_ms": round(self.lag_ms or 0, 1),
+            "suggested_interval_ms": int(round((self.processing_ms or 0) * 1.1))
+        }
+
+def read_stdin_json(slot, send):
+    """Поток чтения: JSON строки {"image": base64 JPEG} -> slot"""
+    try:
+        for raw_line in sys.stdin:
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+            except json.JSONDecodeError as e:
+                send({"status": "error", "message": f"STDIN JSON error: {str(e)}"})
+                continue
+            image_b64 = payload.pop('image', '')
+            if image_b64:
+                # base64 декодируется уже при обработке - отброшенные кадры не декодируются вовсе
+                slot.put((time.time(), payload, image_b64))
+    finally:
+        slot.close()
+
+def read_stdin_binary(slot, send):
+    """Поток чтения: бинарные кадры framing.py с JPEG -> slot"""
+    stdin = sys.stdin.buffer
+    try:
+        while True:
+            try:
+                message = read_frame(stdin)
+            except Exception as e:
+                # Разметка потока потеряна - дальше читать нельзя
+                send({"status": "error", "message": f"STDIN framing error: {str(e)}"})
+                return
+            if message is None:
+                return
+            header, jpeg_in = message
+            if jpeg_in:
+                slot.put((time.time(), header, jpeg_in))
+    finally:
+        slot.close()
+
+def run_stdin(model, send, binary=False):
+    """Обрабатывает кадры из stdin по принципу "побеждает последний".
+
+    JSON режим: ответы - JSON строки с base64 JPEG.
+    Бинарный режим: ответы - заголовок с детекциями и JPEG без base64.
+    """
+    slot = LatestFrameSlot()
+    stats = StdinStats(slot)
+    reader = read_stdin_binary if binary else read_stdin_json
+    threading.Thread(target=reader, args=(slot, send), daemon=True).start()
+
+    while True:
+        item = slot.get()
+        if item is None:
+            break
+        received_at, header, data = item
+        started_at = time.time()
+
+        try:
+            jpeg_in = data if binary else base64.b64decode(data)
+            frame = cv2.imdecode(np.frombuffer(jpeg_in, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+
+            annotated, detections = analyze_frame(model, frame)
+
+            ok, jpeg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if not ok:
+                continue
+
+            response = {"status": "frame", "detections": detections}
+            if 'id' in header:
+                response['id'] = header['id']
+            response['lag_ms'] = round(stats.record(received_at, started_at), 1)
+            if binary:
+                send(response, jpeg.tobytes())
+            else:
+                response['image'] = base64.b64encode(jpeg.tobytes()).decode('utf-8')
+                send(response)
+        except Exception as e:
+            send({"status": "error", "message": f"STDIN frame processing error: {str(e)}"})
+
+        report = stats.report()
+        if report:
+            send(report)
+
+    send(stats.report(force=True))
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('model', help='Model filename in ./models (e.g. all.pt)')
     parser.add_argument('--stdin', action='store_true', help='Read frames from stdin as JSON lines')
+    parser.add_argument('--stdin-binary', action='store_true',
+                        help='Read frames from stdin as length-prefixed binary frames (see framing.py)')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help='Inference backend (default: YOLO_BACKEND env or pytorch)')
+    parser.add_argument('--int8', action='store_true', default=None,
+                        help='Use the INT8 variant made by quantize.py (default: YOLO_INT8 env)')
+    parser.add_argument('--decoder', type=str, choices=DECODERS, default=None,
+                        help='Camera frame decoder (default: YOLO_DECODER env or opencv)')
+    parser.add_argument('--decode-size', type=int, default=None,
+                        help='Scale camera frames so that the longer side is this many pixels')
+    parser.add_argument('--preview-fps', type=float, default=10.0,
+                        help='Annotated preview frames per second (0 disables the preview)')
+    parser.add_argument('--preview-size', type=int, default=640, help='Longer side of preview frames')
+    parser.add_argument('--preview-quality', type=int, default=70, help='JPEG quality of preview frames')
+    parser.add_argument('--track-cooldown', type=float, default=300.0,
+                        help='Seconds before the same tracked dangerous object alerts and is saved again')
+    parser.add_argument('--class-cooldown', type=float, default=30.0,
+                        help='Minimum seconds between alerts of one dangerous class')
     args = parser.parse_args()
 
     # Используем относительный путь от директории скрипта
     script_dir = os.path.dirname(os.path.abspath(__file__))
     model_path = os.path.join(script_dir, 'models', args.model)
 
-    # Режим: кадры приходят от клиента по stdin (base64 JPEG)
-    if args.stdin:
-        print(safe_json_dumps({"status": "info", "message": f"STDIN mode enabled. Model: {model_path}"}))
+    # Режим: кадры приходят от клиента по stdin (base64 JPEG в JSON строках или бинарные кадры)
+    if args.stdin or args.stdin_binary:
+        # Пишут два потока (чтение stdin сообщает об ошибках) - сообщения не должны перемешиваться
+        send_lock = threading.Lock()
+        if args.stdin_binary:
+            # stdout занимают бинарные кадры, поэтому сообщения тоже идут кадрами
+            frames_out = claim_stdout()
+
+            def send(message, payload=b''):
+                with send_lock:
+                    write_frame(frames_out, message, payload)
+        else:
+            def send(message):
+                with send_lock:
+                    print(safe_json_dumps(message), flush=True)
+
+        mode = 'binary' if args.stdin_binary else 'JSON'
+        send({"status": "info", "message": f"STDIN mode enabled ({mode}). Model: {model_path}"})
         try:
-            model = YOLO(model_path)
-            print(safe_json_dumps({"status": "info", "message": "Модель успешно загружена"}))
+            model = load_model(model_path, args.backend, int8=args.int8)
+            send({"status": "info", "message": "Модель успешно загружена"})
         except Exception as e:
-            print(safe_json_dumps({"status": "error", "message": f"Ошибка загрузки модели: {str(e)}"}))
+            send({"status": "error", "message": f"Ошибка загрузки модели: {str(e)}"})
             return
 
-        for raw_line in sys.stdin:
-            line = raw_line.strip()
-            if not line:
-                continue
-
-            try:
-                payload = json.loads(line)
-                image_b64 = payload.get('image', '')
-                if not image_b64:
-                    continue
-
-                img_bytes = base64.b64decode(image_b64)
-                np_arr = np.frombuffer(img_bytes, dtype=np.uint8)
-                frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-                if frame is None:
-                    continue
-
-                results = model(frame, verbose=False)
-                annotated = frame
-                detections = []
-                for result in results:
-                    annotated = result.plot()
-                    if hasattr(result, 'boxes') and result.boxes is not None:
-                        for box in result.boxes:
-                            try:
-                                cls = int(box.cls[0])
-                                conf = float(box.conf[0])
-                                name = result.names.get(cls, str(cls))
-                                detections.append({"class": name, "confidence": conf})
-                            except Exception:
-                                pass
-                    break
-
-                ok, jpeg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                if not ok:
-                    continue
-
-                out_b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
-                print(safe_json_dumps({
-                    "status": "frame",
-                    "image": out_b64,
-                    "detections": detections
-                }))
-            except Exception as e:
-                print(safe_json_dumps({"status": "error", "message": f"STDIN frame processing error: {str(e)}"}))
+        run_stdin(model, send, binary=args.stdin_binary)
         return
 
     # Режим: пробуем открыть локальную камеру (Linux /dev/video0)
@@ -431,10 +501,14 @@ def main():
         "message": f"Запуск анализа с параметрами:\nМодель: {model_path}\nКамера: {camera_id}"
     }))
 
-    analyzer = CameraAnalyzer(model_path, camera_id)
+    analyzer = CameraAnalyzer(model_path, camera_id, backend=args.backend, int8=args.int8,
+                              decoder=args.decoder, decode_size=args.decode_size,
+                              track_cooldown=args.track_cooldown, class_cooldown=args.class_cooldown,
+                              preview_fps=args.preview_fps, preview_size=args.preview_size,
+                              preview_quality=args.preview_quality)
 
     def signal_handler(signum, frame):
-        print(safe_json_dumps({"status": "info", "message": "Получен сигнал остановки"}))
+        analyzer._send({"status": "info", "message": "Получен сигнал остановки"})
         analyzer.stop()
         sys.exit(0)
 
@@ -448,7 +522,7 @@ def main():
         except KeyboardInterrupt:
             analyzer.stop()
     else:
-        print(safe_json_dumps({"status": "error", "message": "Не удалось запустить анализ"}))
+        analyzer._send({"status": "error", "message": "Не удалось запустить анализ"})
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,243 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+from camera_analysis import StdinStats, result_detections
+from framing import claim_stdout, read_frame, write_frame
+from model_backend import BACKENDS, load_model
+
+# Общий сервис инференса для всех WebSocket сессий камеры (/ws/camera).
+# Один процесс и одна копия каждой модели на всех клиентов. Вход - бинарные
+# кадры framing.py с заголовком {"type": "open" | "frame" | "close", "session": id},
+# выход - кадры с тем же session, по которому server.js находит нужный сокет.
+
+class Session:
+    """Состояние одной сессии: модель и последний необработанный кадр"""
+
+    def __init__(self, session_id, model_name):
+        self.id = session_id
+        self.model_name = model_name
+        self.pending = None
+        self.received = 0
+        self.dropped = 0
+        self.stats = StdinStats(self)
+
+class SessionScheduler:
+    """Раздает кадры сессий на инференс.
+
+    У каждой сессии - один слот "побеждает последний". Сессии обходятся по кругу,
+    и в батч попадает не больше одного кадра от сессии: медленный клиент не ждет,
+    пока обработаются очереди быстрых.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sessions = {}
+        self._order = []
+        self._next = 0
+        self._closed = False
+
+    def open(self, session_id, model_name):
+        with self._condition:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, model_name)
+                self._sessions[session_id] = session
+                self._order.append(session_id)
+            else:
+                session.model_name = model_name
+            return session
+
+    def close_session(self, session_id):
+        with self._condition:
+            if self._sessions.pop(session_id, None) is not None:
+                index = self._order.index(session_id)
+                self._order.pop(index)
+                if index < self._next:
+                    self._next -= 1
+
+    def put(self, session_id, item):
+        with self._condition:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            if session.pending is not None:
+                session.dropped += 1
+            session.pending = item
+            session.received += 1
+            self._condition.notify()
+            return True
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def next_batch(self, max_batch):
+        """Ждет кадры и возвращает (имя модели, [(сессия, кадр), ...]); None - вход закрыт.
+
+        Батч собирается из сессий с одной моделью, начиная со следующей по кругу
+        после сессии, обслуженной первой в прошлый раз.
+        """
+        with self._condition:
+            while True:
+                ready = self._ready_sessions()
+                if ready or self._closed:
+                    break
+                self._condition.wait()
+            if not ready:
+                return None
+
+            model_name = ready[0].model_name
+            batch = []
+            for session in ready:
+                if session.model_name != model_name:
+                    continue
+                batch.append((session, session.pending))
+                session.pending = None
+                if len(batch) >= max_batch:
+                    break
+            self._next = (self._order.index(ready[0].id) + 1) % len(self._order)
+            return model_name, batch
+
+    def _ready_sessions(self):
+        count = len(self._order)
+        rotated = [self._order[(self._next + i) % count] for i in range(count)]
+        return [self._sessions[sid] for sid in rotated if self._sessions[sid].pending is not None]
+
+def read_stdin(scheduler, send, default_model):
+    """Поток чтения: служебные кадры открывают/закрывают сессии, кадры с JPEG - в слоты"""
+    stdin = sys.stdin.buffer
+    try:
+        while True:
+            try:
+                message = read_frame(stdin)
+            except Exception as e:
+                # Разметка потока потеряна - дальше читать нельзя
+                send({"status": "error", "message": f"Camera service framing error: {str(e)}"})
+                return
+            if message is None:
+                return
+
+            header, payload = message
+            session_id = header.get('session')
+            kind = header.get('type', 'frame')
+            if session_id is None:
+                continue
+
+            if kind == 'open':
+                model_name = header.get('model') or default_model
+                scheduler.open(session_id, model_name)
+                send({"status": "info", "session": session_id,
+                      "message": f"Сессия подключена к общему сервису (model={model_name})"})
+            elif kind == 'close':
+                scheduler.close_session(session_id)
+            elif payload:
+                if not scheduler.put(session_id, (time.time(), header, payload)):
+                    send({"status": "error", "session": session_id, "message": "Unknown camera session"})
+    finally:
+        scheduler.close()
+
+class ModelPool:
+    """Одна загруженная копия каждой модели на все сессии"""
+
+    def __init__(self, models_dir, backend=None, int8=None):
+        self.models_dir = models_dir
+        self.backend = backend
+        self.int8 = int8
+        self._models = {}
+
+    def get(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            # Имя модели приходит от клиента - разрешаем только файлы из models_dir
+            path = os.path.join(self.models_dir, os.path.basename(model_name))
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Модель не найдена: {model_name}")
+            model = load_model(path, self.backend, int8=self.int8)
+            self._models[model_name] = model
+        return model
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models-dir', type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'),
+                        help='Directory with model weights')
+    parser.add_argument('--default-model', type=str, default='all.pt', help='Model for sessions opened without one')
+    parser.add_argument('--max-batch', type=int, default=4, help='Maximum number of sessions per batched inference')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help='Inference backend (default: YOLO_BACKEND env or pytorch)')
+    parser.add_argument('--int8', action='store_true', default=None,
+                        help='Use the INT8 variant made by quantize.py (default: YOLO_INT8 env)')
+    args = parser.parse_args()
+
+    # stdout занимают бинарные кадры; пишут поток чтения и основной цикл
+    frames_out = claim_stdout()
+    send_lock = threading.Lock()
+
+    def send(message, payload=b''):
+        with send_lock:
+            write_frame(frames_out, message, payload)
+
+    pool = ModelPool(args.models_dir, args.backend, args.int8)
+    try:
+        pool.get(args.default_model)
+    except Exception as e:
+        send({"status": "error", "message": f"Ошибка загрузки модели: {str(e)}"})
+    send({"status": "service_ready", "max_batch": args.max_batch})
+
+    scheduler = SessionScheduler()
+    threading.Thread(target=read_stdin, args=(scheduler, send, args.default_model), daemon=True).start()
+
+    while True:
+        batch = scheduler.next_batch(max(1, args.max_batch))
+        if batch is None:
+            break
+        model_name, items = batch
+        started_at = time.time()
+
+        frames = []
+        sessions = []
+        for session, (received_at, header, jpeg_in) in items:
+            frame = cv2.imdecode(np.frombuffer(jpeg_in, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            frames.append(frame)
+            sessions.append((session, received_at, header))
+        if not frames:
+            continue
+
+        try:
+            # Кадры разных клиентов - один прогон модели
+            results = pool.get(model_name).predict(frames, verbose=False)
+        except Exception as e:
+            for session, _, _ in sessions:
+                send({"status": "error", "session": session.id, "message": f"Ошибка инференса: {str(e)}"})
+            continue
+
+        for (session, received_at, header), result in zip(sessions, results):
+            ok, jpeg = cv2.imencode('.jpg', result.plot(), [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if not ok:
+                continue
+            response = {
+                "status": "frame",
+                "session": session.id,
+                "detections": result_detections(result),
+                "batch": len(frames)
+            }
+            if 'id' in header:
+                response['id'] = header['id']
+            response['lag_ms'] = round(session.stats.record(received_at, started_at), 1)
+            send(response, jpeg.tobytes())
+
+            report = session.stats.report()
+            if report:
+                report['session'] = session.id
+                send(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import numpy as np
+from ultralytics import YOLO
+
+from model_backend import BACKENDS, load_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def collect_images(source):
+    if os.path.isdir(source):
+        return sorted(p for p in glob.glob(os.path.join(source, '*')) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return [source]
+
+def box_iou(box, boxes):
+    """IoU одного бокса xyxy с массивом боксов xyxy"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+def detections(result):
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4)), np.zeros(0, dtype=int), np.zeros(0)
+    return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()
+
+def compare(reference, candidate, iou_tol, conf_tol, conf_threshold=0.0):
+    """Жадно сопоставляет детекции эталона и бэкенда одного класса.
+
+    Детекции без пары у самого порога уверенности не считаются расхождением:
+    небольшая разница в confidence переводит их через порог.
+    Возвращает число сопоставленных пар и список расхождений.
+    """
+    borderline = conf_threshold + conf_tol
+    ref_xyxy, ref_cls, ref_conf = detections(reference)
+    cand_xyxy, cand_cls, cand_conf = detections(candidate)
+    used = np.zeros(len(cand_cls), dtype=bool)
+    matched = 0
+    problems = []
+
+    for i in np.argsort(-ref_conf):
+        same_class = (cand_cls == ref_cls[i]) & ~used
+        if not same_class.any():
+            if ref_conf[i] < borderline:
+                continue
+            problems.append(f"missing {reference.names[ref_cls[i]]} ({ref_conf[i]:.2f})")
+            continue
+        ious = np.where(same_class, box_iou(ref_xyxy[i], cand_xyxy), -1.0)
+        j = int(np.argmax(ious))
+        if ious[j] < iou_tol:
+            if ref_conf[i] < borderline:
+                continue
+            problems.append(f"box of {reference.names[ref_cls[i]]} moved (IoU {ious[j]:.3f})")
+            continue
+        used[j] = True
+        matched += 1
+        if abs(ref_conf[i] - cand_conf[j]) > conf_tol:
+            problems.append(f"confidence of {reference.names[ref_cls[i]]}: {ref_conf[i]:.3f} vs {cand_conf[j]:.3f}")
+
+    for j in np.flatnonzero(~used & (cand_conf >= borderline)):
+        problems.append(f"extra {candidate.names[cand_cls[j]]} ({cand_conf[j]:.2f})")
+    return matched, problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare detections of an exported backend with the PyTorch model')
+    parser.add_argument('--weights', type=str, nargs='+', required=True, help='Path to .pt weights')
+    parser.add_argument('--source', type=str, required=True, help='Image or directory with sample images')
+    parser.add_argument('--backend', type=str, choices=[b for b in BACKENDS if b != 'pytorch'], default='onnx')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    parser.add_argument('--iou-tol', type=float, default=0.9, help='Minimum IoU between matched boxes')
+    parser.add_argument('--conf-tol', type=float, default=0.05, help='Maximum confidence difference')
+    parser.add_argument('--int8', action='store_true',
+                        help='Compare the INT8 variant made by quantize.py instead of the fp32 export')
+    args = parser.parse_args()
+
+    images = collect_images(args.source)
+    if not images:
+        print(f"No images found in {args.source}")
+        sys.exit(2)
+
+    ok = True
+    for weights in args.weights:
+        reference_model = YOLO(weights)
+        # int8 задается явно: YOLO_INT8 из окружения не должен подменять сравниваемую модель
+        backend_model = load_model(weights, args.backend, fallback=False, int8=args.int8)
+        # Имена классов берутся из метаданных экспорта - они должны совпадать с .pt
+        if reference_model.names != backend_model.names:
+            print(json.dumps({'weights': weights, 'backend': args.backend, 'int8': args.int8, 'status': 'fail',
+                              'problems': ['class names differ']}, ensure_ascii=False))
+            ok = False
+            continue
+
+        total = matched = 0
+        problems = []
+        for image in images:
+            reference = reference_model.predict(image, conf=args.conf, verbose=False)[0]
+            candidate = backend_model.predict(image, conf=args.conf, verbose=False)[0]
+            image_matched, image_problems = compare(reference, candidate, args.iou_tol, args.conf_tol, args.conf)
+            total += len(reference.boxes) if reference.boxes is not None else 0
+            matched += image_matched
+            problems.extend(f"{os.path.basename(image)}: {p}" for p in image_problems)
+
+        status = 'ok' if not problems else 'fail'
+        ok = ok and not problems
+        print(json.dumps({
+            'weights': weights,
+            'backend': args.backend,
+            'int8': args.int8,
+            'status': status,
+            'images': len(images),
+            'detections': total,
+            'matched': matched,
+            'problems': problems
+        }, ensure_ascii=False))
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
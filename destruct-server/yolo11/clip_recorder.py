@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from queue import Full, Queue
+import cv2
+import numpy as np
+
+# Запись коротких роликов по тревоге: кадры камеры постоянно лежат в памяти
+# в виде JPEG (кольцевой буфер на pre_roll секунд), по тревоге к ним
+# добавляются post_roll секунд, и готовый ролик пишет в MP4 отдельный поток.
+
+class ClipBuffer:
+    """Кольцевой буфер закодированных кадров одной камеры и запись ролика по тревоге.
+
+    Память ограничена дважды: буфер держит не больше pre_roll секунд и не больше
+    max_bytes байт; ролик не длиннее max_clip секунд (повторные тревоги продлевают
+    post-roll, но не дальше этого предела). rgb=True - кадры приходят в RGB
+    (ffmpeg rgb24) и перед кодированием переводятся в BGR, который ждет OpenCV.
+    """
+
+    def __init__(self, camera_id, writer, pre_roll=5.0, post_roll=5.0, fps=10.0, quality=80,
+                 max_bytes=32 * 1024 * 1024, max_clip=60.0, rgb=False):
+        self.camera_id = camera_id
+        self.writer = writer
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_clip = max_clip
+        self.rgb = rgb
+        # (время, JPEG) - самые старые слева
+        self.frames = deque()
+        self.bytes = 0
+        self.last_added = 0.0
+        # Ролик, который сейчас дописывается: кадры, время начала и конца записи
+        self.clip = None
+        self.clip_started = 0.0
+        self.clip_until = 0.0
+        self.clip_reason = ''
+        self.lock = threading.Lock()
+
+    def add(self, frame, now=None):
+        """Кладет кадр в буфер (не чаще fps); вызывается из потока захвата камеры"""
+        now = time.time() if now is None else now
+        if now - self.last_added < self.interval:
+            return
+        if self.rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        success, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not success:
+            return
+        self.last_added = now
+        data = jpeg.tobytes()
+
+        finished = None
+        with self.lock:
+            self.frames.append((now, data))
+            self.bytes += len(data)
+            while self.frames and (now - self.frames[0][0] > self.pre_roll or self.bytes > self.max_bytes):
+                self.bytes -= len(self.frames.popleft()[1])
+
+            if self.clip is not None:
+                self.clip.append((now, data))
+                if now >= self.clip_until:
+                    finished, self.clip = self.clip, None
+        if finished:
+            self.writer.submit(self.camera_id, finished, self.clip_reason)
+
+    def trigger(self, reason, now=None):
+        """Тревога: начинает ролик с pre-roll или продлевает post-roll текущего"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.clip is None:
+                self.clip = list(self.frames)
+                self.clip_started = self.clip[0][0] if self.clip else now
+                self.clip_reason = reason
+                started = True
+            else:
+                started = False
+            self.clip_until = min(now + self.post_roll, self.clip_started + self.max_clip)
+        return started
+
+    def flush(self):
+        """Отдает на запись недописанный ролик (при остановке камеры)"""
+        with self.lock:
+            finished, self.clip = self.clip, None
+        if finished:
+            self.writer.submit(self.camera_id, finished, self.clip_reason)
+
+class ClipWriter:
+    """Фоновый поток, который пишет ролики в MP4 - запись на диск не тормозит инференс.
+
+    Очередь ограничена: если диск не успевает, новый ролик отбрасывается
+    с сообщением об ошибке, а не копится в памяти.
+    """
+
+    def __init__(self, save_dir, send, max_pending=4):
+        self.save_dir = save_dir
+        self.send = send
+        self.queue = Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, camera_id, frames, reason):
+        try:
+            self.queue.put_nowait((camera_id, frames, reason))
+        except Full:
+            self.send(camera_id, {"status": "error", "message": "Очередь записи роликов переполнена, ролик пропущен"})
+
+    def close(self, timeout=10.0):
+        """Дописывает очередь и останавливает поток"""
+        self.queue.put((None, None, None))
+        self.thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            camera_id, frames, reason = self.queue.get()
+            if camera_id is None:
+                break
+            try:
+                path = self._write(camera_id, frames, reason)
+                if path:
+                    self.send(camera_id, {
+                        "status": "info",
+                        "message": f"Сохранен ролик: {path}",
+                        "clip": path,
+                        "duration": round(frames[-1][0] - frames[0][0], 1)
+                    })
+            except Exception as e:
+                self.send(camera_id, {"status": "error", "message": f"Ошибка записи ролика: {str(e)}"})
+
+    def _write(self, camera_id, frames, reason):
+        first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+        if first is None:
+            return None
+        duration = frames[-1][0] - frames[0][0]
+        # Реальная частота буфера: кадры берутся не чаще fps, но камера может отдавать и реже
+        fps = (len(frames) - 1) / duration if duration > 0 and len(frames) > 1 else 1.0
+
+        timestamp = datetime.fromtimestamp(frames[0][0]).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.save_dir, f'clip_{camera_id}_{reason}_{timestamp}.mp4')
+        height, width = first.shape[:2]
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), max(fps, 1.0), (width, height))
+        try:
+            out.write(first)
+            for _, data in frames[1:]:
+                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None and frame.shape[:2] == (height, width):
+                    out.write(frame)
+        finally:
+            out.release()
+        return path
@@ -0,0 +1,11 @@
+# Общий код скриптов yolo11: вывод сообщений и кадров, файлы, анализ сцены,
+# разбор детекций, конвейер FrameSource -> Detector -> Sink и общий цикл
+# детекции detect.py / quick_detect.py
+from core.io import encode_jpeg, safe_json_dumps, send_frame_to_stdout
+from core.fs import ensure_dir
+from core.scene import detect_motion, is_night_mode
+from core.detections import (DANGEROUS_OBJECTS, FILE_DANGEROUS_OBJECTS, Detections, class_mask,
+                             process_results)
+from core.pipeline import (Detector, FrameSink, FrameSource, JsonSink, Pipeline, Sink, VideoSink, VideoSource,
+                           YoloDetector)
+from core.video import DetectionPolicy, run_detection
@@ -0,0 +1,128 @@
+import numpy as np
+
+# Разбор результата YOLO одним проходом по массивам: cls, conf и xyxy берутся
+# с устройства один раз, сдвигаются/обрезаются/фильтруются векторно, а опасные
+# классы проверяются маской по id класса, посчитанной один раз на модель.
+
+DANGEROUS_OBJECTS = frozenset({
+    'antifa', 'cocaine', 'confederate-flag', 'destroy',
+    'fire', 'glass-defect', 'gun', 'heroin', 'isis',
+    'knife', 'marijuana', 'rocket', 'shrooms', 'smoke', 'swastika',
+    'wolfsangel', 'celtic_cross', 'Violence', 'graffiti'
+})
+# При разборе файлов (detect.py, quick_detect.py) опасной считается и сигарета
+FILE_DANGEROUS_OBJECTS = DANGEROUS_OBJECTS | {'cigarette'}
+
+# (names, набор классов) -> маска; names - словарь модели, живет столько же, сколько модель
+_mask_cache = {}
+
+def class_mask(names, classes=DANGEROUS_OBJECTS):
+    """Булев массив по id класса: True, если имя класса входит в classes (без учета регистра)"""
+    key = (id(names), id(classes))
+    cached = _mask_cache.get(key)
+    if cached is not None and cached[0] is names:
+        return cached[1]
+    lowered = {c.lower() for c in classes}
+    items = names.items() if isinstance(names, dict) else enumerate(names)
+    items = list(items)
+    mask = np.zeros(max((int(i) for i, _ in items), default=-1) + 1, dtype=bool)
+    for i, name in items:
+        mask[int(i)] = str(name).lower() in lowered
+    _mask_cache[key] = (names, mask)
+    return mask
+
+class Detections:
+    """Детекции одного кадра в виде массивов: xyxy (N, 4), cls (N,), conf (N,)"""
+
+    __slots__ = ('xyxy', 'cls', 'conf', 'names', 'dangerous')
+
+    def __init__(self, xyxy, cls, conf, names, dangerous):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+        self.names = names
+        self.dangerous = dangerous
+
+    @classmethod
+    def from_result(cls, result, offset=(0, 0), scale=1.0, frame_size=None, min_conf=0.0,
+                    dangerous_classes=DANGEROUS_OBJECTS):
+        """Детекции результата YOLO в координатах исходного кадра.
+
+        scale - во сколько раз вход модели меньше области кадра, offset - левый
+        верхний угол области в кадре, frame_size=(ширина, высота) - по нему боксы
+        обрезаются; боксы нулевой площади и с conf < min_conf отбрасываются.
+        """
+        names = getattr(result, 'names', None) or {}
+        boxes = getattr(result, 'boxes', None)
+        if boxes is None or len(boxes) == 0:
+            return cls.empty(names)
+
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float32, copy=False)
+        classes = boxes.cls.cpu().numpy().astype(np.int64)
+        conf = boxes.conf.cpu().numpy().astype(np.float32, copy=False)
+        if scale != 1.0:
+            xyxy = xyxy / scale
+        if offset[0] or offset[1]:
+            xyxy = xyxy + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+        if frame_size is not None:
+            width, height = frame_size
+            xyxy = np.clip(xyxy, 0, [width, height, width, height])
+
+        keep = (conf >= min_conf) & (xyxy[:, 2] > xyxy[:, 0]) & (xyxy[:, 3] > xyxy[:, 1])
+        if not keep.all():
+            xyxy, classes, conf = xyxy[keep], classes[keep], conf[keep]
+
+        mask = class_mask(names, dangerous_classes)
+        # Класс вне словаря модели (не должно случаться) опасным не считается
+        known = classes < len(mask)
+        dangerous = np.zeros(len(classes), dtype=bool)
+        dangerous[known] = mask[classes[known]]
+        return cls(xyxy, classes, conf, names, dangerous)
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int64),
+                   np.zeros(0, dtype=np.float32), names or {}, np.zeros(0, dtype=bool))
+
+    def __len__(self):
+        return len(self.cls)
+
+    def class_names(self):
+        return [self.names.get(int(c), str(int(c))) if isinstance(self.names, dict) else self.names[int(c)]
+                for c in self.cls]
+
+    def dangerous_names(self):
+        return [name for name, flag in zip(self.class_names(), self.dangerous) if flag]
+
+    def to_dicts(self, boxes=True):
+        """Записи для анализаторов и клиента: {"class", "confidence", "box", "dangerous"}"""
+        names = self.class_names()
+        conf = self.conf.tolist()
+        if not boxes:
+            return [{"class": name, "confidence": c} for name, c in zip(names, conf)]
+        xyxy = np.rint(self.xyxy).astype(np.int32).tolist()
+        return [{"class": name, "confidence": c, "box": box, "dangerous": bool(flag)}
+                for name, c, box, flag in zip(names, conf, xyxy, self.dangerous.tolist())]
+
+def process_results(results, names=None, dangerous_classes=FILE_DANGEROUS_OBJECTS, verbose=False):
+    """Классы результатов YOLO и опасные среди них: (множество классов, есть ли опасные, список опасных).
+
+    Печатает найденные классы и предупреждение - это читает server.js;
+    verbose добавляет строку на каждый опасный класс.
+    """
+    detected_classes = set()
+    found_dangerous = []
+    for result in results:
+        detections = Detections.from_result(result, dangerous_classes=dangerous_classes)
+        detected_classes.update(detections.class_names())
+        found_dangerous += [obj for obj in detections.dangerous_names() if obj not in found_dangerous]
+
+    if detected_classes:
+        print(f"detected {len(detected_classes)} objects: {', '.join(detected_classes)}")
+        if verbose:
+            for obj in found_dangerous:
+                print(f"Found dangerous object: {obj}")
+        if found_dangerous:
+            print(f"WARNING: Dangerous objects detected: {', '.join(found_dangerous)}")
+            return detected_classes, True, found_dangerous
+    return detected_classes, False, []
@@ -0,0 +1,14 @@
+import os
+import shutil
+
+def ensure_dir(directory):
+    """Создает директорию; существующая директория очищается"""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    else:
+        for item in os.listdir(directory):
+            item_path = os.path.join(directory, item)
+            if os.path.isfile(item_path):
+                os.unlink(item_path)
+            elif os.path.isdir(item_path):
+                shutil.rmtree(item_path)
@@ -0,0 +1,35 @@
+import base64
+import json
+import sys
+import cv2
+
+def safe_json_dumps(data):
+    try:
+        # Сообщение - одна строка JSON: переносы внутри строк экранируются
+        return json.dumps(data, ensure_ascii=False).replace('\n', '\\n').replace('\r', '\\r')
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "message": f"JSON serialization error: {str(e)}"
+        })
+
+def encode_jpeg(frame, quality=85):
+    """JPEG кадра в bytes или None, если кодирование не удалось"""
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+def send_frame_to_stdout(frame, frame_number=None, total_frames=None, quality=85):
+    """Отправляет кадр (обычно с боксами) в stdout в формате JSON для SSE"""
+    try:
+        jpeg = encode_jpeg(frame, quality)
+        if jpeg is None:
+            return
+        message = {
+            'status': 'frame',
+            'image': base64.b64encode(jpeg).decode('utf-8'),
+            'frame_number': frame_number,
+            'total_frames': total_frames
+        }
+        print(json.dumps(message), flush=True)
+    except Exception as e:
+        print(f"Error sending frame: {e}", file=sys.stderr)
@@ -0,0 +1,195 @@
+import time
+import cv2
+
+from frame_source import convert_frame, open_capture, recycle_frame, scaled_size
+from core.detections import DANGEROUS_OBJECTS, Detections
+from core.io import safe_json_dumps, send_frame_to_stdout
+
+# Конвейер FrameSource -> Detector -> Sink: источник отдает кадры, детектор
+# прогоняет их батчами, приемники получают каждый кадр с результатом.
+# Батчинг, декодирование и кодирование кадров живут в одном месте, а каждая
+# часть заменяется своей реализацией (другой источник, модель, вывод).
+
+class FrameSource:
+    """Источник кадров: итерация дает (номер кадра с 1, кадр)"""
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def recycle(self, frame):
+        """Кадр больше не нужен - источник может переиспользовать его память"""
+
+    def close(self):
+        pass
+
+class VideoSource(FrameSource):
+    """Видео, поток или камера через frame_source.open_capture (декодер opencv или ffmpeg).
+
+    start_frame / end_frame - диапазон кадров [start_frame, end_frame) (шарды
+    sharding.py): номера кадров идут с start_frame + 1.
+    """
+
+    def __init__(self, source, decoder=None, size=None, max_frames=None, start_frame=0, end_frame=None):
+        self.source = source
+        self.size = size
+        self.max_frames = max_frames
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.cap = open_capture(source, decoder, size=size)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open source: {source}")
+        if start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        # Размер кадров после масштабирования size
+        self.width, self.height = scaled_size(int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                              int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), size)
+
+    def __iter__(self):
+        index = self.start_frame
+        while ((self.max_frames is None or index - self.start_frame < self.max_frames)
+               and (self.end_frame is None or index < self.end_frame)):
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            index += 1
+            yield index, convert_frame(self.cap, frame, self.size)
+
+    def recycle(self, frame):
+        recycle_frame(self.cap, frame)
+
+    def close(self):
+        self.cap.release()
+
+class Detector:
+    """Детектор: список кадров -> список пар (сырой результат модели, Detections)"""
+
+    def detect(self, frames):
+        raise NotImplementedError
+
+class YoloDetector(Detector):
+    """Модель YOLO (любой backend из model_backend.load_model), один predict на батч"""
+
+    def __init__(self, model, imgsz=None, conf=None, classes=None, dangerous_classes=DANGEROUS_OBJECTS):
+        self.model = model
+        self.predict_args = {'verbose': False}
+        if imgsz:
+            self.predict_args['imgsz'] = imgsz
+        if conf is not None:
+            self.predict_args['conf'] = conf
+        if classes is not None:
+            self.predict_args['classes'] = classes
+        self.dangerous_classes = dangerous_classes
+
+    def detect(self, frames):
+        results = self.model.predict(frames, **self.predict_args)
+        output = []
+        for frame, result in zip(frames, results):
+            h, w = frame.shape[:2]
+            output.append((result, Detections.from_result(result, frame_size=(w, h),
+                                                          dangerous_classes=self.dangerous_classes)))
+        return output
+
+class Sink:
+    """Приемник результатов; вызывается по порядку кадров"""
+
+    def write(self, index, frame, result, detections):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class JsonSink(Sink):
+    """Детекции кадров строками JSON в stdout (кадры без детекций пропускаются)"""
+
+    def write(self, index, frame, result, detections):
+        if len(detections):
+            print(safe_json_dumps({
+                "status": "detections",
+                "frame_number": index,
+                "detections": detections.to_dicts()
+            }), flush=True)
+
+class FrameSink(Sink):
+    """Кадры с боксами в stdout для SSE - каждый every-й кадр"""
+
+    def __init__(self, every=1, total_frames=None, quality=85):
+        self.every = max(1, every)
+        self.total_frames = total_frames
+        self.quality = quality
+
+    def write(self, index, frame, result, detections):
+        if index % self.every == 0:
+            send_frame_to_stdout(result.plot(), frame_number=index, total_frames=self.total_frames,
+                                 quality=self.quality)
+
+class VideoSink(Sink):
+    """Видео с боксами (mp4v); размер берется с первого кадра"""
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps or 25.0
+        self.writer = None
+
+    def write(self, index, frame, result, detections):
+        annotated = result.plot()
+        if self.writer is None:
+            h, w = annotated.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (w, h))
+        self.writer.write(annotated)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+class Pipeline:
+    """Гоняет кадры источника через детектор батчами по batch_size и отдает приемникам.
+
+    run() возвращает статистику: кадры, батчи и время каждой стадии в секундах.
+    """
+
+    def __init__(self, source, detector, sinks=(), batch_size=8):
+        self.source = source
+        self.detector = detector
+        self.sinks = list(sinks)
+        self.batch_size = max(1, batch_size)
+
+    def run(self):
+        stats = {'frames': 0, 'batches': 0, 'decode_s': 0.0, 'detect_s': 0.0, 'sink_s': 0.0}
+        started = time.perf_counter()
+        batch = []
+        try:
+            frames = iter(self.source)
+            while True:
+                before = time.perf_counter()
+                item = next(frames, None)
+                stats['decode_s'] += time.perf_counter() - before
+                if item is not None:
+                    batch.append(item)
+                if batch and (item is None or len(batch) >= self.batch_size):
+                    self._run_batch(batch, stats)
+                    batch = []
+                if item is None:
+                    break
+        finally:
+            self.source.close()
+            for sink in self.sinks:
+                sink.close()
+        stats['total_s'] = time.perf_counter() - started
+        stats['fps'] = stats['frames'] / stats['total_s'] if stats['total_s'] > 0 else 0.0
+        return stats
+
+    def _run_batch(self, batch, stats):
+        before = time.perf_counter()
+        outputs = self.detector.detect([frame for _, frame in batch])
+        stats['detect_s'] += time.perf_counter() - before
+
+        before = time.perf_counter()
+        for (index, frame), (result, detections) in zip(batch, outputs):
+            for sink in self.sinks:
+                sink.write(index, frame, result, detections)
+            self.source.recycle(frame)
+        stats['sink_s'] += time.perf_counter() - before
+        stats['frames'] += len(batch)
+        stats['batches'] += 1
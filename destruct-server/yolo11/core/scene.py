@@ -0,0 +1,23 @@
+import cv2
+import numpy as np
+
+# Порог средней яркости (0-255), ниже которого сцена считается ночной
+NIGHT_BRIGHTNESS = 100
+# Минимальная площадь контура разницы кадров, пикселей, - меньшее считается шумом
+MOTION_MIN_AREA = 500
+
+def is_night_mode(image, threshold=NIGHT_BRIGHTNESS):
+    """Ночная ли сцена: BGR или уже серый кадр"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return np.mean(gray) < threshold
+
+def detect_motion(frame1, frame2, threshold=30, min_area=MOTION_MIN_AREA):
+    """Есть ли движение между двумя кадрами (разница кадров, контуры площадью больше min_area)"""
+    if frame1 is None or frame2 is None:
+        return False
+    gray1 = frame1 if frame1.ndim == 2 else cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+    gray2 = frame2 if frame2.ndim == 2 else cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+    diff = cv2.absdiff(gray1, gray2)
+    _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return any(cv2.contourArea(contour) > min_area for contour in contours)
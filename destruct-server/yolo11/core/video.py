@@ -0,0 +1,411 @@
+import os
+import cv2
+
+from frame_sampling import FrameSampler
+from core.detections import process_results
+from core.fs import ensure_dir
+from core.io import send_frame_to_stdout
+from core.pipeline import VideoSource
+from core.scene import detect_motion, is_night_mode
+from sharding import run_sharded
+
+# Общий запуск detect.py и quick_detect.py: загрузка моделей, выбор кадров,
+# батчевый инференс нескольких моделей по одному декодированному кадру и
+# запись видео. Чем скрипты отличаются (реакция на опасный объект, правило
+# ночного движения, тексты сообщений), задает подкласс DetectionPolicy.
+
+# Сколько декодированных кадров максимум держим в памяти до инференса
+MAX_PENDING_FRAMES = 32
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp')
+
+class DetectionPolicy:
+    """Поведение скрипта детекции в общем цикле.
+
+    Экземпляр передается в процессы-шарды (sharding.py), поэтому подкласс
+    должен быть объявлен на уровне модуля скрипта.
+    """
+
+    # Останавливать ли обработку на первом опасном объекте и что при этом печатать
+    stops_on_danger = False
+    danger_message = "Dangerous object detected, stopping processing"
+    # Сообщение о движении (server.js показывает его пользователю)
+    motion_message = "Motion detected"
+    # Печатать ли строку на каждый опасный класс (process_results verbose)
+    verbose_results = False
+
+    def __init__(self, args):
+        self.args = args
+
+    def check_frame(self, frame, night, motion):
+        """Вызывается на каждом декодированном кадре видео.
+
+        night - ночная ли сцена (None без --night-mode), motion - было ли движение.
+        True - на этом кадре обработка останавливается (инференс на нем не нужен).
+        """
+        return False
+
+    def on_stop_frame(self, runs, frame_number, frame, total_frames):
+        """Кадр, отмеченный check_frame, дошел до обработки (по порядку кадров)"""
+
+    def save_danger(self, model_run, frame):
+        """Сохраняет кадр с опасным объектом перед остановкой"""
+
+def resolve_output_names(weights, names):
+    """Имена выходных директорий для каждой модели.
+
+    Если имен меньше, чем моделей, первая модель пишет в names[0],
+    остальные - в names[0]_<имя весов> (predict, predict_violence, ...).
+    """
+    if len(names) == len(weights):
+        return names
+    base = names[0]
+    return [base] + [f"{base}_{os.path.splitext(os.path.basename(w))[0]}" for w in weights[1:]]
+
+def resolve_classes(model, classes_arg, multi_model=False):
+    if not classes_arg:
+        return None
+    try:
+        class_names = [x.strip() for x in classes_arg.split(',')]
+        print(f"Using classes: {class_names}")
+
+        all_classes = model.names
+        class_indices = []
+        for name in class_names:
+            for idx, class_name in all_classes.items():
+                if class_name == name:
+                    class_indices.append(idx)
+                    break
+
+        print(f"Found class indices: {class_indices}")
+        # В режиме нескольких моделей фильтр относится только к моделям, у которых есть такие классы
+        if multi_model and not class_indices:
+            print("No requested classes in this model, class filter disabled")
+            return None
+        return class_indices
+    except Exception as e:
+        print(f"Error parsing classes: {e}")
+        return None
+
+def annotate_combined(results, img=None):
+    """Рисует боксы всех моделей на одном кадре (для стриминга и окна --show)"""
+    combined = img
+    for result in results:
+        combined = result.plot() if combined is None else result.plot(img=combined)
+    return combined
+
+def create_sampler(args, fps):
+    """Настраивает выбор кадров для инференса по аргументам командной строки"""
+    sampler = FrameSampler(
+        vid_stride=args.vid_stride,
+        analysis_fps=args.analysis_fps,
+        source_fps=fps,
+        adaptive=args.adaptive,
+        scene_threshold=args.scene_threshold,
+        max_skip=args.max_skip
+    )
+    if sampler.enabled:
+        print(f"Frame sampling enabled: stride {sampler.stride}, adaptive {sampler.adaptive}")
+    return sampler
+
+def predict_batch(runs, frames, args):
+    """Один батчевый прогон каждой модели по списку кадров.
+
+    Возвращает для каждого кадра (в исходном порядке) список пар (model_run, result).
+    """
+    batch_results = [[] for _ in frames]
+    for model_run in runs:
+        results = model_run['model'].predict(
+            source=frames,
+            conf=args.conf,
+            save_txt=args.save_txt,
+            classes=model_run['classes'],
+            stream=True,
+            exist_ok=True
+        )
+        for frame_results, result in zip(batch_results, results):
+            frame_results.append((model_run, result))
+    return batch_results
+
+def prepare_runs(args, load_model, prepare_dirs=True):
+    """Загружает модели и готовит для каждой фильтр классов и выходную директорию.
+
+    load_model=None - только директории, без моделей: при шардировании модели
+    загружает каждый шард, родителю они не нужны.
+    """
+    multi_model = len(args.weights) > 1
+    output_names = resolve_output_names(args.weights, args.name)
+
+    # Каждая модель получает свой фильтр классов и свою выходную директорию
+    runs = []
+    for weights, name in zip(args.weights, output_names):
+        # Load model
+        model = None
+        if load_model is not None:
+            model = load_model(weights, args.backend, int8=args.int8)
+            print(f"Loaded model: {weights}")
+
+        # Create output directory (процессы-шарды пишут в уже подготовленные директории)
+        output_dir = os.path.join(args.project, name)
+        if prepare_dirs:
+            ensure_dir(output_dir)
+            print(f"Output directory: {output_dir}")
+
+        runs.append({
+            'weights': weights,
+            'model': model,
+            'name': name,
+            'classes': resolve_classes(model, args.classes, multi_model) if model is not None else None,
+            'output_dir': output_dir,
+            'is_violence_model': 'violence.pt' in weights,
+            'writer': None,
+            # Последние детекции модели (рисуются на пропущенных кадрах)
+            'last_result': None
+        })
+    return runs
+
+def open_writers(runs, filename, fps, width, height):
+    """Открывает видеозапись каждой модели в ее выходной директории"""
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    for model_run in runs:
+        output_path = os.path.join(model_run['output_dir'], filename)
+        print(f"Saving to: {output_path}")
+        model_run['writer'] = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+def _stop_on_danger(policy, model_run, frame, dangerous_objects):
+    print(policy.danger_message)
+    print(f"Found dangerous objects: {', '.join(dangerous_objects)}")
+    if frame is not None:
+        policy.save_danger(model_run, frame)
+    print("Exiting process due to dangerous object detection")
+
+def process_video(args, runs, source, policy, total_frames, fps, stop_event=None):
+    """Обрабатывает кадры source (core.pipeline.VideoSource) по порядку.
+
+    Закрывает source и видеозаписи моделей. stop_event - общий флаг процессов-шардов
+    (см. sharding.py): как только он выставлен, обработка прекращается.
+    Возвращает (остановлена ли обработка, множество обнаруженных классов).
+    """
+    prev_frame = None
+    all_detected_classes = set()
+    stop_requested = False
+    sampler = create_sampler(args, fps)
+    # Пропущенные кадры нужны только для записи видео и окна --show
+    keep_skipped = args.save or args.show
+    # Декодированные кадры, ожидающие батчевого инференса:
+    # (номер кадра, кадр, нужен ли инференс, останавливает ли кадр обработку)
+    pending = []
+    pending_inference = 0
+    max_pending = max(args.batch, MAX_PENDING_FRAMES)
+
+    try:
+        frames = iter(source)
+        while True:
+            # Другой шард уже остановил обработку
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            item = next(frames, None)
+            stop_frame = False
+            if item is not None:
+                frame_number, frame = item
+                print(f"Processing frame {frame_number}/{total_frames}")
+
+                # Проверяем ночной режим
+                night = None
+                if args.night_mode:
+                    night = is_night_mode(frame)
+                    print("Night mode detected: Night scene" if night else "Night mode detected: Day scene")
+
+                # Проверяем движение
+                motion = False
+                if args.motion_detection:
+                    if prev_frame is not None and detect_motion(prev_frame, frame):
+                        print(policy.motion_message)
+                        motion = True
+                    prev_frame = frame.copy()
+
+                # Правило остановки проверяется по порядку вместе с результатами батча
+                stop_frame = policy.check_frame(frame, night, motion)
+                if stop_frame:
+                    pending.append((frame_number, frame, False, True))
+                elif sampler.should_infer(frame_number, frame, motion):
+                    pending_inference += 1
+                    pending.append((frame_number, frame, True, False))
+                elif keep_skipped:
+                    pending.append((frame_number, frame, False, False))
+                else:
+                    source.recycle(frame)
+
+            # Запускаем инференс, когда набрался батч, видео закончилось или кадр останавливает обработку
+            if pending and (item is None or stop_frame or pending_inference >= args.batch
+                            or len(pending) >= max_pending):
+                frames_to_predict = [f for _, f, infer, _ in pending if infer]
+                batch_results = iter(predict_batch(runs, frames_to_predict, args) if frames_to_predict else [])
+
+                # Кадры батча обрабатываются строго по порядку
+                for frame_number, frame, infer, stops in pending:
+                    if stops:
+                        policy.on_stop_frame(runs, frame_number, frame, total_frames)
+                        return True, all_detected_classes  # Ресурсы закрываются в блоке finally
+
+                    if not infer:
+                        # Пропущенный кадр: рисуем последние детекции каждой модели
+                        last_results = [r['last_result'] for r in runs if r['last_result'] is not None]
+                        if args.save:
+                            for model_run in runs:
+                                last_result = model_run['last_result']
+                                model_run['writer'].write(last_result.plot(img=frame) if last_result is not None else frame)
+                        if args.show:
+                            cv2.imshow('Detection', annotate_combined(last_results, frame))
+                            if cv2.waitKey(1) & 0xFF == ord('q'):
+                                stop_requested = True
+                                break
+                        continue
+
+                    frame_results = next(batch_results)
+
+                    # Отправляем кадр с боксами всех моделей через stdout, если включен стриминг
+                    combined_frame = None
+                    if args.stream_frames or args.show:
+                        combined_frame = annotate_combined([result for _, result in frame_results])
+                    if args.stream_frames and combined_frame is not None:
+                        send_frame_to_stdout(combined_frame, frame_number=frame_number, total_frames=total_frames)
+
+                    # Process results
+                    for model_run, result in frame_results:
+                        model_run['last_result'] = result
+
+                        # Получаем изображение с боксами
+                        annotated_frame = result.plot()
+
+                        # Обрабатываем результаты
+                        frame_classes, has_dangerous, dangerous_objects = process_results(
+                            [result], model_run['model'].names, verbose=policy.verbose_results)
+                        if has_dangerous and policy.stops_on_danger:
+                            # Первый опасный кадр батча останавливает обработку, следующие кадры не пишутся
+                            _stop_on_danger(policy, model_run, annotated_frame, dangerous_objects)
+                            return True, all_detected_classes  # Ресурсы закрываются в блоке finally
+
+                        all_detected_classes.update(frame_classes)
+
+                        if args.save:
+                            model_run['writer'].write(annotated_frame)
+
+                    if args.show and combined_frame is not None:
+                        cv2.imshow('Detection', combined_frame)
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            stop_requested = True
+                            break
+
+                # Кадры батча больше не нужны - их память переиспользует источник
+                for item_frame in pending:
+                    source.recycle(item_frame[1])
+                pending = []
+                pending_inference = 0
+
+            if item is None or stop_requested:
+                break
+
+    finally:
+        # Cleanup
+        source.close()
+        for model_run in runs:
+            if model_run['writer'] is not None:
+                model_run['writer'].release()
+        if args.show:
+            cv2.destroyAllWindows()
+
+    if sampler.enabled:
+        print(sampler.summary())
+
+    return False, all_detected_classes
+
+def process_image(args, runs, policy):
+    """Детекция на изображении; True - обработка остановлена из-за опасного объекта"""
+    print(f"Processing image: {args.source}")
+
+    image_results = []
+    for model_run in runs:
+        # Запуск YOLO с сохранением
+        results = model_run['model'].predict(
+            source=args.source,
+            conf=args.conf,
+            save=True,
+            save_txt=args.save_txt,
+            classes=model_run['classes'],
+            project=args.project,
+            name=model_run['name'],
+            exist_ok=True,
+            show=args.show
+        )
+        image_results.append(results[0] if results else None)
+
+    # Стримим кадр с боксами всех моделей (как --show, но в браузер)
+    annotated_frame = annotate_combined([r for r in image_results if r is not None])
+    if args.stream_frames and annotated_frame is not None:
+        send_frame_to_stdout(annotated_frame, frame_number=1, total_frames=1)
+
+    # Обрабатываем результаты
+    for model_run, result in zip(runs, image_results):
+        if result is None:
+            continue
+        _, has_dangerous, dangerous_objects = process_results(
+            [result], model_run['model'].names, verbose=policy.verbose_results)
+        if has_dangerous and policy.stops_on_danger:
+            # Сохраняется исходное изображение - YOLO уже сохранил размеченное
+            _stop_on_danger(policy, model_run, cv2.imread(args.source), dangerous_objects)
+            return True
+
+    # Проверяем ночной режим для изображения
+    if args.night_mode:
+        frame = cv2.imread(args.source)
+        print("Night mode detected: Night scene" if is_night_mode(frame) else "Night mode detected: Day scene")
+
+    print(f"Image processing completed. Results saved to: {', '.join(r['output_dir'] for r in runs)}")
+    return False
+
+def run_detection(args, policy, load_model):
+    """Детекция по разобранным аргументам detect.py / quick_detect.py.
+
+    load_model - загрузчик моделей (model_backend.load_model или кэш worker.py).
+    Возвращает True, если обработка остановлена (опасный объект, ночное движение).
+    """
+    if args.source.lower().endswith(IMAGE_EXTENSIONS):
+        return process_image(args, prepare_runs(args, load_model), policy)
+
+    # Обработка видео: каждый кадр декодируется один раз и передается всем моделям
+    print(f"Processing video: {args.source}")
+    try:
+        source = VideoSource(args.source, args.decoder, args.decode_size)
+    except RuntimeError:
+        print(f"Error opening video source: {args.source}")
+        return False
+
+    # Размер кадра - после масштабирования --decode-size
+    fps = int(source.fps)
+    total_frames = source.total_frames
+
+    output_filename = os.path.basename(args.source)
+    if args.workers > 1 and total_frames > 0:
+        # Видео делится на диапазоны кадров, каждый обрабатывается своим процессом.
+        # Модели загружает каждый шард, родитель только готовит директории
+        # (load_model воркера здесь не помогает - его кэш живет в другом процессе)
+        source.close()
+        runs = prepare_runs(args, None)
+        stopped, all_detected_classes = run_sharded(policy, args, runs, output_filename, total_frames)
+    else:
+        runs = prepare_runs(args, load_model)
+        if args.save:
+            open_writers(runs, output_filename, fps, source.width, source.height)
+        stopped, all_detected_classes = process_video(args, runs, source, policy, total_frames, fps)
+
+    if stopped:
+        return True
+
+    # Выводим итоговый список обнаруженных классов
+    if all_detected_classes:
+        print(f"Final list of detected objects: {', '.join(all_detected_classes)}")
+
+    print(f"Video processing completed. Results saved to: {', '.join(r['output_dir'] for r in runs)}")
+    return False
@@ -1,135 +1,380 @@
+import time
+# Старт процесса - до импорта TensorFlow/DeepFace: холодный старт включает и его
+PROCESS_STARTED = time.time()
+
 import argparse
 import cv2
 import numpy as np
 import os
-import shutil
 from deepface import DeepFace
-from mtcnn import MTCNN
+from core import ensure_dir, send_frame_to_stdout
+from emotion_output import EmotionStreamWriter, EmotionSummary
+from face_detection import FACE_DETECTORS, create_face_detector, resolve_face_detector
+from tracking import IoUTracker
 import json
-import base64
 import sys
+import traceback
 
-def send_frame_to_stdout(frame, frame_number=None, total_frames=None):
-    """Отправляет кадр с разметкой в stdout (JSON + base64) для отображения в модалке"""
-    try:
-        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        if not ok:
-            return
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
-        message = {
-            'status': 'frame',
-            'image': frame_base64,
-            'frame_number': frame_number,
-            'total_frames': total_frames
-        }
-        print(json.dumps(message), flush=True)
-    except Exception as e:
-        print(f"Error sending frame: {e}", file=sys.stderr)
+# Выходы модели эмоций DeepFace (в этом порядке) и размер ее входа: серое лицо 48x48
+EMOTION_LABELS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+EMOTION_INPUT_SIZE = 48
+# DeepFace.analyze вписывает лицо в квадрат 224x224 с сохранением пропорций (черные
+# поля, preprocessing.resize_image) и только потом уменьшает его до 48x48
+DEEPFACE_INPUT_SIZE = 224
+# Лица меньше этого (в пикселях) дают мусорные эмоции
+MIN_FACE_SIZE = 20
 
-def ensure_dir(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    else:
-        # Очищаем директорию, если она существует
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            if os.path.isfile(item_path):
-                os.unlink(item_path)
-            elif os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-
-def process_emotions(frame, detector):
-    try:
-        if frame is None:
-            return frame, []
+def build_emotion_model():
+    """Keras модель эмоций DeepFace - та же, что внутри DeepFace.analyze(actions=['emotion'])"""
+    return DeepFace.build_model(model_name='Emotion', task='facial_attribute').model
 
-        # MTCNN ожидает RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+class EmotionModels:
+    """Модель эмоций и детекторы лиц, загруженные один раз.
 
-        # Находим лица на кадре
-        faces = detector.detect_faces(rgb_frame)
-        
-        emotions_data = []
-        for face in faces:
-            x, y, w, h = face['box']
-            # Увеличиваем область лица для лучшего распознавания эмоций
-            x = max(0, x - int(w * 0.1))
-            y = max(0, y - int(h * 0.1))
-            w = int(w * 1.2)
-            h = int(h * 1.2)
-            
-            # Обрезаем лицо
-            face_img = frame[y:y+h, x:x+w]
-            
-            if face_img.size == 0:
-                continue
+    В режиме --worker один экземпляр обслуживает все задачи процесса;
+    load_seconds - сколько заняла загрузка (включая детектор по умолчанию).
+    """
 
-            # Слишком маленькие лица дают мусорные эмоции
-            if face_img.shape[0] < 20 or face_img.shape[1] < 20:
-                continue
-                
-            # Анализируем эмоции
-            result = DeepFace.analyze(
-                face_img,
-                actions=['emotion'],
-                enforce_detection=False,
-                silent=True
-            )
-            
-            # Получаем эмоции
-            analysis = result[0] if isinstance(result, list) and result else result
-            emotions = analysis.get('emotion', {}) if isinstance(analysis, dict) else {}
-            dominant_emotion = analysis.get('dominant_emotion') if isinstance(analysis, dict) else None
+    def __init__(self, face_detector=None, face_size=None):
+        start_time = time.time()
+        self.emotion_model = build_emotion_model()
+        # (имя, размер) -> детектор лиц: задачи могут просить разные детекторы
+        self._face_detectors = {}
+        self.face_detector(face_detector, face_size)
+        self.load_seconds = time.time() - start_time
 
-            if not dominant_emotion:
-                continue
-            
-            # Добавляем информацию о лице и эмоциях
-            emotions_data.append({
-                'box': [x, y, w, h],
-                'emotions': emotions,
-                'dominant_emotion': dominant_emotion
-            })
-            
-            # Рисуем рамку и подпись
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 3)
-            
-            # Добавляем фон для текста
-            text = dominant_emotion
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 2.0  # Значительно увеличили размер шрифта
-            thickness = 3
-            (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
-            
-            # Рисуем фон для текста
-            cv2.rectangle(frame, 
-                        (x, y - text_height - 20), 
-                        (x + text_width + 20, y), 
-                        (0, 0, 0), 
-                        -1)
-            
-            # Рисуем текст
-            cv2.putText(frame, 
-                       text, 
-                       (x + 10, y - 10),
-                       font, 
-                       font_scale, 
-                       (0, 255, 0),
-                       thickness)
-            
-            # Выводим информацию в логи
-            print(f"\nОбнаружено лицо с эмоциями:")
-            print(f"Доминирующая эмоция: {dominant_emotion}")
-            print("Детальные оценки эмоций:")
-            for emotion, score in emotions.items():
-                print(f"- {emotion}: {score:.2f}%")
-            
-        return frame, emotions_data
+    def face_detector(self, name=None, size=None):
+        key = (resolve_face_detector(name), size)
+        detector = self._face_detectors.get(key)
+        if detector is None:
+            detector = create_face_detector(*key)
+            self._face_detectors[key] = detector
+        return detector
+
+def find_faces(frame, detector):
+    """Лица кадра (detector - face_detection.FaceDetector): [(box [x, y, w, h] с запасом 10%, вырезка BGR)]"""
+    faces = []
+    for x, y, w, h, _ in detector.detect(frame):
+        # Увеличиваем область лица для лучшего распознавания эмоций
+        x = max(0, x - int(w * 0.1))
+        y = max(0, y - int(h * 0.1))
+        w = int(w * 1.2)
+        h = int(h * 1.2)
+
+        face_img = frame[y:y+h, x:x+w]
+        if face_img.size == 0 or face_img.shape[0] < MIN_FACE_SIZE or face_img.shape[1] < MIN_FACE_SIZE:
+            continue
+        faces.append(([x, y, w, h], face_img))
+    return faces
+
+def prepare_face(face_img):
+    """Вход модели эмоций для вырезки лица: серое 48x48 float32 в 0..255.
+
+    Повторяет DeepFace.analyze (deepface 0.0.93): вписывание в 224x224 с полями,
+    серый, 48x48 (cv2.resize по умолчанию). Собственный детектор лиц, который
+    analyze запускает на вырезке, не повторяется - вырезка уже из бокса детектора.
+    """
+    h, w = face_img.shape[:2]
+    factor = min(DEEPFACE_INPUT_SIZE / h, DEEPFACE_INPUT_SIZE / w)
+    face = cv2.resize(face_img.astype(np.float32), (int(w * factor), int(h * factor)))
+    pad_h = DEEPFACE_INPUT_SIZE - face.shape[0]
+    pad_w = DEEPFACE_INPUT_SIZE - face.shape[1]
+    face = cv2.copyMakeBorder(face, pad_h // 2, pad_h - pad_h // 2, pad_w // 2, pad_w - pad_w // 2,
+                              cv2.BORDER_CONSTANT, value=0)
+    if face.shape[:2] != (DEEPFACE_INPUT_SIZE, DEEPFACE_INPUT_SIZE):
+        face = cv2.resize(face, (DEEPFACE_INPUT_SIZE, DEEPFACE_INPUT_SIZE))
+    return cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE))
+
+def classify_emotions(model, face_images, batch_size=64, prepared=False):
+    """Эмоции для списка вырезок лиц одним прогоном модели на batch_size лиц.
+
+    Возвращает [(оценки эмоций в процентах, доминирующая эмоция)] в порядке вырезок.
+    Предобработка как в DeepFace.analyze (см. prepare_face), яркость 0..1; prepared=True -
+    вырезки уже прошли prepare_face.
+    """
+    if not face_images:
+        return []
+    batch = np.stack([face if prepared else prepare_face(face)
+                      for face in face_images]).astype(np.float32)[..., None] / 255.0
+
+    predictions = []
+    for start in range(0, len(batch), batch_size):
+        # Прямой вызов модели: predict() на маленьких батчах тратит больше на подготовку, чем на счет
+        predictions.append(np.asarray(model(batch[start:start + batch_size], training=False)))
+    predictions = np.concatenate(predictions)
+    predictions = 100.0 * predictions / np.maximum(predictions.sum(axis=1, keepdims=True), 1e-9)
+
+    results = []
+    for scores in predictions:
+        emotions = {label: float(score) for label, score in zip(EMOTION_LABELS, scores)}
+        results.append((emotions, EMOTION_LABELS[int(np.argmax(scores))]))
+    return results
+
+def draw_emotion(frame, box, text):
+    """Рамка лица и подпись над ней"""
+    x, y, w, h = box
+    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 3)
+
+    # Добавляем фон для текста
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 2.0  # Значительно увеличили размер шрифта
+    thickness = 3
+    (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+
+    # Рисуем фон для текста
+    cv2.rectangle(frame,
+                (x, y - text_height - 20),
+                (x + text_width + 20, y),
+                (0, 0, 0),
+                -1)
+
+    # Рисуем текст
+    cv2.putText(frame,
+               text,
+               (x + 10, y - 10),
+               font,
+               font_scale,
+               (0, 255, 0),
+               thickness)
+
+def log_emotions(emotions, dominant_emotion, track_id=None):
+    """Выводит информацию в логи (server.js собирает эмоции из этих строк)"""
+    print(f"\nОбнаружено лицо с эмоциями:")
+    if track_id is not None:
+        print(f"Трек лица: #{track_id}")
+    print(f"Доминирующая эмоция: {dominant_emotion}")
+    print("Детальные оценки эмоций:")
+    for emotion, score in emotions.items():
+        print(f"- {emotion}: {score:.2f}%")
+
+def annotate_emotions(frame, faces, results):
+    """Рисует рамки и подписи лиц, печатает эмоции; возвращает данные для emotions.json"""
+    emotions_data = []
+    for (box, _), (emotions, dominant_emotion) in zip(faces, results):
+        emotions_data.append({
+            'box': box,
+            'emotions': emotions,
+            'dominant_emotion': dominant_emotion
+        })
+        draw_emotion(frame, box, dominant_emotion)
+        log_emotions(emotions, dominant_emotion)
+    return emotions_data
+
+def process_frames(frames, detector, emotion_model):
+    """Эмоции лиц нескольких кадров: все лица всех кадров классифицируются одним батчем.
+
+    Возвращает [(кадр с разметкой, данные эмоций кадра)] в порядке кадров.
+    """
+    frame_faces = []
+    for frame in frames:
+        try:
+            frame_faces.append(find_faces(frame, detector) if frame is not None else [])
+        except Exception as e:
+            print(f"Error in face detection: {str(e)}")
+            frame_faces.append([])
+
+    try:
+        results = classify_emotions(emotion_model, [face_img for faces in frame_faces for _, face_img in faces])
     except Exception as e:
         print(f"Error in emotion detection: {str(e)}")
-        return frame, []
+        return [(frame, []) for frame in frames]
 
-def main():
+    output = []
+    offset = 0
+    for frame, faces in zip(frames, frame_faces):
+        frame_results = results[offset:offset + len(faces)]
+        offset += len(faces)
+        output.append((frame, annotate_emotions(frame, faces, frame_results) if frame is not None else []))
+    return output
+
+def process_emotions(frame, detector, emotion_model):
+    """Эмоции лиц одного кадра: (кадр с разметкой, данные эмоций)"""
+    return process_frames([frame], detector, emotion_model)[0]
+
+class FaceTrack:
+    """Одно лицо, сопровождаемое по кадрам видео, и его сглаженные эмоции"""
+
+    def __init__(self, track_id, frame_number):
+        self.track_id = track_id
+        self.first_frame = frame_number
+        self.last_frame = frame_number
+        self.frames = 0
+        # Кадр и вход модели последней классификации - от них считается, пора ли заново
+        self.classified_frame = None
+        self.classified_face = None
+        self.classifications = 0
+        # Сглаженные оценки эмоций (в процентах) и их сумма по кадрам трека
+        self.emotions = None
+        self.emotion_sums = dict.fromkeys(EMOTION_LABELS, 0.0)
+
+    def dominant_emotion(self, emotions=None):
+        emotions = self.emotions if emotions is None else emotions
+        return max(emotions, key=emotions.get) if emotions else None
+
+    def update(self, emotions, smoothing):
+        """Новая классификация: экспоненциальное сглаживание с весом smoothing у новой оценки"""
+        if self.emotions is None:
+            self.emotions = dict(emotions)
+        else:
+            self.emotions = {label: smoothing * emotions[label] + (1.0 - smoothing) * self.emotions[label]
+                             for label in EMOTION_LABELS}
+        self.classifications += 1
+
+    def observe(self, frame_number):
+        """Лицо трека есть на кадре: учитываем текущие оценки в средних по треку"""
+        self.last_frame = frame_number
+        self.frames += 1
+        if self.emotions is not None:
+            for label, score in self.emotions.items():
+                self.emotion_sums[label] += score
+
+    def to_dict(self):
+        frames = max(1, self.frames)
+        emotions = {label: total / frames for label, total in self.emotion_sums.items()}
+        return {
+            'type': 'track',
+            'track_id': self.track_id,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'frames': self.frames,
+            'classifications': self.classifications,
+            'emotions': emotions,
+            'dominant_emotion': self.dominant_emotion(emotions)
+        }
+
+class EmotionTracker:
+    """Эмоции лиц видео по трекам: лица связываются между кадрами трекером по IoU
+    (tracking.IoUTracker), и модель эмоций видит лицо трека заново только раз в
+    reclassify_every кадров или когда вход модели заметно изменился (средняя
+    разница яркости 48x48 больше change_threshold из 255). На остальных кадрах
+    используются сглаженные оценки трека.
+
+    stream - emotion_output.EmotionStreamWriter: туда пишется каждая
+    классификация, а закончившийся трек - итоговой записью, после чего
+    забывается (память не растет с длиной видео).
+    """
+
+    def __init__(self, emotion_model, reclassify_every=10, change_threshold=12.0, smoothing=0.5,
+                 iou_threshold=0.3, max_missed=15, stream=None):
+        self.emotion_model = emotion_model
+        self.reclassify_every = max(1, reclassify_every)
+        self.change_threshold = change_threshold
+        self.smoothing = smoothing
+        self.tracker = IoUTracker(iou_threshold=iou_threshold, max_missed=max_missed)
+        self.stream = stream
+        # Активные треки; закончившиеся только считаются
+        self.tracks = {}
+        self.finished_tracks = 0
+        # Сколько лиц отправлено в модель и сколько взяли оценки трека
+        self.classified = 0
+        self.reused = 0
+
+    def _needs_classification(self, classified_frame, classified_face, frame_number, face):
+        if classified_face is None:
+            return True
+        if frame_number - classified_frame >= self.reclassify_every:
+            return True
+        change = np.mean(np.abs(face - classified_face))
+        return change > self.change_threshold
+
+    def process(self, frames, detector):
+        """Кадры [(номер кадра, кадр)] по порядку -> [(кадр с разметкой, лица кадра)].
+
+        Все лица пачки кадров, которым нужна классификация, идут в модель одним батчем.
+        """
+        plan = []
+        to_classify = []
+        # Лица, уже поставленные в батч: track_id -> (номер кадра, лицо). Трек считается
+        # классифицированным, только когда модель вернула для него оценки
+        queued = {}
+        for frame_number, frame in frames:
+            try:
+                faces = find_faces(frame, detector)
+            except Exception as e:
+                print(f"Error in face detection: {str(e)}")
+                faces = []
+
+            detections = [{'class': 'face', 'box': [x, y, x + w, y + h]} for (x, y, w, h), _ in faces]
+            self.tracker.update(detections)
+            frame_plan = []
+            for (box, face_img), detection in zip(faces, detections):
+                track = self.tracks.get(detection['track_id'])
+                if track is None:
+                    track = FaceTrack(detection['track_id'], frame_number)
+                    self.tracks[track.track_id] = track
+                face = prepare_face(face_img)
+                index = None
+                classified_frame, classified_face = queued.get(
+                    track.track_id, (track.classified_frame, track.classified_face))
+                if self._needs_classification(classified_frame, classified_face, frame_number, face):
+                    queued[track.track_id] = (frame_number, face)
+                    index = len(to_classify)
+                    to_classify.append(face)
+                frame_plan.append((box, track, index, face))
+            plan.append(frame_plan)
+
+        try:
+            results = classify_emotions(self.emotion_model, to_classify, prepared=True)
+        except Exception as e:
+            print(f"Error in emotion detection: {str(e)}")
+            results = []
+
+        output = []
+        for (frame_number, frame), frame_plan in zip(frames, plan):
+            frame_faces = []
+            for box, track, index, face in frame_plan:
+                if index is not None and index < len(results):
+                    emotions, _ = results[index]
+                    track.update(emotions, self.smoothing)
+                    track.classified_frame = frame_number
+                    track.classified_face = face
+                    self.classified += 1
+                    if self.stream is not None:
+                        self.stream.write({
+                            'type': 'emotion',
+                            'track_id': track.track_id,
+                            'frame': frame_number,
+                            'box': box,
+                            'emotions': track.emotions,
+                            'dominant_emotion': track.dominant_emotion()
+                        })
+                    log_emotions(track.emotions, track.dominant_emotion(), track.track_id)
+                elif track.emotions is not None:
+                    # Оценки трека взяты с прошлой классификации (без модели)
+                    self.reused += 1
+                track.observe(frame_number)
+                if track.emotions is None:
+                    continue
+                draw_emotion(frame, box, f"#{track.track_id} {track.dominant_emotion()}")
+                frame_faces.append({
+                    'track_id': track.track_id,
+                    'box': box,
+                    'emotions': track.emotions,
+                    'dominant_emotion': track.dominant_emotion()
+                })
+            output.append((frame, frame_faces))
+
+        # Треки, которые трекер забыл, закончились
+        active = {t.track_id for t in self.tracker.tracks}
+        self._finish([track_id for track_id in self.tracks if track_id not in active])
+        return output
+
+    def close(self):
+        """Конец видео: итоговые записи оставшихся треков"""
+        self._finish(list(self.tracks))
+
+    @property
+    def total_tracks(self):
+        return self.finished_tracks + len(self.tracks)
+
+    def _finish(self, track_ids):
+        for track_id in sorted(track_ids):
+            track = self.tracks.pop(track_id)
+            self.finished_tracks += 1
+            if self.stream is not None:
+                self.stream.write(track.to_dict())
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('--source', type=str, required=True, help='Path to image or video')
     parser.add_argument('--save', action='store_true', help='Save results to video/image')
@@ -137,11 +382,39 @@ def main():
     parser.add_argument('--project', type=str, default='../runs/detect', help='Save results to project/name')
     parser.add_argument('--name', type=str, default='emotions', help='Save results to project/name')
     parser.add_argument('--stream-frames', action='store_true', help='Stream frames with emotions to stdout')
-    args = parser.parse_args()
+    parser.add_argument('--frame-batch', type=int, default=8,
+                        help='Video frames whose faces are classified in one emotion model call')
+    parser.add_argument('--face-detector', type=str, choices=FACE_DETECTORS, default=None,
+                        help='Face detector (default: EMOTION_FACE_DETECTOR env or mtcnn)')
+    parser.add_argument('--face-size', type=int, default=None,
+                        help='Detect faces on a frame scaled so that the longer side is this many pixels '
+                             '(0 - full frame; default: full frame for mtcnn, 640 for yunet)')
+    parser.add_argument('--reclassify-every', type=int, default=10,
+                        help='Video: classify the emotions of a tracked face again after this many frames')
+    parser.add_argument('--change-threshold', type=float, default=12.0,
+                        help='Video: classify again earlier if the face changed by this mean brightness difference (0-255)')
+    parser.add_argument('--smoothing', type=float, default=0.5,
+                        help='Video: weight of a new classification in the smoothed emotions of a track (0-1)')
+    parser.add_argument('--flush-interval', type=float, default=5.0,
+                        help='Video: flush emotions.ndjson to disk every this many seconds')
+    parser.add_argument('--summary', action='store_true',
+                        help='Video: also write emotions_summary.json (histograms and timelines)')
+    parser.add_argument('--summary-bin', type=float, default=5.0,
+                        help='Video: timeline interval of emotions_summary.json in seconds')
+    return parser
+
+def run(args, models=None):
+    """Обрабатывает один файл; возвращает код завершения.
+
+    models - уже загруженные EmotionModels (воркер), иначе загружаются здесь.
+    """
+    if models is None:
+        models = EmotionModels(args.face_detector, args.face_size)
+        print(f"Emotion models loaded in {models.load_seconds:.2f} s "
+              f"(cold start {time.time() - PROCESS_STARTED:.2f} s)")
+    detector = models.face_detector(args.face_detector, args.face_size)
+    emotion_model = models.emotion_model
 
-    # Инициализируем детектор лиц
-    detector = MTCNN()
-    
     # Создаем выходную директорию
     output_dir = os.path.join(args.project, args.name)
     ensure_dir(output_dir)
@@ -156,10 +429,10 @@ def main():
         frame = cv2.imread(args.source)
         if frame is None:
             print(f"Error: cannot read image: {args.source}", file=sys.stderr)
-            sys.exit(2)
+            return 2
         
         # Обрабатываем эмоции
-        processed_frame, emotions_data = process_emotions(frame, detector)
+        processed_frame, emotions_data = process_emotions(frame, detector, emotion_model)
 
         # Стримим кадр с эмоциями в модалку
         if args.stream_frames and processed_frame is not None:
@@ -192,7 +465,7 @@ def main():
         cap = cv2.VideoCapture(args.source)
         if not cap.isOpened():
             print(f"Error opening video source: {args.source}")
-            return
+            return 0
 
         # Получаем свойства видео
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -209,42 +482,70 @@ def main():
             out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
 
         frame_count = 0
-        all_emotions = []
+        # Эмоции пишутся в NDJSON по ходу обработки, а не копятся в памяти до конца видео
+        stream = None
+        summary = EmotionSummary(fps, bin_seconds=args.summary_bin) if args.summary else None
+        if args.save:
+            emotions_path = os.path.join(output_dir, 'emotions.ndjson')
+            stream = EmotionStreamWriter(emotions_path, flush_interval=args.flush_interval)
+        # Лица сопровождаются по кадрам, эмоции считаются по трекам
+        emotion_tracker = EmotionTracker(emotion_model, reclassify_every=args.reclassify_every,
+                                         change_threshold=args.change_threshold, smoothing=args.smoothing,
+                                         stream=stream)
+        # Кадры копятся по frame_batch: лица всех кадров пачки идут в модель эмоций одним батчем
+        pending = []
+        stop_requested = False
 
-        while cap.isOpened():
+        while cap.isOpened() and not stop_requested:
             ret, frame = cap.read()
+            if ret:
+                frame_count += 1
+                print(f"\nОбработка кадра {frame_count}/{total_frames}")
+                pending.append((frame_count, frame))
+            if not pending or (ret and len(pending) < max(1, args.frame_batch)):
+                if not ret:
+                    break
+                continue
+
+            # Обрабатываем эмоции
+            processed = emotion_tracker.process(pending, detector)
+            for (frame_number, _), (processed_frame, frame_faces) in zip(pending, processed):
+                if summary is not None:
+                    for face in frame_faces:
+                        summary.add(frame_number, face['emotions'], face['dominant_emotion'])
+
+                # Стримим покадрово в модалку
+                if args.stream_frames and processed_frame is not None:
+                    send_frame_to_stdout(processed_frame, frame_number=frame_number, total_frames=total_frames or None)
+
+                if args.save:
+                    out.write(processed_frame)
+
+                if args.show:
+                    cv2.imshow('Emotion Detection', processed_frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        stop_requested = True
+                        break
+            pending = []
             if not ret:
                 break
 
-            frame_count += 1
-            print(f"\nОбработка кадра {frame_count}/{total_frames}")
-
-            # Обрабатываем эмоции
-            processed_frame, emotions_data = process_emotions(frame, detector)
-            all_emotions.extend(emotions_data)
-            
-            # Стримим покадрово в модалку
-            if args.stream_frames and processed_frame is not None:
-                send_frame_to_stdout(processed_frame, frame_number=frame_count, total_frames=total_frames or None)
-            
-            if args.save:
-                out.write(processed_frame)
-            
-            if args.show:
-                cv2.imshow('Emotion Detection', processed_frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+        emotion_tracker.close()
+        print(f"\nЛиц в модели эмоций: {emotion_tracker.classified}, "
+              f"по оценкам трека: {emotion_tracker.reused}, треков: {emotion_tracker.total_tracks}")
 
-        # Сохраняем все эмоции в JSON
         if args.save:
-            emotions_path = os.path.join(output_dir, 'emotions.json')
-            with open(emotions_path, 'w') as f:
-                json.dump(all_emotions, f, indent=4)
-            
+            stream.close()
             print(f"\nРезультаты сохранены:")
             print(f"- Видео: {output_path}")
             print(f"- Данные об эмоциях: {emotions_path}")
 
+        if summary is not None:
+            summary_path = summary.save(os.path.join(output_dir, 'emotions_summary.json'),
+                                        frames=frame_count, tracks=emotion_tracker.total_tracks,
+                                        classifications=emotion_tracker.classified)
+            print(f"- Сводка эмоций: {summary_path}")
+
         # Очистка
         cap.release()
         if args.save:
@@ -253,6 +554,74 @@ def main():
             cv2.destroyAllWindows()
 
         print(f"\nОбработка видео завершена. Результаты сохранены в: {output_dir}")
+    return 0
+
+def send_message(message):
+    """Служебное сообщение воркера (одна JSON строка в stdout)"""
+    print(json.dumps(message, ensure_ascii=False), flush=True)
+
+def handle_job(job, models):
+    """Выполняет одну задачу воркера и возвращает код завершения"""
+    try:
+        args = build_parser().parse_args(job.get('args', []))
+    except SystemExit as e:
+        # argparse сам печатает ошибку в stderr
+        return e.code or 2
+
+    try:
+        return run(args, models)
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+def serve(models):
+    """Режим воркера: задачи приходят по stdin JSON строками
+    {"id": "...", "args": [...аргументы emotion_detect.py...]}, как в worker.py.
+    """
+    # stdout уходит в pipe: строки должны доходить до Node сразу, а не блоками
+    sys.stdout.reconfigure(line_buffering=True)
+
+    # Холодный старт: импорт TensorFlow/DeepFace и загрузка моделей; платится один раз
+    send_message({
+        'status': 'worker_ready',
+        'cold_start_s': round(time.time() - PROCESS_STARTED, 3),
+        'model_load_s': round(models.load_seconds, 3)
+    })
+
+    jobs_done = 0
+    for raw_line in sys.stdin:
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Bad job JSON: {e}", file=sys.stderr)
+            continue
+
+        start_time = time.time()
+        code = handle_job(job, models)
+        jobs_done += 1
+        # Все задачи воркера теплые: модели уже в памяти, elapsed - только обработка файла
+        send_message({
+            'status': 'job_done',
+            'id': job.get('id'),
+            'code': code,
+            'elapsed': round(time.time() - start_time, 3),
+            'jobs_done': jobs_done
+        })
+
+def main():
+    # --worker - отдельный режим: аргументы файла приходят в задачах, а не в командной строке
+    mode_parser = argparse.ArgumentParser(add_help=False)
+    mode_parser.add_argument('--worker', action='store_true',
+                             help='Load models once and serve jobs from stdin (JSON lines)')
+    mode, argv = mode_parser.parse_known_args()
+    if mode.worker:
+        serve(EmotionModels())
+        return
+    sys.exit(run(build_parser().parse_args(argv)))
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
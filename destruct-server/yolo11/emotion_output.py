@@ -0,0 +1,113 @@
+import json
+import os
+import time
+import numpy as np
+
+from core import safe_json_dumps
+
+# Вывод эмоций длинных видео. Записи пишутся в emotions.ndjson по мере
+# обработки (одна JSON строка на запись, сброс на диск раз в flush_interval
+# секунд), поэтому память не растет с длиной видео, а падение процесса теряет
+# только последние секунды. Компактная сводка emotions_summary.json
+# (гистограммы и временные ряды по интервалам) для фронтенда собирается
+# на лету из счетчиков.
+
+class EmotionStreamWriter:
+    """Дописывает записи в NDJSON файл"""
+
+    def __init__(self, path, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.file = open(path, 'w', encoding='utf-8')
+        self.records = 0
+        self.last_flush = time.time()
+
+    def write(self, record):
+        self.file.write(safe_json_dumps(record) + '\n')
+        self.records += 1
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_flush = time.time()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+class EmotionSummary:
+    """Сводка эмоций видео по лицам на кадрах.
+
+    histogram - сколько раз каждая эмоция была доминирующей; score_histogram -
+    распределение оценок каждой эмоции по 10 интервалам (0-10%, ..., 90-100%);
+    timeline - средние оценки эмоций по интервалам в bin_seconds секунд.
+    """
+
+    def __init__(self, fps, bin_seconds=5.0, score_bins=10):
+        self.fps = fps or 25.0
+        self.bin_seconds = bin_seconds
+        self.bin_frames = max(1, int(round(self.fps * bin_seconds)))
+        self.score_bins = score_bins
+        self.labels = None
+        self.observations = 0
+        self.dominant_counts = {}
+        self.score_counts = None
+        # Номер интервала -> (число лиц, суммы оценок по эмоциям)
+        self.bins = {}
+
+    def add(self, frame_number, emotions, dominant_emotion):
+        """Одно лицо на кадре frame_number (кадры с 1) со сглаженными оценками в процентах"""
+        if self.labels is None:
+            self.labels = list(emotions)
+            self.score_counts = np.zeros((len(self.labels), self.score_bins), dtype=np.int64)
+        scores = np.array([emotions[label] for label in self.labels], dtype=np.float64)
+
+        self.observations += 1
+        self.dominant_counts[dominant_emotion] = self.dominant_counts.get(dominant_emotion, 0) + 1
+        bins = np.clip((scores / 100.0 * self.score_bins).astype(np.int64), 0, self.score_bins - 1)
+        self.score_counts[np.arange(len(self.labels)), bins] += 1
+
+        index = (frame_number - 1) // self.bin_frames
+        count, sums = self.bins.get(index, (0, np.zeros(len(self.labels))))
+        self.bins[index] = (count + 1, sums + scores)
+
+    def to_dict(self, frames=0, tracks=0, classifications=0):
+        labels = self.labels or []
+        last_bin = max(self.bins) if self.bins else -1
+        if frames:
+            last_bin = max(last_bin, (frames - 1) // self.bin_frames)
+        faces = []
+        timeline = {label: [] for label in labels}
+        for index in range(last_bin + 1):
+            count, sums = self.bins.get(index, (0, None))
+            faces.append(count)
+            for i, label in enumerate(labels):
+                # Интервал без лиц - null, а не 0: на графике это разрыв, а не нулевая эмоция
+                timeline[label].append(round(float(sums[i] / count), 2) if count else None)
+        return {
+            'fps': self.fps,
+            'frames': frames,
+            'duration_s': round(frames / self.fps, 2),
+            'tracks': tracks,
+            'classifications': classifications,
+            'observations': self.observations,
+            'histogram': {label: self.dominant_counts.get(label, 0) for label in labels},
+            'score_histogram': {
+                'bin_percent': 100 // self.score_bins,
+                'counts': {label: self.score_counts[i].tolist() for i, label in enumerate(labels)}
+            },
+            'timeline': {
+                'bin_seconds': self.bin_seconds,
+                'bin_frames': self.bin_frames,
+                'faces': faces,
+                'emotions': timeline
+            }
+        }
+
+    def save(self, path, **kwargs):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(**kwargs), f, ensure_ascii=False)
+        return path
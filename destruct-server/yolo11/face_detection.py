@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import urllib.request
+import cv2
+
+# Детекторы лиц для emotion_detect.py. mtcnn - исходный вариант: точный, но на
+# CPU это самый медленный этап, медленнее самой модели эмоций. yunet - легкая
+# CNN из OpenCV (cv2.FaceDetectorYN), веса ~230 КБ скачиваются один раз в
+# yolo11/models/. Оба детектора ищут лица на кадре, уменьшенном до size по
+# большей стороне, и возвращают боксы в координатах исходного кадра.
+FACE_DETECTORS = ('mtcnn', 'yunet')
+DEFAULT_FACE_DETECTOR = os.environ.get('EMOTION_FACE_DETECTOR', 'mtcnn').lower()
+# Размер по умолчанию: mtcnn - полный кадр (как раньше), yunet - 640
+DEFAULT_SIZES = {'mtcnn': None, 'yunet': 640}
+
+YUNET_URL = ('https://github.com/opencv/opencv_zoo/raw/main/models/'
+             'face_detection_yunet/face_detection_yunet_2023mar.onnx')
+YUNET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models',
+                          'face_detection_yunet_2023mar.onnx')
+
+def resolve_face_detector(name=None):
+    name = (name or DEFAULT_FACE_DETECTOR).lower()
+    if name not in FACE_DETECTORS:
+        raise ValueError(f"Unknown face detector: {name} (expected one of {', '.join(FACE_DETECTORS)})")
+    return name
+
+class FaceDetector:
+    """Детектор лиц: detect(кадр BGR) -> [(x, y, w, h, уверенность)] в координатах кадра.
+
+    size - большая сторона кадра, на котором ищутся лица (None - без уменьшения).
+    """
+
+    def __init__(self, size=None):
+        self.size = size
+
+    def detect(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.size / max(h, w)) if self.size else 1.0
+        if scale < 1.0:
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        faces = self._detect(frame)
+        if scale < 1.0:
+            faces = [(int(x / scale), int(y / scale), int(fw / scale), int(fh / scale), score)
+                     for x, y, fw, fh, score in faces]
+        return faces
+
+    def _detect(self, frame):
+        raise NotImplementedError
+
+class MtcnnFaceDetector(FaceDetector):
+    """MTCNN (пакет mtcnn, TensorFlow)"""
+
+    def __init__(self, size=None):
+        super().__init__(size)
+        from mtcnn import MTCNN
+        self.model = MTCNN()
+
+    def _detect(self, frame):
+        # MTCNN ожидает RGB
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return [(*face['box'], float(face['confidence'])) for face in self.model.detect_faces(rgb_frame)]
+
+class YunetFaceDetector(FaceDetector):
+    """YuNet через cv2.FaceDetectorYN (OpenCV >= 4.5.4), работает на CPU без TensorFlow"""
+
+    def __init__(self, size=640, model_path=YUNET_PATH, score_threshold=0.7, nms_threshold=0.3):
+        super().__init__(size)
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            raise RuntimeError(f"OpenCV {cv2.__version__} has no FaceDetectorYN (4.5.4+ required)")
+        if not os.path.exists(model_path):
+            download_yunet(model_path)
+        self.model = cv2.FaceDetectorYN.create(model_path, '', (320, 320), score_threshold, nms_threshold, 5000)
+        self.input_size = None
+
+    def _detect(self, frame):
+        h, w = frame.shape[:2]
+        # Размер входа задается заранее; меняем только если поменялся размер кадра
+        if self.input_size != (w, h):
+            self.model.setInputSize((w, h))
+            self.input_size = (w, h)
+        _, faces = self.model.detect(frame)
+        if faces is None:
+            return []
+        # Строка YuNet: x, y, w, h, 5 точек лица (10 чисел), уверенность
+        return [(int(f[0]), int(f[1]), int(f[2]), int(f[3]), float(f[14])) for f in faces]
+
+def download_yunet(path=YUNET_PATH):
+    start_time = time.time()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    print(f"Downloading YuNet face detector to {path}...", file=sys.stderr)
+    # Сначала во временный файл: оборванная загрузка не должна остаться на месте весов
+    tmp_path = path + '.part'
+    urllib.request.urlretrieve(YUNET_URL, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Downloaded YuNet face detector ({time.time() - start_time:.2f} s)", file=sys.stderr)
+    return path
+
+def create_face_detector(name=None, size=None):
+    """Детектор по имени (mtcnn | yunet); size=None - размер по умолчанию для детектора"""
+    name = resolve_face_detector(name)
+    if size is None:
+        size = DEFAULT_SIZES[name]
+    if name == 'yunet':
+        return YunetFaceDetector(size=size)
+    return MtcnnFaceDetector(size=size)
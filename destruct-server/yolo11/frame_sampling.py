@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+class FrameSampler:
+    """Решает, на каких кадрах видео запускать модель.
+
+    Режимы комбинируются:
+    - vid_stride: модель запускается не чаще, чем на каждом N-м кадре;
+    - analysis_fps: шаг подбирается по FPS исходного видео;
+    - adaptive: из кадров-кандидатов модель получает только те, где сменилась
+      сцена или сработал датчик движения, но не реже, чем раз в max_skip кадров.
+    На пропущенных кадрах вызывающий код переиспользует последние детекции.
+    """
+
+    def __init__(self, vid_stride=1, analysis_fps=None, source_fps=None, adaptive=False,
+                 scene_threshold=0.02, max_skip=50, proxy_width=160, pixel_threshold=25):
+        stride = max(1, vid_stride)
+        if analysis_fps and source_fps:
+            stride = max(stride, int(round(source_fps / analysis_fps)))
+        self.stride = stride
+        self.adaptive = adaptive
+        self.scene_threshold = scene_threshold
+        self.max_skip = max(stride, max_skip)
+        self.proxy_width = proxy_width
+        self.pixel_threshold = pixel_threshold
+
+        self.last_inferred = None
+        self.last_proxy = None
+        self.inferred = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self):
+        return self.stride > 1 or self.adaptive
+
+    def _proxy(self, frame):
+        # Сравнение сцен идет по маленькой серой копии кадра - это почти бесплатно
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.proxy_width / w))
+        small = cv2.resize(frame, (self.proxy_width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def scene_change_score(self, proxy):
+        """Доля пикселей, заметно изменившихся с последнего кадра с инференсом"""
+        if self.last_proxy is None or self.last_proxy.shape != proxy.shape:
+            return 1.0
+        diff = cv2.absdiff(proxy, self.last_proxy)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def should_infer(self, frame_number, frame, motion=False):
+        proxy = None
+        if self.last_inferred is None:
+            decision = True
+        else:
+            gap = frame_number - self.last_inferred
+            if gap < self.stride:
+                decision = False
+            elif not self.adaptive:
+                decision = True
+            else:
+                proxy = self._proxy(frame)
+                decision = (motion or gap >= self.max_skip
+                            or self.scene_change_score(proxy) >= self.scene_threshold)
+
+        if decision:
+            self.last_inferred = frame_number
+            if self.adaptive:
+                self.last_proxy = proxy if proxy is not None else self._proxy(frame)
+            self.inferred += 1
+        else:
+            self.skipped += 1
+        return decision
+
+    def summary(self):
+        total = self.inferred + self.skipped
+        return f"Frame sampling: inference on {self.inferred}/{total} frames (stride {self.stride}, adaptive {self.adaptive})"
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import cv2
+import numpy as np
+
+# opencv - cv2.VideoCapture (декодирование в процессе Python);
+# ffmpeg - отдельный процесс ffmpeg декодирует, масштабирует и переводит кадры
+# в нужный формат пикселей, Python только читает готовые кадры из pipe
+DECODERS = ('opencv', 'ffmpeg')
+DEFAULT_DECODER = os.environ.get('YOLO_DECODER', 'opencv').lower()
+
+# Байт на пиксель для поддерживаемых форматов вывода ffmpeg
+PIX_FMT_CHANNELS = {'bgr24': 3, 'rgb24': 3, 'gray': 1}
+NETWORK_PREFIXES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+# Таймаут сетевого чтения ffmpeg, мкс: мертвый поток завершает процесс, а не вешает read()
+NETWORK_TIMEOUT_US = 5000000
+
+def resolve_decoder(decoder=None):
+    decoder = (decoder or DEFAULT_DECODER).lower()
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder: {decoder} (expected one of {', '.join(DECODERS)})")
+    return decoder
+
+def scaled_size(width, height, size):
+    """Размер кадра, у которого большая сторона равна size (четные стороны, пропорции сохраняются)"""
+    if not size or not width or not height:
+        return width, height
+    scale = size / max(width, height)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+def _is_device(source):
+    return isinstance(source, int) or str(source).isdigit() or str(source).startswith('/dev/video')
+
+def _input_args(source):
+    """Аргументы ffmpeg для источника: файл, сетевой поток или камера (v4l2)"""
+    if _is_device(source):
+        device = f"/dev/video{source}" if str(source).isdigit() else str(source)
+        return ['-f', 'v4l2', '-i', device]
+    source = str(source)
+    if source.startswith(NETWORK_PREFIXES):
+        args = ['-rw_timeout', str(NETWORK_TIMEOUT_US), '-fflags', 'nobuffer', '-flags', 'low_delay']
+        if source.startswith(('rtsp://', 'rtsps://')):
+            args = ['-rtsp_transport', 'tcp'] + args
+        return args + ['-i', source]
+    return ['-i', source]
+
+def probe(source):
+    """Ширина, высота, FPS и число кадров источника через ffprobe (0 - неизвестно)"""
+    if _is_device(source):
+        # ffprobe не открывает v4l2 без лишней настройки - параметры берем у OpenCV
+        cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        try:
+            return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    float(cap.get(cv2.CAP_PROP_FPS) or 0), 0)
+        finally:
+            cap.release()
+
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,nb_frames',
+               '-of', 'json']
+    source = str(source)
+    if source.startswith(('rtsp://', 'rtsps://')):
+        command += ['-rtsp_transport', 'tcp']
+    completed = subprocess.run(command + [source], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               timeout=NETWORK_TIMEOUT_US / 1e6 * 2)
+    streams = json.loads(completed.stdout or b'{}').get('streams') or []
+    if completed.returncode != 0 or not streams:
+        raise RuntimeError(f"ffprobe failed for {source}: {completed.stderr.decode(errors='ignore').strip()}")
+
+    stream = streams[0]
+    fps = 0.0
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        num, _, den = str(stream.get(key, '0/0')).partition('/')
+        try:
+            fps = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            fps = 0.0
+        if fps > 0:
+            break
+    nb_frames = stream.get('nb_frames')
+    total = int(nb_frames) if str(nb_frames).isdigit() else 0
+    # У живых потоков длительности нет, а лишний ffprobe к недоступной камере
+    # только задерживает переподключение
+    if not total and fps > 0 and not source.startswith(NETWORK_PREFIXES):
+        # У многих контейнеров nb_frames нет - оцениваем по длительности, как это делает OpenCV
+        try:
+            duration = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', source],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=NETWORK_TIMEOUT_US / 1e6 * 2
+            ).stdout.decode(errors='ignore').strip()
+            total = int(float(duration) * fps)
+        except (subprocess.TimeoutExpired, ValueError):
+            total = 0
+    return int(stream.get('width') or 0), int(stream.get('height') or 0), fps, total
+
+class FFmpegFrameSource:
+    """Источник кадров через процесс ffmpeg с API как у cv2.VideoCapture.
+
+    ffmpeg декодирует поток в своем процессе (вне GIL), сразу масштабирует кадр
+    до size по большей стороне и переводит в pix_fmt. Кадры читаются из pipe
+    через readinto прямо в numpy массивы из пула, без промежуточных bytes.
+    Кадр, который больше не нужен, можно вернуть в пул через recycle_frame.
+    """
+
+    def __init__(self, source, size=None, pix_fmt='bgr24', pool_size=8):
+        if pix_fmt not in PIX_FMT_CHANNELS:
+            raise ValueError(f"Unsupported pix_fmt: {pix_fmt}")
+        if not shutil.which('ffmpeg'):
+            raise RuntimeError("ffmpeg not found in PATH")
+
+        self.source = source
+        self.pix_fmt = pix_fmt
+        self.pool_size = pool_size
+        self.source_width, self.source_height, self.fps, self.frame_count = probe(source)
+        if not self.source_width or not self.source_height:
+            raise RuntimeError(f"Unknown frame size of {source}")
+        self.width, self.height = scaled_size(self.source_width, self.source_height, size)
+
+        channels = PIX_FMT_CHANNELS[pix_fmt]
+        self.shape = (self.height, self.width, channels) if channels > 1 else (self.height, self.width)
+        self.frame_bytes = self.width * self.height * channels
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._process = None
+        self.position = 0
+        self._start(0)
+
+    def _start(self, start_frame):
+        self._stop_process()
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if start_frame and self.fps:
+            # -ss перед -i: быстрый переход по ключевым кадрам, затем точное декодирование до нужного
+            command += ['-ss', f"{start_frame / self.fps:.6f}"]
+        command += _input_args(self.source)
+        command += ['-map', '0:v:0', '-an', '-sn']
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            command += ['-vf', f"scale={self.width}:{self.height}:flags=area"]
+        command += ['-pix_fmt', self.pix_fmt, '-f', 'rawvideo', '-']
+
+        # Ошибки ffmpeg идут в stderr процесса (как сообщения OpenCV)
+        self._process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                         stderr=None, bufsize=self.frame_bytes * 2)
+        self.position = start_frame
+
+    def _stop_process(self):
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+    def _buffer(self):
+        with self._pool_lock:
+            if self._pool:
+                return self._pool.pop()
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def recycle(self, frame):
+        """Возвращает кадр в пул - его память переиспользует один из следующих read()"""
+        if frame is None or frame.shape != self.shape:
+            return
+        with self._pool_lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(frame)
+
+    def isOpened(self):
+        return self._process is not None and (self._process.poll() is None or bool(self._process.stdout.peek(1)))
+
+    def read(self):
+        if self._process is None:
+            return False, None
+        frame = self._buffer()
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if filled < self.frame_bytes:
+            # Конец потока или ffmpeg завершился (обрыв сети, таймаут)
+            self.recycle(frame)
+            self._stop_process()
+            return False, None
+        self.position += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._start(int(value))
+            return True
+        return False
+
+    def release(self):
+        self._stop_process()
+        with self._pool_lock:
+            self._pool = []
+
+def open_capture(source, decoder=None, size=None, pix_fmt='bgr24'):
+    """Открывает видео, RTSP поток или камеру выбранным декодером.
+
+    size - большая сторона кадра после масштабирования (None - исходный размер).
+    Если ffmpeg недоступен или не открыл источник, используется OpenCV; масштаб
+    и формат пикселей тогда остаются на вызывающем коде (см. convert_frame).
+    """
+    if resolve_decoder(decoder) == 'ffmpeg':
+        try:
+            return FFmpegFrameSource(source, size=size, pix_fmt=pix_fmt)
+        except Exception as e:
+            print(f"FFmpeg decoder unavailable ({e}), falling back to OpenCV", file=sys.stderr)
+    if str(source).isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+def convert_frame(cap, frame, size=None, pix_fmt='bgr24'):
+    """Доводит BGR кадр OpenCV до size/pix_fmt; кадры FFmpegFrameSource уже готовы"""
+    if isinstance(cap, FFmpegFrameSource) or frame is None:
+        return frame
+    if size:
+        height, width = frame.shape[:2]
+        new_size = scaled_size(width, height, size)
+        if new_size != (width, height):
+            frame = cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA)
+    if pix_fmt == 'rgb24':
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    elif pix_fmt == 'gray':
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+def recycle_frame(cap, frame):
+    """Возвращает кадр в пул источника (для cv2.VideoCapture ничего не делает)"""
+    if isinstance(cap, FFmpegFrameSource):
+        cap.recycle(frame)
@@ -0,0 +1,55 @@
+import json
+import os
+import struct
+import sys
+
+# Бинарный кадр канала Node <-> Python (см. framing.js):
+# [u32 длина заголовка][u32 длина данных][заголовок JSON utf-8][данные, например JPEG]
+# Числа - big-endian. Кадр без данных - служебное сообщение (info / error / stats).
+PREFIX = struct.Struct('>II')
+MAX_HEADER_SIZE = 1 << 20
+MAX_PAYLOAD_SIZE = 64 << 20
+
+def _read_exact(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+def read_frame(stream):
+    """Читает один кадр из бинарного потока. Возвращает (заголовок, данные) или None в конце потока"""
+    prefix = _read_exact(stream, PREFIX.size)
+    if prefix is None:
+        return None
+    header_len, payload_len = PREFIX.unpack(prefix)
+    if header_len > MAX_HEADER_SIZE or payload_len > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Frame too large: header {header_len}, payload {payload_len}")
+
+    header_bytes = _read_exact(stream, header_len) if header_len else b''
+    payload = _read_exact(stream, payload_len) if payload_len else b''
+    if header_bytes is None or payload is None:
+        return None
+    header = json.loads(header_bytes) if header_bytes else {}
+    return header, payload
+
+def write_frame(stream, header, payload=b''):
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    stream.write(PREFIX.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        stream.write(payload)
+    stream.flush()
+
+def claim_stdout():
+    """Забирает fd 1 под бинарные кадры.
+
+    print и логи библиотек (ultralytics пишет в sys.stdout) после этого уходят
+    в stderr и не ломают разметку кадров. Возвращает бинарный поток для write_frame.
+    """
+    sys.stdout.flush()
+    frames_fd = os.dup(1)
+    os.dup2(2, 1)
+    return os.fdopen(frames_fd, 'wb')
@@ -1,50 +1,176 @@
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
+from model_backend import BACKENDS, EXPORT_IMGSZ, load_model
+from frame_source import DECODERS, convert_frame, open_capture, recycle_frame, resolve_decoder
+from tracking import AlertPolicy, IoUTracker
+from clip_recorder import ClipBuffer, ClipWriter
+from preview import PreviewPublisher, draw_detections
+from core import Detections, safe_json_dumps
 import time
-import json
 import sys
 import signal
+import argparse
 import threading
-from queue import Queue
 import os
 from datetime import datetime
-import base64
 
-def safe_json_dumps(data):
+# Переподключение к упавшему потоку: задержка растет от RECONNECT_MIN_DELAY вдвое до max_backoff
+RECONNECT_MIN_DELAY = 1.0
+# Столько ошибок чтения подряд - поток считается упавшим
+MAX_READ_FAILURES = 25
+# Таймауты FFmpeg бэкенда OpenCV, чтобы read() не висел на мертвом потоке
+CAPTURE_TIMEOUT_MS = 5000
+# Ширина серой копии кадра для датчика движения и оценки яркости
+MOTION_PROXY_WIDTH = 320
+# Размер размытия и порог площади движения заданы для полного кадра, на копии они масштабируются
+MOTION_BLUR_SIZE = 21
+
+def parse_roi(value):
+    """Область интереса 'x1,y1,x2,y2' в долях кадра (0..1); пустая строка или 'full' - весь кадр"""
+    if not value or value.strip().lower() == 'full':
+        return None
     try:
-        return json.dumps(data, ensure_ascii=False).replace('\n', '\\n').replace('\r', '\\r')
-    except Exception as e:
-        return json.dumps({
-            "status": "error",
-            "message": f"JSON serialization error: {str(e)}"
-        })
+        x1, y1, x2, y2 = (float(v) for v in value.split(','))
+    except ValueError:
+        raise ValueError(f"ROI must be 'x1,y1,x2,y2' in 0..1, got: {value}")
+    x1, x2 = sorted((min(max(x1, 0.0), 1.0), min(max(x2, 0.0), 1.0)))
+    y1, y2 = sorted((min(max(y1, 0.0), 1.0), min(max(y2, 0.0), 1.0)))
+    if x2 - x1 <= 0 or y2 - y1 <= 0:
+        raise ValueError(f"Empty ROI: {value}")
+    return x1, y1, x2, y2
+
+class CameraStream:
+    """Состояние одного RTSP потока: захват, последний кадр, детектор движения и метрики здоровья"""
+
+    def __init__(self, camera_id, rtsp_url, roi=None, alerts=None):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        # Область интереса в долях кадра (x1, y1, x2, y2) или None - весь кадр
+        self.roi = roi
+        self.cap = None
+        self.capture_thread = None
+        # Последний захваченный, но еще не обработанный кадр (новый вытесняет старый)
+        self.latest = None
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        # Модель фона MOG2 (по серой копии кадра) - создается при первом кадре
+        self.motion_detector = None
+        # Гейтинг по движению: номер последнего кадра с движением и время последнего инференса
+        self.last_motion_frame = None
+        self.last_inference_time = 0.0
+        self.inferred = 0
+        self.gated = 0
+        # Треки объектов камеры и кулдауны тревог (предупреждение + снимок)
+        self.tracker = IoUTracker()
+        self.alerts = alerts or AlertPolicy()
+        # Кольцевой буфер кадров для роликов по тревоге (None - ролики не пишутся)
+        self.clips = None
+
+        # connecting -> online -> reconnecting -> online ...
+        self.state = 'connecting'
+        self.decode_errors = 0
+        self.reconnects = 0
+        self.last_frame_time = None
+        self.started_at = time.time()
+        # Кадры с прошлого отчета - для fps_in
+        self.frames_since_report = 0
+
+    def health(self, interval):
+        """Метрики потока за последний интервал отчета (сбрасывает счетчик fps)"""
+        now = time.time()
+        since_frame = now - (self.last_frame_time or self.started_at)
+        report = {
+            "status": "health",
+            "state": self.state,
+            "fps_in": round(self.frames_since_report / interval, 2) if interval > 0 else 0.0,
+            "frames": self.captured,
+            "dropped": self.dropped,
+            "decode_errors": self.decode_errors,
+            "reconnects": self.reconnects,
+            "seconds_since_frame": round(since_frame, 1),
+            "inferred": self.inferred,
+            "gated": self.gated,
+            "alerts_suppressed": self.alerts.suppressed
+        }
+        self.frames_since_report = 0
+        return report
 
 class IPCameraAnalyzer:
-    def __init__(self, model_path, rtsp_url, motion_detection=False, night_mode=False):
+    """Анализ нескольких RTSP потоков одной моделью.
+
+    У каждой камеры свой поток захвата, инференс - один общий поток, который
+    собирает последние кадры камер в батч. Все сообщения помечены camera_id.
+    """
+
+    def __init__(self, model_path, rtsp_urls, motion_detection=False, night_mode=False, backend=None, int8=None,
+                 camera_ids=None, max_batch=16, health_interval=5.0, max_backoff=30.0, stall_timeout=10.0,
+                 decoder=None, decode_size=None, imgsz=EXPORT_IMGSZ, rois=None, motion_width=MOTION_PROXY_WIDTH,
+                 motion_gate=False, motion_frames=15, keepalive=10.0, track_cooldown=300.0, class_cooldown=30.0,
+                 clips=False, pre_roll=5.0, post_roll=5.0, clip_fps=10.0, clip_buffer_mb=32.0,
+                 preview_fps=10.0, preview_size=640, preview_quality=70):
+        if isinstance(rtsp_urls, str):
+            rtsp_urls = [rtsp_urls]
+        camera_ids = list(camera_ids or [])
+        camera_ids += [f"cam{i + 1}" for i in range(len(camera_ids), len(rtsp_urls))]
+
         print(safe_json_dumps({
-            "status": "info", 
-            "message": f"Инициализация с моделью: {model_path}, RTSP URL: {rtsp_url}"
+            "status": "info",
+            "message": f"Инициализация с моделью: {model_path}, RTSP URL: {', '.join(rtsp_urls)}"
         }))
-        
+
         # Инициализируем атрибуты
-        self.rtsp_url = rtsp_url
+        rois = list(rois or [])
+        rois += [None] * (len(rtsp_urls) - len(rois))
+        self.streams = [CameraStream(camera_id, url, roi, AlertPolicy(track_cooldown, class_cooldown))
+                        for camera_id, url, roi in zip(camera_ids, rtsp_urls, rois)]
         self.motion_detection = motion_detection
+        # Гейтинг: YOLO запускается, только если движение было в последних motion_frames
+        # кадрах камеры, плюс контрольный инференс не реже раза в keepalive секунд
+        self.motion_gate = motion_gate
+        self.motion_frames = max(1, motion_frames)
+        self.keepalive = keepalive
         self.night_mode = night_mode
-        self.cap = None
+        self.max_batch = max(1, max_batch)
+        self.health_interval = health_interval
+        self.max_backoff = max(RECONNECT_MIN_DELAY, max_backoff)
+        self.stall_timeout = stall_timeout
+        self.decoder = resolve_decoder(decoder)
+        # Большая сторона кадра после декодирования (None - исходный размер)
+        self.decode_size = decode_size
+        # Размер входа модели: кадр (или ROI) уменьшается до него до инференса
+        self.imgsz = imgsz
+        self.motion_width = motion_width
         self.is_running = False
-        self.frame_queue = Queue(maxsize=2)
-        self.result_queue = Queue()
+        # Прерывает паузы переподключения при остановке
+        self.stop_event = threading.Event()
+        self.frames_ready = threading.Condition()
+        self.next_stream = 0
         self.processing_thread = None
-        self.capture_thread = None
-        
+        self.health_thread = None
+        # Пишут все потоки захвата и поток обработки - строки JSON не должны перемешиваться
+        self.print_lock = threading.Lock()
+        # Превью с боксами публикует свой поток, инференс JPEG не кодирует (preview_fps=0 - без превью)
+        self.preview = None
+        if preview_fps > 0:
+            self.preview = PreviewPublisher(self._send, fps=preview_fps, size=preview_size, quality=preview_quality)
+
         # Создаем директорию для сохранения результатов
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.save_dir = os.path.join(os.path.dirname(script_dir), 'runs', 'detect', 'ip_camera')
         os.makedirs(self.save_dir, exist_ok=True)
         print(safe_json_dumps({"status": "info", "message": f"Директория для сохранения: {self.save_dir}"}))
 
+        # Ролики по тревоге: буфер на камеру (не больше clip_buffer_mb МБ) и один общий поток записи
+        self.clip_writer = None
+        if clips:
+            self.clip_writer = ClipWriter(
+                self.save_dir, lambda camera_id, message: self._send(None, dict(message, camera_id=camera_id)))
+            for stream in self.streams:
+                stream.clips = ClipBuffer(stream.camera_id, self.clip_writer, pre_roll=pre_roll, post_roll=post_roll,
+                                          fps=clip_fps, max_bytes=int(clip_buffer_mb * 1024 * 1024), rgb=True)
+
         # Проверяем существование модели
         if not os.path.exists(model_path):
             print(safe_json_dumps({
@@ -55,7 +181,7 @@ class IPCameraAnalyzer:
 
         try:
             print(safe_json_dumps({"status": "info", "message": "Загрузка модели YOLO..."}))
-            self.model = YOLO(model_path)
+            self.model = load_model(model_path, backend, int8=int8)
             print(safe_json_dumps({"status": "info", "message": "Модель успешно загружена"}))
         except Exception as e:
             print(safe_json_dumps({
@@ -64,447 +190,617 @@ class IPCameraAnalyzer:
             }))
             return
 
-        # Инициализируем детектор движения
-        if self.motion_detection:
-            self.motion_detector = cv2.createBackgroundSubtractorMOG2(history=100, varThreshold=40)
-            self.prev_frame = None
-            self.motion_threshold = 300  # Снижен порог для более чувствительного детектирования движения
+        # Порог нужен и датчику движения, и гейтингу
+        self.motion_threshold = 300  # Снижен порог для более чувствительного детектирования движения
+
+    def _send(self, stream, message):
+        """Печатает JSON сообщение; stream=None - сообщение анализатора целиком"""
+        if stream is not None:
+            message["camera_id"] = stream.camera_id
+        with self.print_lock:
+            print(safe_json_dumps(message), flush=True)
+
+    def _open_stream(self, stream):
+        """Одна попытка открыть поток"""
+        self._send(stream, {"status": "info", "message": f"Попытка подключиться к RTSP потоку: {stream.rtsp_url}"})
+        try:
+            if self.decoder == 'ffmpeg':
+                # Декодирование, масштаб и перевод в RGB - в процессе ffmpeg
+                cap = open_capture(stream.rtsp_url, 'ffmpeg', size=self.decode_size, pix_fmt='rgb24')
+                if cap.isOpened():
+                    stream.cap = cap
+                    return True
+                cap.release()
+                return False
+
+            params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, CAPTURE_TIMEOUT_MS,
+                      cv2.CAP_PROP_READ_TIMEOUT_MSEC, CAPTURE_TIMEOUT_MS]
+            cap = cv2.VideoCapture(stream.rtsp_url, cv2.CAP_FFMPEG, params)
+            if not cap.isOpened():
+                # Бэкенд по умолчанию (например, для файлов и устройств)
+                cap = cv2.VideoCapture(stream.rtsp_url)
+            if cap.isOpened():
+                stream.cap = cap
+                return True
+        except Exception as e:
+            self._send(stream, {"status": "error", "message": f"Ошибка при открытии RTSP потока: {str(e)}"})
+        return False
+
+    def _close_stream(self, stream):
+        if stream.cap is not None:
+            stream.cap.release()
+            stream.cap = None
+
+    def _connect(self, stream):
+        """Открывает поток, пока не получится; паузы между попытками растут вдвое до max_backoff"""
+        delay = RECONNECT_MIN_DELAY
+        attempt = 0
+        while self.is_running:
+            attempt += 1
+            if self._open_stream(stream):
+                self._send(stream, {"status": "info", "message": f"RTSP поток успешно открыт с попытки {attempt}"})
+                stream.state = 'online'
+                return True
+            self._send(stream, {
+                "status": "warning",
+                "message": f"Попытка {attempt} открыть RTSP поток не удалась, повтор через {delay:.0f} сек"
+            })
+            if self.stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.max_backoff)
+        return False
 
     def start(self):
-        print(safe_json_dumps({"status": "info", "message": f"Попытка подключиться к RTSP потоку: {self.rtsp_url}"}))
         self.is_running = True
-        
-        # Пробуем открыть RTSP поток несколько раз
-        for attempt in range(3):
-            try:
-                self.cap = cv2.VideoCapture(self.rtsp_url)
-                if self.cap.isOpened():
-                    print(safe_json_dumps({"status": "info", "message": f"RTSP поток успешно открыт с попытки {attempt + 1}"}))
-                    break
-                else:
-                    print(safe_json_dumps({"status": "warning", "message": f"Попытка {attempt + 1} открыть RTSP поток не удалась"}))
-                    time.sleep(1)
-            except Exception as e:
-                print(safe_json_dumps({"status": "error", "message": f"Ошибка при открытии RTSP потока: {str(e)}"}))
-                time.sleep(1)
-        
-        if not self.cap.isOpened():
-            print(safe_json_dumps({"status": "error", "message": "Не удалось открыть RTSP поток после всех попыток"}))
-            return False
-
-        # Запускаем потоки для захвата и обработки кадров
-        self.capture_thread = threading.Thread(target=self._capture_frames)
-        self.processing_thread = threading.Thread(target=self._process_frames)
-        
-        self.capture_thread.start()
+        self.stop_event.clear()
+
+        # Потоки захвата (по одному на камеру) сами подключаются и переподключаются к камерам;
+        # недоступная при старте камера не мешает остальным
+        for stream in self.streams:
+            stream.capture_thread = threading.Thread(target=self._capture_frames, args=(stream,), daemon=True)
+            stream.capture_thread.start()
+        self.processing_thread = threading.Thread(target=self._process_frames, daemon=True)
         self.processing_thread.start()
-        
-        print(safe_json_dumps({"status": "info", "message": "Потоки обработки запущены"}))
+        if self.preview is not None:
+            self.preview.start()
+        if self.health_interval > 0:
+            self.health_thread = threading.Thread(target=self._report_health, daemon=True)
+            self.health_thread.start()
+
+        self._send(None, {
+            "status": "info",
+            "message": f"Потоки обработки запущены: камер {len(self.streams)}",
+            "cameras": [stream.camera_id for stream in self.streams]
+        })
         return True
 
     def stop(self):
         self.is_running = False
-        if self.cap is not None:
-            self.cap.release()
+        self.stop_event.set()
+        if self.preview is not None:
+            self.preview.stop()
+        with self.frames_ready:
+            self.frames_ready.notify_all()
+            for stream in self.streams:
+                stream.latest = None
+        for stream in self.streams:
+            if stream.capture_thread is not None and stream.capture_thread is not threading.current_thread():
+                stream.capture_thread.join(timeout=CAPTURE_TIMEOUT_MS / 1000 + 1)
+            self._close_stream(stream)
+            if stream.clips is not None:
+                stream.clips.flush()
+        if self.clip_writer is not None:
+            self.clip_writer.close()
         cv2.destroyAllWindows()
-        
-        # Очищаем очереди
-        while not self.frame_queue.empty():
-            self.frame_queue.get()
-        while not self.result_queue.empty():
-            self.result_queue.get()
-
-    def _detect_motion(self, frame):
-        if not self.motion_detection:
-            return False
 
-        # Конвертируем в оттенки серого
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
+    def _report_health(self):
+        """Периодический JSON с метриками каждого потока"""
+        while not self.stop_event.wait(self.health_interval):
+            for stream in self.streams:
+                self._send(stream, stream.health(self.health_interval))
+
+    def _motion_proxy(self, region):
+        """Маленькая серая копия кадра (или ROI): движение и яркость считаются по ней"""
+        h, w = region.shape[:2]
+        if w > self.motion_width:
+            height = max(1, int(round(h * self.motion_width / w)))
+            region = cv2.resize(region, (self.motion_width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), region.shape[1] / w
+
+    def _detect_motion(self, stream, proxy, scale):
+        if not (self.motion_detection or self.motion_gate):
+            return False
 
-        # Если это первый кадр, сохраняем его
-        if self.prev_frame is None:
-            self.prev_frame = gray
+        # Модель фона MOG2 устойчивее разницы соседних кадров к шуму и плавной смене освещения
+        if stream.motion_detector is None:
+            stream.motion_detector = cv2.createBackgroundSubtractorMOG2(history=100, varThreshold=40)
+            # Первые кадры только обучают модель фона
+            stream.motion_detector.apply(proxy)
             return False
 
-        # Вычисляем разницу между текущим и предыдущим кадром
-        frame_delta = cv2.absdiff(self.prev_frame, gray)
-        thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
+        # Размытие пропорционально размеру копии (нечетное ядро)
+        blur = max(3, int(MOTION_BLUR_SIZE * scale) | 1)
+        gray = cv2.GaussianBlur(proxy, (blur, blur), 0)
+
+        # Маска переднего плана; тени (127) не считаются движением
+        mask = stream.motion_detector.apply(gray)
+        thresh = cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)[1]
         thresh = cv2.dilate(thresh, None, iterations=2)
 
         # Находим контуры
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         # Проверяем, есть ли значительное движение
-        # Снижаем порог для более чувствительного детектирования
+        # Порог задан в пикселях полного кадра - переводим в пиксели копии
+        motion_threshold = self.motion_threshold * scale * scale
         motion_detected = False
         total_motion_area = 0
         for contour in contours:
             area = cv2.contourArea(contour)
             total_motion_area += area
-            if area > self.motion_threshold:
+            if area > motion_threshold:
                 motion_detected = True
                 break
-        
+
         # Альтернативный способ: если суммарная площадь движения достаточно большая
-        if not motion_detected and total_motion_area > self.motion_threshold * 0.7:
+        if not motion_detected and total_motion_area > motion_threshold * 0.7:
             motion_detected = True
 
-        # Обновляем предыдущий кадр
-        self.prev_frame = gray
-
         return motion_detected
 
-    def _is_night_mode(self, frame):
+    def _should_infer(self, stream, motion_detected):
+        """Гейтинг: запускать ли модель на этом кадре камеры"""
+        if motion_detected:
+            stream.last_motion_frame = stream.processed
+        if not self.motion_gate:
+            return True
+        if stream.last_motion_frame is not None and stream.processed - stream.last_motion_frame < self.motion_frames:
+            return True
+        # Контрольный инференс: объект может стоять неподвижно
+        return time.time() - stream.last_inference_time >= self.keepalive
+
+    def _is_night_mode(self, stream, proxy):
         if not self.night_mode:
             return False
 
-        # Конвертируем в оттенки серого
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Вычисляем среднюю яркость
-        avg_brightness = np.mean(gray)
-        
+        # Вычисляем среднюю яркость (по серой копии кадра)
+        avg_brightness = np.mean(proxy)
+
         # Если средняя яркость ниже порога, считаем что это ночной режим
         is_night = avg_brightness < 50  # Порог можно настроить
-        
+
         # Всегда выводим информацию о типе сцены
         scene_type = "ночная" if is_night else "дневная"
-        print(safe_json_dumps({
+        self._send(stream, {
             "status": "info",
             "message": f"Текущая сцена: {scene_type} (яркость: {avg_brightness:.2f})"
-        }))
-        
+        })
+
         return is_night
 
-    def _capture_frames(self):
-        frame_count = 0
+    def _roi_box(self, stream, frame):
+        """ROI камеры в пикселях кадра (x1, y1, x2, y2) или None"""
+        if stream.roi is None:
+            return None
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = stream.roi
+        return int(x1 * w), int(y1 * h), max(int(x2 * w), int(x1 * w) + 1), max(int(y2 * h), int(y1 * h) + 1)
+
+    def _prepare_input(self, stream, frame):
+        """Вырезает ROI и уменьшает его до imgsz по большей стороне.
+
+        Возвращает (область кадра, вход модели, смещение ROI, масштаб вход/область) -
+        по смещению и масштабу боксы модели переводятся обратно в координаты кадра.
+        """
+        roi = self._roi_box(stream, frame)
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            region = frame[y1:y2, x1:x2]
+            offset = (x1, y1)
+        else:
+            region = frame
+            offset = (0, 0)
+
+        h, w = region.shape[:2]
+        scale = 1.0
+        model_input = region
+        if self.imgsz and max(h, w) > self.imgsz:
+            scale = self.imgsz / max(h, w)
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            model_input = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        return region, model_input, offset, scale
+
+    def _map_detections(self, result, offset, scale, frame):
+        """Детекции модели в координатах полного кадра: [{"class", "confidence", "box", "dangerous"}]"""
+        h, w = frame.shape[:2]
+        return Detections.from_result(result, offset, scale, frame_size=(w, h)).to_dicts()
+
+    def _capture_frames(self, stream):
+        """Цикл захвата под надзором: упавший или зависший поток переоткрывается с backoff"""
         while self.is_running:
-            try:
-                ret, frame = self.cap.read()
-                if not ret:
-                    print(safe_json_dumps({"status": "error", "message": "Ошибка чтения кадра"}))
-                    time.sleep(0.1)
-                    continue
-
-                # Проверяем и конвертируем в RGB для отображения
-                if frame is not None and frame.size > 0:
-                    if len(frame.shape) == 3 and frame.shape[2] == 3:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    else:
-                        print(safe_json_dumps({"status": "error", "message": "Неправильный формат кадра"}))
-                        continue
+            if stream.cap is None and not self._connect(stream):
+                break
 
-                frame_count += 1
-                if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                    print(safe_json_dumps({"status": "info", "message": f"Обработано кадров: {frame_count}"}))
+            failures = 0
+            # Время последнего успешного чтения в этом подключении
+            last_ok = time.time()
+            while self.is_running:
+                try:
+                    ret, frame = stream.cap.read()
+                except Exception as e:
+                    self._send(stream, {"status": "error", "message": f"Ошибка в потоке захвата: {str(e)}"})
+                    ret, frame = False, None
+
+                if not ret or frame is None or frame.size == 0:
+                    stream.decode_errors += 1
+                    failures += 1
+                    since_frame = time.time() - last_ok
+                    if failures >= MAX_READ_FAILURES or since_frame > self.stall_timeout:
+                        self._send(stream, {
+                            "status": "warning",
+                            "message": f"Поток не отдает кадры {since_frame:.1f} сек, переподключение",
+                            "decode_errors": stream.decode_errors
+                        })
+                        break
+                    # Пауза растет с числом ошибок подряд, чтобы не крутить ядро впустую
+                    if not stream.cap.isOpened() or self.stop_event.wait(min(0.05 * failures, 1.0)):
+                        break
+                    continue
 
-                # Очищаем очередь, если она полная
-                if self.frame_queue.full():
-                    try:
-                        self.frame_queue.get_nowait()
-                    except:
-                        pass
+                failures = 0
+                last_ok = time.time()
+                # Проверяем и конвертируем в RGB для отображения (кадры ffmpeg уже в RGB нужного размера)
+                if len(frame.shape) == 3 and frame.shape[2] == 3:
+                    frame = convert_frame(stream.cap, frame, self.decode_size, pix_fmt='rgb24')
+                else:
+                    stream.decode_errors += 1
+                    self._send(stream, {"status": "error", "message": "Неправильный формат кадра"})
+                    continue
 
-                self.frame_queue.put(frame)
-            except Exception as e:
-                print(safe_json_dumps({"status": "error", "message": f"Ошибка в потоке захвата: {str(e)}"}))
-                time.sleep(0.1)
+                stream.captured += 1
+                stream.frames_since_report += 1
+                stream.last_frame_time = time.time()
+                if stream.clips is not None:
+                    # Кодирование в JPEG - в потоке захвата, а не инференса
+                    stream.clips.add(frame, stream.last_frame_time)
+                if self.preview is not None:
+                    self.preview.update_frame(stream, frame)
+                if stream.captured % 30 == 0:  # Логируем каждые 30 кадров
+                    self._send(stream, {"status": "info", "message": f"Обработано кадров: {stream.captured}"})
+
+                # Кладем кадр в слот камеры; необработанный старый кадр отбрасывается
+                with self.frames_ready:
+                    if stream.latest is not None:
+                        stream.dropped += 1
+                        recycle_frame(stream.cap, stream.latest)
+                    stream.latest = frame
+                    self.frames_ready.notify()
+
+            # Поток упал или завис - закрываем и переподключаемся
+            self._close_stream(stream)
+            if stream.clips is not None:
+                # Новых кадров может не быть долго - ролик пишется с тем, что успели снять
+                stream.clips.flush()
+            if self.is_running:
+                stream.state = 'reconnecting'
+                stream.reconnects += 1
+                # Новое подключение - кадр может быть другим, модель фона учится заново
+                stream.motion_detector = None
+
+    def _collect_batch(self, timeout=1.0):
+        """Забирает последние кадры камер - [(камера, кадр), ...], не больше max_batch.
+
+        Камеры обходятся по кругу: если камер больше max_batch, следующий батч
+        начинается с камеры после последней взятой.
+        """
+        with self.frames_ready:
+            self.frames_ready.wait_for(
+                lambda: not self.is_running or any(s.latest is not None for s in self.streams), timeout)
+
+            count = len(self.streams)
+            batch = []
+            for i in range(count):
+                index = (self.next_stream + i) % count
+                stream = self.streams[index]
+                if stream.latest is None:
+                    continue
+                batch.append((stream, stream.latest))
+                stream.latest = None
+                if len(batch) >= self.max_batch:
+                    self.next_stream = (index + 1) % count
+                    break
+            return batch
 
     def _process_frames(self):
-        frame_count = 0
         while self.is_running:
             try:
-                # Получаем кадр из очереди с таймаутом
-                try:
-                    frame = self.frame_queue.get(timeout=1)
-                except:
+                batch = self._collect_batch()
+                if not batch:
                     continue
 
-                if frame is None or frame.size == 0:
-                    print(safe_json_dumps({"status": "error", "message": "Получен пустой кадр"}))
-                    continue
-
-                frame_count += 1
-                
                 # Засекаем время начала обработки
                 start_time = time.time()
-                
-                try:
-                    # Проверяем движение и ночной режим
-                    motion_detected = self._detect_motion(frame)
-                    is_night = self._is_night_mode(frame)
 
-                    # Отправляем информацию о движении и сцене в реальном времени
-                    if motion_detected:
-                        print(safe_json_dumps({
-                            "status": "info",
-                            "message": "Обнаружено движение",
-                            "motion": True,
-                            "scene_type": "ночная" if is_night else "дневная"
-                        }))
-                    else:
-                        # Логируем отсутствие движения реже (каждые 60 кадров)
-                        if frame_count % 60 == 0:
-                            print(safe_json_dumps({
-                                "status": "info",
-                                "message": "Движение не обнаружено",
-                                "motion": False,
-                                "scene_type": "ночная" if is_night else "дневная"
-                            }))
-
-                    # Логируем тип сцены каждые 30 кадров
-                    if frame_count % 30 == 0:
-                        scene_type = "ночная" if is_night else "дневная"
-                        print(safe_json_dumps({
-                            "status": "info",
-                            "message": f"Текущая сцена: {scene_type}",
-                            "scene_type": scene_type
-                        }))
-
-                    # Запускаем модель
-                    results = self.model(frame, verbose=False)
-                    
-                    # Обрабатываем результаты
-                    for result in results:
-                        boxes = result.boxes
-                        if len(boxes) > 0:
-                            # Получаем информацию об обнаруженных объектах
-                            detections = []
-                            for box in boxes:
-                                try:
-                                    cls = int(box.cls[0])
-                                    conf = float(box.conf[0])
-                                    name = result.names[cls]
-                                    detections.append({
-                                        "class": name,
-                                        "confidence": conf
-                                    })
-                                    
-                                    # Рисуем рамку и подпись
-                                    try:
-                                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                        # Проверяем, что координаты находятся в пределах изображения
-                                        h, w = frame.shape[:2]
-                                        x1 = max(0, min(x1, w-1))
-                                        y1 = max(0, min(y1, h-1))
-                                        x2 = max(0, min(x2, w-1))
-                                        y2 = max(0, min(y2, h-1))
-                                        
-                                        # Рисуем рамку
-                                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                        
-                                        # Подготавливаем текст
-                                        text = f"{name} {conf:.2f}"
-                                        font = cv2.FONT_HERSHEY_SIMPLEX
-                                        font_scale = 0.5
-                                        thickness = 2
-                                        
-                                        # Получаем размеры текста
-                                        (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                                        
-                                        # Рисуем фон для текста
-                                        cv2.rectangle(frame, 
-                                                    (x1, y1 - text_height - 10),
-                                                    (x1 + text_width, y1),
-                                                    (0, 255, 0),
-                                                    -1)
-                                        
-                                        # Рисуем текст
-                                        cv2.putText(frame,
-                                                  text,
-                                                  (x1, y1 - 5),
-                                                  font,
-                                                  font_scale,
-                                                  (0, 0, 0),
-                                                  thickness)
-                                    except Exception as e:
-                                        print(safe_json_dumps({
-                                            "status": "error",
-                                            "message": f"Ошибка отрисовки бокса: {str(e)}"
-                                        }))
-                                        continue
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка обработки бокса: {str(e)}"
-                                    }))
-                                    continue
-                            
-                            # Отправляем результаты с информацией о движении и сцене
-                            print(safe_json_dumps({
-                                "status": "info",
-                                "message": f"Обнаружено {len(detections)} объектов: {', '.join([d['class'] for d in detections])}",
-                                "detections": [d['class'] for d in detections],
-                                "motion": motion_detected,
-                                "scene_type": "ночная" if is_night else "дневная"
-                            }))
-                            
-                            # Отправляем кадр с боксами в base64
-                            try:
-                                if frame is not None and frame.size > 0:
-                                    # Создаем копию кадра для обработки
-                                    frame_copy = frame.copy()
-                                    
-                                    # Устанавливаем параметры сжатия JPEG
-                                    encode_params = [
-                                        cv2.IMWRITE_JPEG_QUALITY, 95,
-                                        cv2.IMWRITE_JPEG_OPTIMIZE, 1
-                                    ]
-                                    
-                                    # Кодируем изображение
-                                    success, jpeg = cv2.imencode('.jpg', frame_copy, encode_params)
-                                    
-                                    if success:
-                                        b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
-                                        print(safe_json_dumps({
-                                            "status": "frame",
-                                            "image": b64
-                                        }))
-                                    else:
-                                        print(safe_json_dumps({
-                                            "status": "error",
-                                            "message": "Ошибка кодирования JPEG"
-                                        }))
-                            except Exception as e:
-                                print(safe_json_dumps({
-                                    "status": "error",
-                                    "message": f"Ошибка кодирования кадра: {str(e)}"
-                                }))
-                            
-                            # Если обнаружены опасные объекты
-                            dangerous_objects = [d for d in detections if d['class'] in {
-                                'antifa', 'cocaine', 'confederate-flag', 'destroy',
-                                'fire', 'glass-defect', 'gun', 'heroin', 'isis',
-                                'knife', 'marijuana', 'rocket', 'shrooms', 'smoke', 'swastika',
-                                'wolfsangel', 'celtic_cross', 'Violence', 'graffiti'
-                            }]
-                            
-                            # Сохраняем кадр если:
-                            # 1. Обнаружены опасные объекты
-                            # 2. Обнаружено движение в ночном режиме
-                            should_save = False
-                            save_reason = []
-
-                            if dangerous_objects:
-                                should_save = True
-                                save_reason.append("опасные объекты")
-                                print(safe_json_dumps({
-                                    "status": "warning",
-                                    "message": f"Обнаружены потенциально опасные объекты: {', '.join([d['class'] for d in dangerous_objects])}"
-                                }))
-
-                            if motion_detected and is_night:
-                                should_save = True
-                                save_reason.append("движение в ночном режиме")
-                                print(safe_json_dumps({
-                                    "status": "warning",
-                                    "message": "Обнаружено движение в ночном режиме!"
-                                }))
-
-                            if should_save:
-                                try:
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                    reason_str = "_".join(save_reason)
-                                    save_path = os.path.join(self.save_dir, f'detection_{reason_str}_{timestamp}.jpg')
-                                    cv2.imwrite(save_path, frame)
-                                    
-                                    print(safe_json_dumps({
-                                        "status": "info",
-                                        "message": f"Сохранен кадр с обнаруженными объектами: {save_path}"
-                                    }))
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка сохранения кадра: {str(e)}"
-                                    }))
-                        else:
-                            if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                                print(safe_json_dumps({
-                                    "status": "info",
-                                    "message": "Объекты не обнаружены"
-                                }))
-                                
-                                # Отправляем кадр даже если объекты не обнаружены
-                                try:
-                                    if frame is not None and frame.size > 0:
-                                        # Создаем копию кадра для обработки
-                                        frame_copy = frame.copy()
-                                        
-                                        # Устанавливаем параметры сжатия JPEG
-                                        encode_params = [
-                                            cv2.IMWRITE_JPEG_QUALITY, 95,
-                                            cv2.IMWRITE_JPEG_OPTIMIZE, 1
-                                        ]
-                                        
-                                        # Кодируем изображение
-                                        success, jpeg = cv2.imencode('.jpg', frame_copy, encode_params)
-                                        
-                                        if success:
-                                            b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
-                                            print(safe_json_dumps({
-                                                "status": "frame",
-                                                "image": b64
-                                            }))
-                                        else:
-                                            print(safe_json_dumps({
-                                                "status": "error",
-                                                "message": "Ошибка кодирования JPEG"
-                                            }))
-                                except Exception as e:
-                                    print(safe_json_dumps({
-                                        "status": "error",
-                                        "message": f"Ошибка кодирования кадра: {str(e)}"
-                                    }))
+                # Движение и тип сцены считаются по каждой камере до инференса,
+                # по уменьшенной копии ROI; модель получает ROI, уменьшенный до imgsz
+                inputs = []
+                states = []
+                for stream, frame in batch:
+                    if frame is None or frame.size == 0:
+                        self._send(stream, {"status": "error", "message": "Получен пустой кадр"})
+                        continue
+                    stream.processed += 1
+                    try:
+                        region, model_input, offset, scale = self._prepare_input(stream, frame)
+                        proxy, proxy_scale = self._motion_proxy(region)
+                        motion_detected = self._detect_motion(stream, proxy, proxy_scale)
+                        is_night = self._is_night_mode(stream, proxy)
+                        infer = self._should_infer(stream, motion_detected)
+                        # Для гейтинга движение считается всегда, но сообщается только с датчиком движения
+                        motion_detected = motion_detected and self.motion_detection
+                        self._report_scene(stream, motion_detected, is_night)
+                    except Exception as e:
+                        self._send(stream, {"status": "error", "message": f"Ошибка обработки кадра: {str(e)}"})
+                        continue
+                    if not infer:
+                        # Сцена неподвижна - модель не запускается. Кадр считается кадром без
+                        # детекций: треки стареют, а превью не рисует устаревшие боксы
+                        stream.gated += 1
+                        stream.tracker.update([])
+                        if self.preview is not None:
+                            self.preview.update_results(stream, [], self._roi_box(stream, frame))
+                        recycle_frame(stream.cap, frame)
+                        continue
+                    stream.inferred += 1
+                    stream.last_inference_time = time.time()
+                    inputs.append(model_input)
+                    states.append((stream, frame, offset, scale, motion_detected, is_night))
+                if not inputs:
+                    continue
+
+                # Один прогон модели на последние кадры всех камер
+                try:
+                    results = self.model.predict(inputs, imgsz=self.imgsz, verbose=False)
                 except Exception as e:
-                    print(safe_json_dumps({
-                        "status": "error",
-                        "message": f"Ошибка обработки кадра: {str(e)}"
-                    }))
+                    for stream, *_ in states:
+                        self._send(stream, {"status": "error", "message": f"Ошибка обработки кадра: {str(e)}"})
                     continue
-                
+
+                for (stream, frame, offset, scale, motion_detected, is_night), result in zip(states, results):
+                    try:
+                        detections = self._map_detections(result, offset, scale, frame)
+                        self._handle_result(stream, frame, detections, motion_detected, is_night)
+                    except Exception as e:
+                        self._send(stream, {"status": "error", "message": f"Ошибка обработки кадра: {str(e)}"})
+                    # Память кадра возвращается в пул источника
+                    recycle_frame(stream.cap, frame)
+
                 # Вычисляем время обработки
                 process_time = time.time() - start_time
-                if frame_count % 30 == 0:  # Логируем каждые 30 кадров
-                    print(safe_json_dumps({
-                        "status": "info",
-                        "message": f"Время обработки: {process_time:.2f} сек"
-                    }))
-                
+                for stream, *_ in states:
+                    if stream.inferred % 30 == 0:  # Логируем каждые 30 кадров с инференсом
+                        self._send(stream, {
+                            "status": "info",
+                            "message": f"Время обработки: {process_time:.2f} сек (камер в батче: {len(inputs)})",
+                            "batch": len(inputs),
+                            "dropped": stream.dropped,
+                            "inferred": stream.inferred,
+                            "gated": stream.gated
+                        })
+
             except Exception as e:
-                print(safe_json_dumps({
+                self._send(None, {
                     "status": "error",
                     "message": f"Ошибка в основном цикле обработки: {str(e)}"
-                }))
+                })
                 time.sleep(0.1)
 
+    def _report_scene(self, stream, motion_detected, is_night):
+        scene_type = "ночная" if is_night else "дневная"
+
+        # Отправляем информацию о движении и сцене в реальном времени
+        if motion_detected:
+            self._send(stream, {
+                "status": "info",
+                "message": "Обнаружено движение",
+                "motion": True,
+                "scene_type": scene_type
+            })
+        elif stream.processed % 60 == 0:
+            # Логируем отсутствие движения реже (каждые 60 кадров)
+            self._send(stream, {
+                "status": "info",
+                "message": "Движение не обнаружено",
+                "motion": False,
+                "scene_type": scene_type
+            })
+
+        # Логируем тип сцены каждые 30 кадров
+        if stream.processed % 30 == 0:
+            self._send(stream, {
+                "status": "info",
+                "message": f"Текущая сцена: {scene_type}",
+                "scene_type": scene_type
+            })
+
+    def _handle_result(self, stream, frame, detections, motion_detected, is_night):
+        # Граница ROI для оператора (на превью и сохраненных кадрах)
+        roi = self._roi_box(stream, frame)
+
+        # Трекер обновляется и на пустых кадрах - так пропавшие объекты стареют
+        stream.tracker.update(detections)
+        if self.preview is not None:
+            self.preview.update_results(stream, detections, roi)
+
+        if not detections:
+            if stream.processed % 30 == 0:  # Логируем каждые 30 кадров
+                self._send(stream, {
+                    "status": "info",
+                    "message": "Объекты не обнаружены"
+                })
+            return
+
+        # Отправляем результаты с информацией о движении и сцене
+        self._send(stream, {
+            "status": "info",
+            "message": f"Обнаружено {len(detections)} объектов: {', '.join([d['class'] for d in detections])}",
+            "detections": [d['class'] for d in detections],
+            "track_ids": [d['track_id'] for d in detections],
+            "motion": motion_detected,
+            "scene_type": "ночная" if is_night else "дневная"
+        })
+
+        # Тревожат только опасные объекты, по которым еще не было тревоги:
+        # каждый трек - один раз (и снова после track_cooldown), класс - не чаще class_cooldown
+        dangerous_objects = [d for d in detections if d['dangerous']
+                             and stream.alerts.should_alert(d['track_id'], d['class'])]
+
+        # Сохраняем кадр если:
+        # 1. Появились новые опасные объекты
+        # 2. Обнаружено движение в ночном режиме (не чаще class_cooldown)
+        should_save = False
+        save_reason = []
+
+        if dangerous_objects:
+            should_save = True
+            save_reason.append("опасные объекты")
+            self._send(stream, {
+                "status": "warning",
+                "message": f"Обнаружены потенциально опасные объекты: {', '.join([d['class'] for d in dangerous_objects])}",
+                "track_ids": [d['track_id'] for d in dangerous_objects]
+            })
+
+        if motion_detected and is_night and stream.alerts.should_alert(None, 'night_motion'):
+            should_save = True
+            save_reason.append("движение в ночном режиме")
+            self._send(stream, {
+                "status": "warning",
+                "message": "Обнаружено движение в ночном режиме!"
+            })
+
+        if should_save:
+            reason_str = "_".join(save_reason)
+            # Рамки и подписи рисуются только на сохраняемом кадре (координаты уже в полном кадре)
+            draw_detections(frame, detections, roi=roi)
+            try:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                save_path = os.path.join(self.save_dir, f'detection_{stream.camera_id}_{reason_str}_{timestamp}.jpg')
+                cv2.imwrite(save_path, frame)
+
+                self._send(stream, {
+                    "status": "info",
+                    "message": f"Сохранен кадр с обнаруженными объектами: {save_path}"
+                })
+            except Exception as e:
+                self._send(stream, {
+                    "status": "error",
+                    "message": f"Ошибка сохранения кадра: {str(e)}"
+                })
+
+            # Ролик допишет поток захвата (post-roll), на диск его сохранит поток записи
+            if stream.clips is not None and stream.clips.trigger(reason_str):
+                self._send(stream, {
+                    "status": "info",
+                    "message": f"Запись ролика: {stream.clips.pre_roll:g} сек до тревоги и {stream.clips.post_roll:g} сек после"
+                })
+
+def parse_args(argv):
+    """Аргументы запуска. Старый формат тоже поддерживается:
+    ip_camera_analysis.py <модель> <rtsp_url> [true|false - движение] [true|false - ночной режим]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model', help='Model filename in ./models (e.g. all.pt)')
+    parser.add_argument('legacy', nargs='*', help='rtsp_url [motion_detection] [night_mode] (old positional format)')
+    parser.add_argument('--rtsp-url', action='append', default=[], help='RTSP stream URL (repeat for several cameras)')
+    parser.add_argument('--camera-id', action='append', default=[], help='Id of the matching --rtsp-url (default: cam1, cam2, ...)')
+    parser.add_argument('--motion-detection', action='store_true', help='Enable motion detection')
+    parser.add_argument('--night-mode', action='store_true', help='Enable night scene detection')
+    parser.add_argument('--imgsz', type=int, default=EXPORT_IMGSZ,
+                        help='Inference size: frames (or ROIs) are downscaled to it before the model')
+    parser.add_argument('--roi', action='append', default=[],
+                        help="Region of interest of the matching --rtsp-url: 'x1,y1,x2,y2' in 0..1 or 'full'")
+    parser.add_argument('--motion-width', type=int, default=MOTION_PROXY_WIDTH,
+                        help='Width of the grayscale proxy used for motion and brightness analysis')
+    parser.add_argument('--motion-gate', action='store_true',
+                        help='Run the model only after recent motion (plus a periodic keep-alive inference)')
+    parser.add_argument('--motion-frames', type=int, default=15,
+                        help='Motion gate: keep running the model this many frames after the last motion')
+    parser.add_argument('--keepalive', type=float, default=10.0,
+                        help='Motion gate: run the model at least once per this many seconds')
+    parser.add_argument('--track-cooldown', type=float, default=300.0,
+                        help='Seconds before the same tracked dangerous object alerts and is saved again')
+    parser.add_argument('--class-cooldown', type=float, default=30.0,
+                        help='Minimum seconds between alerts of one dangerous class on a camera')
+    parser.add_argument('--clips', action='store_true',
+                        help='Save an MP4 clip around each alert from an in-memory ring buffer of recent frames')
+    parser.add_argument('--pre-roll', type=float, default=5.0, help='Clip seconds before the alert')
+    parser.add_argument('--post-roll', type=float, default=5.0, help='Clip seconds after the last alert')
+    parser.add_argument('--clip-fps', type=float, default=10.0, help='Frame rate of the ring buffer and clips')
+    parser.add_argument('--clip-buffer-mb', type=float, default=32.0,
+                        help='Maximum ring buffer size per camera, megabytes of JPEG frames')
+    parser.add_argument('--preview-fps', type=float, default=10.0,
+                        help='Annotated preview frames per second per camera (0 disables the preview)')
+    parser.add_argument('--preview-size', type=int, default=640, help='Longer side of preview frames')
+    parser.add_argument('--preview-quality', type=int, default=70, help='JPEG quality of preview frames')
+    parser.add_argument('--max-batch', type=int, default=16, help='Maximum number of cameras per batched inference')
+    parser.add_argument('--health-interval', type=float, default=5.0,
+                        help='Seconds between per-camera health reports (0 disables them)')
+    parser.add_argument('--max-backoff', type=float, default=30.0, help='Maximum delay between reconnect attempts, seconds')
+    parser.add_argument('--stall-timeout', type=float, default=10.0,
+                        help='Reconnect when a camera sends no frames for this many seconds')
+    parser.add_argument('--decoder', type=str, choices=DECODERS, default=None,
+                        help='Frame decoder (default: YOLO_DECODER env or opencv)')
+    parser.add_argument('--decode-size', type=int, default=None,
+                        help='Scale decoded frames so that the longer side is this many pixels')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help='Inference backend (default: YOLO_BACKEND env or pytorch)')
+    parser.add_argument('--int8', action='store_true', default=None,
+                        help='Use the INT8 variant made by quantize.py (default: YOLO_INT8 env)')
+    args = parser.parse_args(argv)
+    try:
+        args.roi = [parse_roi(value) for value in args.roi]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.legacy:
+        args.rtsp_url = [args.legacy[0]] + args.rtsp_url
+        args.motion_detection = args.motion_detection or (len(args.legacy) > 1 and args.legacy[1].lower() == 'true')
+        args.night_mode = args.night_mode or (len(args.legacy) > 2 and args.legacy[2].lower() == 'true')
+    return args
+
 def main():
-    if len(sys.argv) < 3:
+    args = parse_args(sys.argv[1:])
+    if not args.rtsp_url:
         print(safe_json_dumps({"status": "error", "message": "Необходимо указать модель и RTSP URL"}))
         return
 
-    # Получаем параметры
-    model_name = sys.argv[1]
-    rtsp_url = sys.argv[2]
-    motion_detection = len(sys.argv) > 3 and sys.argv[3].lower() == 'true'
-    night_mode = len(sys.argv) > 4 and sys.argv[4].lower() == 'true'
-
     print(safe_json_dumps({
         "status": "info",
-        "message": f"Получены параметры:\nМодель: {model_name}\nRTSP URL: {rtsp_url}\nДатчик движения: {motion_detection}\nНочной режим: {night_mode}\nАргументы: {sys.argv}"
+        "message": f"Получены параметры:\nМодель: {args.model}\nRTSP URL: {', '.join(args.rtsp_url)}\nДатчик движения: {args.motion_detection}\nНочной режим: {args.night_mode}\nАргументы: {sys.argv}"
     }))
 
     # Формируем путь к модели
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(script_dir, 'models', model_name)
+    model_path = os.path.join(script_dir, 'models', args.model)
 
     print(safe_json_dumps({
         "status": "info",
-        "message": f"Запуск анализа с параметрами:\nМодель: {model_path}\nRTSP URL: {rtsp_url}\nДатчик движения: {motion_detection}\nНочной режим: {night_mode}"
+        "message": f"Запуск анализа с параметрами:\nМодель: {model_path}\nКамер: {len(args.rtsp_url)}\nДатчик движения: {args.motion_detection}\nНочной режим: {args.night_mode}"
     }))
 
-    analyzer = IPCameraAnalyzer(model_path, rtsp_url, motion_detection, night_mode)
-    
+    analyzer = IPCameraAnalyzer(model_path, args.rtsp_url, args.motion_detection, args.night_mode,
+                                backend=args.backend, int8=args.int8, camera_ids=args.camera_id,
+                                max_batch=args.max_batch, health_interval=args.health_interval,
+                                max_backoff=args.max_backoff, stall_timeout=args.stall_timeout,
+                                decoder=args.decoder, decode_size=args.decode_size,
+                                imgsz=args.imgsz, rois=args.roi, motion_width=args.motion_width,
+                                motion_gate=args.motion_gate, motion_frames=args.motion_frames,
+                                keepalive=args.keepalive, track_cooldown=args.track_cooldown,
+                                class_cooldown=args.class_cooldown, clips=args.clips, pre_roll=args.pre_roll,
+                                post_roll=args.post_roll, clip_fps=args.clip_fps,
+                                clip_buffer_mb=args.clip_buffer_mb, preview_fps=args.preview_fps,
+                                preview_size=args.preview_size, preview_quality=args.preview_quality)
+
     def signal_handler(signum, frame):
         print(safe_json_dumps({"status": "info", "message": "Получен сигнал остановки"}))
         analyzer.stop()
@@ -523,4 +819,4 @@ def main():
         print(safe_json_dumps({"status": "error", "message": "Не удалось запустить анализ"}))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
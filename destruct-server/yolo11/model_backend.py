@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+from ultralytics import YOLO
+
+# pytorch - исходные .pt веса; onnx / openvino - экспорт под CPU, который
+# делается один раз и кэшируется рядом с весами в yolo11/models/
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+DEFAULT_BACKEND = os.environ.get('YOLO_BACKEND', 'pytorch').lower()
+# INT8 варианты создаются скриптом quantize.py по калибровочным изображениям
+DEFAULT_INT8 = os.environ.get('YOLO_INT8', 'false').lower() == 'true'
+EXPORT_IMGSZ = int(os.environ.get('YOLO_EXPORT_IMGSZ', '640'))
+# Префикс уведомлений о выборе модели в stderr: server.js показывает такие
+# строки как информацию, а не как ошибку
+NOTICE_PREFIX = 'Model backend:'
+
+def notice(message):
+    print(f"{NOTICE_PREFIX} {message}", file=sys.stderr, flush=True)
+
+def resolve_backend(backend=None):
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+def exported_path(weights, backend):
+    """Путь к экспорту весов (совпадает с путем, куда пишет YOLO.export)"""
+    stem = os.path.splitext(os.path.abspath(weights))[0]
+    if backend == 'onnx':
+        return stem + '.onnx'
+    if backend == 'openvino':
+        return stem + '_openvino_model'
+    return os.path.abspath(weights)
+
+def quantized_path(weights, backend):
+    """Путь к INT8 варианту весов (совпадает с путем, куда пишет quantize.py)"""
+    stem = os.path.splitext(os.path.abspath(weights))[0]
+    if backend == 'onnx':
+        return stem + '_int8.onnx'
+    if backend == 'openvino':
+        return stem + '_int8_openvino_model'
+    return None
+
+def _export_file(weights, path, backend):
+    # У OpenVINO экспорт - директория, актуальность проверяем по файлу .xml
+    if backend == 'openvino':
+        stem = os.path.splitext(os.path.basename(weights))[0]
+        return os.path.join(path, stem + '.xml')
+    return path
+
+def _is_fresh(weights, path, backend):
+    export_file = _export_file(weights, path, backend)
+    return os.path.exists(export_file) and os.path.getmtime(export_file) >= os.path.getmtime(weights)
+
+def is_export_fresh(weights, backend):
+    return _is_fresh(weights, exported_path(weights, backend), backend)
+
+def find_quantized(weights, backend):
+    """Путь к актуальному INT8 варианту или None.
+
+    Для pytorch подходит любой INT8 вариант (сначала OpenVINO, затем ONNX).
+    """
+    candidates = [backend] if backend != 'pytorch' else ['openvino', 'onnx']
+    for candidate in candidates:
+        path = quantized_path(weights, candidate)
+        if _is_fresh(weights, path, candidate):
+            return path
+    return None
+
+def export_model(weights, backend, imgsz=EXPORT_IMGSZ):
+    """Экспортирует .pt веса в формат backend и возвращает путь к экспорту.
+
+    dynamic=True сохраняет переменный размер батча и входа - нужен
+    для батчевого инференса кадров видео (--batch).
+    """
+    start_time = time.time()
+    print(f"Exporting {weights} to {backend}...")
+    path = YOLO(weights).export(format=backend, dynamic=True, imgsz=imgsz, half=False, verbose=False)
+    print(f"Exported {weights} to {path} ({time.time() - start_time:.2f} s)")
+    return str(path)
+
+def ensure_export(weights, backend):
+    """Возвращает путь к актуальному экспорту, при необходимости экспортирует заново"""
+    if not is_export_fresh(weights, backend):
+        export_model(weights, backend)
+    return exported_path(weights, backend)
+
+def load_model(weights, backend=None, fallback=True, int8=None):
+    """Загружает YOLO модель выбранным бэкендом.
+
+    backend по умолчанию берется из переменной окружения YOLO_BACKEND,
+    int8 - из YOLO_INT8. При ошибке экспорта (например, не установлен
+    onnxruntime) или отсутствии INT8 варианта и fallback=True загружается
+    обычная модель, чтобы анализ не останавливался.
+    """
+    backend = resolve_backend(backend)
+    int8 = DEFAULT_INT8 if int8 is None else int8
+    if not weights.endswith('.pt'):
+        return YOLO(weights)
+
+    if int8:
+        path = find_quantized(weights, backend)
+        if path is not None:
+            if backend == 'pytorch':
+                # У pytorch своего INT8 нет - модель фактически работает на другом бэкенде
+                actual = 'openvino' if path.endswith('_openvino_model') else 'onnx'
+                notice(f"INT8 requested with pytorch backend: using {actual} INT8 variant {path}")
+            return YOLO(path, task='detect')
+        message = f"INT8 variant of {weights} for {backend} not found or older than weights (run quantize.py)"
+        if not fallback:
+            raise FileNotFoundError(message)
+        notice(f"{message}. Using fp32 {backend} model")
+
+    if backend == 'pytorch':
+        return YOLO(weights)
+
+    try:
+        path = ensure_export(weights, backend)
+        # У экспортированной модели задача не сохраняется в имени файла - все модели здесь детекторы
+        return YOLO(path, task='detect')
+    except Exception as e:
+        if not fallback:
+            raise
+        notice(f"Error loading {backend} model for {weights}: {e}. Falling back to pytorch")
+        return YOLO(weights)
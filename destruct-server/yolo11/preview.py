@@ -0,0 +1,124 @@
+import base64
+import threading
+import time
+import cv2
+import numpy as np
+
+# Превью для клиента отделено от инференса: поток захвата отдает уменьшенную
+# копию свежего кадра, поток инференса - последние детекции, а отдельный поток
+# рисует одно на другом, кодирует JPEG и печатает с заданной частотой.
+# Очереди нет: если stdout (Node) не успевает, промежуточные кадры просто
+# заменяются более новыми.
+
+def draw_detections(frame, detections, scale=1.0, roi=None):
+    """Рисует боксы {"class", "confidence", "box", ["track_id"]} (координаты исходного кадра)"""
+    h, w = frame.shape[:2]
+    if roi is not None:
+        x1, y1, x2, y2 = [int(v * scale) for v in roi]
+        cv2.rectangle(frame, (x1, y1), (max(x1, x2 - 1), max(y1, y2 - 1)), (255, 255, 0), 1)
+    if not detections:
+        return frame
+
+    # Масштаб и обрезка по кадру - сразу для всех боксов
+    boxes = np.array([d["box"] for d in detections], dtype=np.float32) * scale
+    boxes = np.clip(boxes, 0, [w - 1, h - 1, w - 1, h - 1]).astype(np.int32).tolist()
+    for detection, (x1, y1, x2, y2) in zip(detections, boxes):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+        name = detection["class"]
+        if detection.get("track_id") is not None:
+            name = f"{name} #{detection['track_id']}"
+        text = f"{name} {detection['confidence']:.2f}"
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        (text_width, text_height), _ = cv2.getTextSize(text, font, 0.5, 2)
+        cv2.rectangle(frame, (x1, y1 - text_height - 10), (x1 + text_width, y1), (0, 255, 0), -1)
+        cv2.putText(frame, text, (x1, y1 - 5), font, 0.5, (0, 0, 0), 2)
+    return frame
+
+class PreviewPublisher:
+    """Поток превью для нескольких источников (key - камера или любой другой ключ).
+
+    fps - целевая частота превью на источник, size - большая сторона кадра
+    превью, quality - качество JPEG. send(key, message) печатает сообщение.
+    """
+
+    def __init__(self, send, fps=10.0, size=640, quality=70):
+        self.send = send
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.size = size
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        # key -> (уменьшенный кадр, масштаб) - последний кадр, еще не отправленный
+        self.frames = {}
+        # key -> (детекции, roi) - последние результаты модели
+        self.results = {}
+        # key -> время, когда источник последний раз отдал кадр в превью
+        self.last_taken = {}
+        self.published = 0
+        self.dropped = 0
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.wake:
+            self.is_running = False
+            self.wake.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def update_frame(self, key, frame):
+        """Свежий кадр источника; вызывается из потока захвата на каждом кадре.
+
+        Кадр берется не чаще fps и сразу уменьшается до size: копия нужна, потому
+        что буфер кадра источник может переиспользовать.
+        """
+        now = time.time()
+        if now - self.last_taken.get(key, 0.0) < self.interval:
+            return
+        self.last_taken[key] = now
+
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.size / max(h, w)) if self.size else 1.0
+        if scale < 1.0:
+            small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()
+        with self.wake:
+            if key in self.frames:
+                # Прошлый кадр не успели отправить - stdout или клиент медленнее fps
+                self.dropped += 1
+            self.frames[key] = (small, scale)
+            self.wake.notify()
+
+    def update_results(self, key, detections, roi=None):
+        """Последние детекции источника (боксы в координатах исходного кадра)"""
+        with self.lock:
+            self.results[key] = (list(detections), roi)
+
+    def _run(self):
+        while True:
+            with self.wake:
+                self.wake.wait_for(lambda: not self.is_running or self.frames, timeout=1.0)
+                if not self.is_running:
+                    break
+                pending, self.frames = self.frames, {}
+                results = dict(self.results)
+
+            for key, (frame, scale) in pending.items():
+                detections, roi = results.get(key, ([], None))
+                try:
+                    draw_detections(frame, detections, scale, roi)
+                    success, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                    if not success:
+                        self.send(key, {"status": "error", "message": "Ошибка кодирования JPEG"})
+                        continue
+                    self.send(key, {"status": "frame", "image": base64.b64encode(jpeg.tobytes()).decode('utf-8')})
+                    self.published += 1
+                except Exception as e:
+                    self.send(key, {"status": "error", "message": f"Ошибка кодирования кадра: {str(e)}"})
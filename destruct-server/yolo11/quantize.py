@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+from check_backend_parity import box_iou, collect_images, detections
+from model_backend import EXPORT_IMGSZ, ensure_export, load_model, quantized_path
+
+# Пороги IoU для mAP50-95 (как в COCO)
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def letterbox(image, imgsz):
+    """Препроцессинг кадра как в ultralytics: letterbox, RGB, CHW, float32 0..1"""
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob[None])
+
+def quantize_onnx(weights, images, mode, imgsz):
+    """INT8 вариант ONNX модели через onnxruntime.quantization.
+
+    dynamic - квантуются только веса, калибровка не нужна;
+    static - веса и активации, диапазоны берутся с калибровочных изображений.
+    """
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    fp32_path = ensure_export(weights, 'onnx')
+    int8_path = quantized_path(weights, 'onnx')
+
+    if mode == 'dynamic':
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+    else:
+        fp32_model = onnx.load(fp32_path)
+        input_name = fp32_model.graph.input[0].name
+
+        class ImageReader(CalibrationDataReader):
+            def __init__(self):
+                self.paths = iter(images)
+
+            def get_next(self):
+                for path in self.paths:
+                    image = cv2.imread(path)
+                    if image is not None:
+                        return {input_name: letterbox(image, imgsz)}
+                return None
+
+        # Голова Detect (декодирование боксов, DFL) чувствительна к квантованию -
+        # в ней квантуются только свертки
+        head = f"/model.{len(YOLO(weights).model.model) - 1}/"
+        nodes_to_exclude = [node.name for node in fp32_model.graph.node
+                            if node.name.startswith(head) and node.op_type != 'Conv']
+        quantize_static(
+            fp32_path, int8_path, ImageReader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=nodes_to_exclude
+        )
+
+    # Ultralytics читает имена классов и imgsz из метаданных ONNX - переносим их
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(int8_path)
+    if not int8_model.metadata_props:
+        for prop in fp32_model.metadata_props:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+        onnx.save(int8_model, int8_path)
+    return int8_path
+
+def quantize_openvino(weights, calib_dir, calib_size, imgsz):
+    """INT8 вариант OpenVINO модели (статическая калибровка NNCF через YOLO.export)"""
+    model = YOLO(weights)
+    # Калибровочный датасет ultralytics берет всю папку, ограничиваем его долей
+    fraction = min(1.0, calib_size / max(1, len(collect_images(calib_dir))))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # export(int8=True) ждет описание датасета - калибровке нужны только изображения
+        data_path = os.path.join(tmp_dir, 'calibration.yaml')
+        with open(data_path, 'w') as f:
+            yaml.safe_dump({
+                'path': os.path.abspath(calib_dir),
+                'train': '.',
+                'val': '.',
+                'names': model.names
+            }, f, allow_unicode=True)
+        path = model.export(format='openvino', int8=True, data=data_path, dynamic=True,
+                            imgsz=imgsz, fraction=fraction, verbose=False)
+    # Путь экспорта ultralytics совпадает с quantized_path
+    return str(path)
+
+def predict_all(model, frames, conf):
+    """Предсказания по всем кадрам и среднее время (ms/frame: препроцессинг + инференс + постобработка)"""
+    # Прогрев: первые вызовы включают инициализацию бэкенда
+    for frame in frames[:3]:
+        model.predict(frame, conf=conf, verbose=False)
+
+    results = []
+    timings = []
+    for frame in frames:
+        result = model.predict(frame, conf=conf, verbose=False)[0]
+        results.append(result)
+        timings.append(sum(result.speed.values()))
+    return results, float(np.mean(timings)) if timings else 0.0
+
+def average_precision(recall, precision):
+    """AP по 101 точке интерполяции (как в COCO)"""
+    recall = np.concatenate(([0.0], recall))
+    precision = np.concatenate(([1.0], precision))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    x = np.linspace(0, 1, 101)
+    return float(np.mean(np.interp(x, recall, precision, right=0)))
+
+def map_against_reference(references, candidates):
+    """mAP50 и mAP50-95 предсказаний candidates, если считать эталоном references.
+
+    Разметки у калибровочной папки нет, поэтому эталоном служат предсказания
+    FP32 модели: mAP показывает, насколько вариант воспроизводит исходную модель.
+    """
+    ref_data = [detections(r) for r in references]
+    cand_data = [detections(c) for c in candidates]
+    classes = sorted(set(int(c) for _, cls, _ in ref_data for c in cls))
+    if not classes:
+        return 1.0, 1.0
+
+    ap = np.zeros((len(classes), len(IOU_THRESHOLDS)))
+    for ci, cls in enumerate(classes):
+        n_targets = sum(int((ref_cls == cls).sum()) for _, ref_cls, _ in ref_data)
+        # Все предсказания класса по всем кадрам, по убыванию уверенности
+        predictions = [(conf, image_index, box)
+                       for image_index, (xyxy, pred_cls, pred_conf) in enumerate(cand_data)
+                       for box, c, conf in zip(xyxy, pred_cls, pred_conf) if c == cls]
+        predictions.sort(key=lambda p: -p[0])
+        if not predictions:
+            continue
+
+        for ti, threshold in enumerate(IOU_THRESHOLDS):
+            used = [np.zeros(int((ref_cls == cls).sum()), dtype=bool) for _, ref_cls, _ in ref_data]
+            tp = np.zeros(len(predictions))
+            for k, (_, image_index, box) in enumerate(predictions):
+                ref_xyxy, ref_cls, _ = ref_data[image_index]
+                targets = ref_xyxy[ref_cls == cls]
+                if not len(targets):
+                    continue
+                ious = np.where(used[image_index], -1.0, box_iou(box, targets))
+                j = int(np.argmax(ious))
+                if ious[j] >= threshold:
+                    used[image_index][j] = True
+                    tp[k] = 1
+            tp_cum = np.cumsum(tp)
+            recall = tp_cum / n_targets
+            precision = tp_cum / np.arange(1, len(tp) + 1)
+            ap[ci, ti] = average_precision(recall, precision)
+
+    return float(ap[:, 0].mean()), float(ap.mean())
+
+def evaluate(model, frames, references, conf):
+    results, ms = predict_all(model, frames, conf)
+    map50, map50_95 = map_against_reference(references, results)
+    return {'ms_per_frame': round(ms, 2), 'map50': round(map50, 4), 'map50_95': round(map50_95, 4)}
+
+def report_path(weights, backend):
+    return os.path.splitext(os.path.abspath(weights))[0] + f"_int8_{backend}_report.json"
+
+def main():
+    parser = argparse.ArgumentParser(description='Build INT8 variants of YOLO models and report accuracy/latency')
+    parser.add_argument('--weights', type=str, nargs='+', required=True, help='Path to .pt weights')
+    parser.add_argument('--calib-dir', type=str, required=True, help='Directory with calibration images')
+    parser.add_argument('--eval-dir', type=str, default=None, help='Directory with images for the report (default: --calib-dir)')
+    parser.add_argument('--backend', type=str, choices=['onnx', 'openvino'], default='openvino')
+    parser.add_argument('--mode', type=str, choices=['static', 'dynamic'], default='static',
+                        help='static: weights and activations (calibrated), dynamic: weights only (onnx)')
+    parser.add_argument('--imgsz', type=int, default=EXPORT_IMGSZ, help='Inference size')
+    parser.add_argument('--calib-size', type=int, default=300, help='Maximum number of calibration images')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold for the report')
+    args = parser.parse_args()
+
+    if args.backend == 'openvino' and args.mode == 'dynamic':
+        parser.error('OpenVINO supports only static quantization')
+
+    calib_images = collect_images(args.calib_dir)[:args.calib_size]
+    eval_images = collect_images(args.eval_dir or args.calib_dir)
+    if not calib_images or not eval_images:
+        print(f"No images found in {args.calib_dir if not calib_images else args.eval_dir}")
+        sys.exit(2)
+    frames = [frame for frame in (cv2.imread(p) for p in eval_images) if frame is not None]
+
+    for weights in args.weights:
+        print(f"Quantizing {weights} ({args.backend}, {args.mode}, {len(calib_images)} calibration images)...")
+        if args.backend == 'onnx':
+            int8_path = quantize_onnx(weights, calib_images, args.mode, args.imgsz)
+        else:
+            int8_path = quantize_openvino(weights, args.calib_dir, args.calib_size, args.imgsz)
+        print(f"Saved INT8 model: {int8_path}")
+
+        # Эталон - предсказания исходной PyTorch модели
+        references, pytorch_ms = predict_all(YOLO(weights), frames, args.conf)
+        fp32 = evaluate(load_model(weights, args.backend, fallback=False, int8=False), frames, references, args.conf)
+        int8 = evaluate(load_model(weights, args.backend, fallback=False, int8=True), frames, references, args.conf)
+
+        report = {
+            'weights': os.path.abspath(weights),
+            'backend': args.backend,
+            'mode': args.mode,
+            'int8_model': int8_path,
+            'calibration_images': len(calib_images),
+            'eval_images': len(frames),
+            'imgsz': args.imgsz,
+            'reference': 'pytorch fp32 predictions',
+            'pytorch': {'ms_per_frame': round(pytorch_ms, 2)},
+            'fp32': fp32,
+            'int8': int8,
+            'map50_delta': round(int8['map50'] - fp32['map50'], 4),
+            'map50_95_delta': round(int8['map50_95'] - fp32['map50_95'], 4),
+            'speedup': round(fp32['ms_per_frame'] / int8['ms_per_frame'], 2) if int8['ms_per_frame'] else None
+        }
+        path = report_path(weights, args.backend)
+        with open(path, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(json.dumps(report, ensure_ascii=False))
+        print(f"Report saved to: {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import traceback
+import cv2
+
+def part_filename(shard_index, filename):
+    """Имя сегмента видео, который пишет шард (склеивается после обработки)"""
+    return f".part{shard_index:02d}_{filename}"
+
+def split_ranges(total_frames, workers):
+    """Делит [0, total_frames) на workers непрерывных диапазонов.
+
+    Последний диапазон открыт (end=None): CAP_PROP_FRAME_COUNT бывает неточным,
+    поэтому последний шард читает видео до конца.
+    """
+    workers = max(1, min(workers, total_frames))
+    bounds = [round(i * total_frames / workers) for i in range(workers + 1)]
+    ranges = [(bounds[i], bounds[i + 1]) for i in range(workers)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+class _QueueWriter:
+    """stdout процесса-шарда: каждая строка целиком уходит родителю через очередь,
+    поэтому строки разных шардов (в том числе base64 кадры) не перемешиваются"""
+
+    def __init__(self, messages, shard_index):
+        self.messages = messages
+        self.shard_index = shard_index
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        if '\n' in self.buffer:
+            lines, self.buffer = self.buffer.rsplit('\n', 1)
+            self.messages.put(('line', self.shard_index, lines + '\n'))
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.messages.put(('line', self.shard_index, self.buffer))
+            self.buffer = ''
+
+def _shard_main(policy, args, shard_index, start_frame, end_frame, output_filename,
+                messages, stop_event, threads):
+    sys.stdout = _QueueWriter(messages, shard_index)
+    result = {'stopped': False, 'classes': [], 'error': None}
+    try:
+        import torch
+        # Шарды делят ядра между собой, иначе потоки torch конкурируют друг с другом
+        torch.set_num_threads(threads)
+
+        # core.video сам импортирует этот модуль, поэтому импорт здесь, а не в начале файла
+        from core.pipeline import VideoSource
+        from core.video import open_writers, prepare_runs, process_video
+        from model_backend import load_model
+
+        args.show = False
+        # Каждый шард держит свою копию моделей
+        runs = prepare_runs(args, load_model, prepare_dirs=False)
+
+        source = VideoSource(args.source, args.decoder, args.decode_size,
+                             start_frame=start_frame, end_frame=end_frame)
+        fps = int(source.fps)
+
+        if args.save:
+            open_writers(runs, part_filename(shard_index, output_filename), fps, source.width, source.height)
+
+        stopped, classes = process_video(args, runs, source, policy, source.total_frames, fps,
+                                         stop_event=stop_event)
+        if stopped:
+            # Обработка остановлена (опасный объект): остальные шарды прекращают работу
+            stop_event.set()
+        result['stopped'] = stopped
+        result['classes'] = sorted(classes)
+    except Exception as e:
+        traceback.print_exc()
+        result['error'] = str(e)
+    finally:
+        sys.stdout.flush()
+        messages.put(('done', shard_index, result))
+
+def concat_segments(segment_paths, output_path):
+    """Склеивает сегменты шардов в один MP4 в порядке кадров"""
+    segment_paths = [p for p in segment_paths if os.path.exists(p) and os.path.getsize(p) > 0]
+    if not segment_paths:
+        return False
+
+    # ffmpeg склеивает без перекодирования; если его нет - перекодируем через OpenCV
+    if shutil.which('ffmpeg'):
+        list_path = output_path + '.concat.txt'
+        with open(list_path, 'w') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            completed = subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                 '-i', list_path, '-c', 'copy', output_path],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            if completed.returncode == 0:
+                return True
+            print(f"ffmpeg concat failed, re-encoding segments: {completed.stderr.decode(errors='ignore').strip()}")
+        finally:
+            os.remove(list_path)
+
+    writer = None
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            if writer is None:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+    return True
+
+def run_sharded(policy, args, runs, output_filename, total_frames):
+    """Обрабатывает видео несколькими процессами по диапазонам кадров.
+
+    policy - core.video.DetectionPolicy скрипта (detect / quick_detect), каждый
+    шард получает свою копию. Возвращает то же, что core.video.process_video.
+    """
+    ranges = split_ranges(total_frames, args.workers)
+    threads = max(1, (os.cpu_count() or 1) // len(ranges))
+    print(f"Splitting video into {len(ranges)} shards: {ranges}")
+
+    # spawn: форк процесса с уже инициализированным torch может зависнуть
+    ctx = multiprocessing.get_context('spawn')
+    messages = ctx.Queue()
+    stop_event = ctx.Event()
+    processes = []
+    for shard_index, (start_frame, end_frame) in enumerate(ranges):
+        process = ctx.Process(
+            target=_shard_main,
+            args=(policy, args, shard_index, start_frame, end_frame, output_filename,
+                  messages, stop_event, threads),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    # Вывод текущего шарда печатается сразу, вывод следующих копится, пока
+    # не закончатся предыдущие - так кадры и детекции идут в порядке видео
+    results = {}
+    pending_lines = [[] for _ in processes]
+    current = 0
+
+    def emit(lines):
+        for line in lines:
+            sys.stdout.write(line)
+        sys.stdout.flush()
+
+    try:
+        while len(results) < len(processes):
+            try:
+                message = messages.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    # Шард упал, не успев отчитаться
+                    break
+                continue
+
+            if message[0] == 'line':
+                _, shard_index, line = message
+                if shard_index == current:
+                    emit([line])
+                else:
+                    pending_lines[shard_index].append(line)
+            else:
+                _, shard_index, result = message
+                results[shard_index] = result
+
+            while current < len(processes) and current in results:
+                current += 1
+                if current < len(processes):
+                    emit(pending_lines[current])
+                    pending_lines[current] = []
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    for lines in pending_lines:
+        emit(lines)
+
+    all_detected_classes = set()
+    stopped = False
+    for shard_index in range(len(processes)):
+        result = results.get(shard_index)
+        if result is None or result['error']:
+            print(f"Shard {shard_index} failed: {result['error'] if result else 'no result'}")
+            continue
+        all_detected_classes.update(result['classes'])
+        stopped = stopped or result['stopped']
+
+    # Склеиваем видео каждой модели в порядке кадров
+    if args.save:
+        for model_run in runs:
+            output_path = os.path.join(model_run['output_dir'], output_filename)
+            segments = [os.path.join(model_run['output_dir'], part_filename(i, output_filename))
+                        for i in range(len(processes))]
+            print(f"Saving to: {output_path}")
+            concat_segments(segments, output_path)
+            for path in segments:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    return stopped, all_detected_classes
@@ -0,0 +1,117 @@
+import time
+import numpy as np
+
+# Легкий трекер для живых потоков: детекции одного класса на соседних кадрах
+# связываются по IoU, каждая связка получает постоянный track_id. Трекер
+# ultralytics (model.track) держит одно состояние на модель и не подходит для
+# батча кадров разных камер, поэтому состояние здесь - свое на каждый поток.
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU каждой пары боксов xyxy: матрица len(boxes_a) x len(boxes_b)"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+class Track:
+    def __init__(self, track_id, cls, box):
+        self.track_id = track_id
+        self.cls = cls
+        self.box = box
+        self.hits = 1
+        # Сколько обработанных кадров подряд трек не находился
+        self.missed = 0
+
+class IoUTracker:
+    """Связывает детекции кадров в треки жадным сопоставлением по IoU внутри класса.
+
+    Трек живет max_missed кадров без подтверждения - этого хватает, чтобы
+    пережить пропуски детектора и короткие перекрытия.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=30):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections):
+        """Проставляет detection["track_id"] детекциям {"class", "box", ...} и возвращает их"""
+        unmatched_tracks = set(range(len(self.tracks)))
+        unmatched_detections = set(range(len(detections)))
+
+        if self.tracks and detections:
+            ious = iou_matrix([t.box for t in self.tracks], [d["box"] for d in detections])
+            # Разные классы не сопоставляются
+            same_class = np.array([[t.cls == d["class"] for d in detections] for t in self.tracks])
+            ious = np.where(same_class, ious, 0.0)
+            # Жадно: сначала пары с наибольшим IoU
+            for flat in np.argsort(-ious, axis=None):
+                ti, di = np.unravel_index(flat, ious.shape)
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti not in unmatched_tracks or di not in unmatched_detections:
+                    continue
+                track = self.tracks[ti]
+                track.box = detections[di]["box"]
+                track.hits += 1
+                track.missed = 0
+                detections[di]["track_id"] = track.track_id
+                unmatched_tracks.discard(ti)
+                unmatched_detections.discard(di)
+
+        for ti in unmatched_tracks:
+            self.tracks[ti].missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        for di in sorted(unmatched_detections):
+            detection = detections[di]
+            track = Track(self._next_id, detection["class"], detection["box"])
+            self._next_id += 1
+            self.tracks.append(track)
+            detection["track_id"] = track.track_id
+        return detections
+
+class AlertPolicy:
+    """Решает, поднимать ли тревогу (предупреждение + снимок) по детекции.
+
+    Трек тревожит один раз и повторно - не раньше track_cooldown секунд;
+    класс целиком - не чаще раза в class_cooldown секунд, даже если объект
+    пропал из кадра и вернулся под новым track_id.
+    """
+
+    def __init__(self, track_cooldown=300.0, class_cooldown=30.0):
+        self.track_cooldown = track_cooldown
+        self.class_cooldown = class_cooldown
+        self._track_alerts = {}
+        self._class_alerts = {}
+        self.suppressed = 0
+
+    def should_alert(self, track_id, cls, now=None):
+        now = time.time() if now is None else now
+        last_track = self._track_alerts.get(track_id) if track_id is not None else None
+        last_class = self._class_alerts.get(cls)
+        if last_track is not None and now - last_track < self.track_cooldown:
+            self.suppressed += 1
+            return False
+        if last_class is not None and now - last_class < self.class_cooldown:
+            self.suppressed += 1
+            # Трек считается оповещенным - иначе он поднимет тревогу сразу после паузы класса
+            if track_id is not None and last_track is None:
+                self._track_alerts[track_id] = now
+            return False
+
+        if track_id is not None:
+            self._track_alerts[track_id] = now
+        self._class_alerts[cls] = now
+        if len(self._track_alerts) > 1000:
+            # Старые треки давно закончились - не копим их бесконечно
+            self._track_alerts = {k: v for k, v in self._track_alerts.items() if now - v < self.track_cooldown}
+        return True
@@ -0,0 +1,110 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+
+import detect
+from model_backend import BACKENDS, DEFAULT_INT8, load_model, resolve_backend
+import quick_detect
+
+# Скрипты, которые воркер умеет выполнять без перезапуска интерпретатора
+SCRIPTS = {
+    'detect': detect,
+    'quick_detect': quick_detect,
+}
+
+def send_message(message):
+    """Служебное сообщение воркера (одна JSON строка в stdout)"""
+    print(json.dumps(message, ensure_ascii=False), flush=True)
+
+class ModelCache:
+    """Держит загруженные YOLO модели между задачами (отдельно для каждого бэкенда)"""
+
+    def __init__(self):
+        self._models = {}
+
+    def get(self, weights, backend=None, int8=None):
+        path = os.path.abspath(weights)
+        key = (path, resolve_backend(backend), DEFAULT_INT8 if int8 is None else int8)
+        model = self._models.get(key)
+        if model is None:
+            start_time = time.time()
+            model = load_model(path, key[1], int8=key[2])
+            self._models[key] = model
+            precision = 'int8' if key[2] else 'fp32'
+            print(f"Model cached: {path} [{key[1]}, {precision}] ({time.time() - start_time:.2f} s)")
+        return model
+
+    def preload(self, models_dir, backend=None):
+        for weights in sorted(glob.glob(os.path.join(models_dir, '*.pt'))):
+            try:
+                self.get(weights, backend)
+            except Exception as e:
+                print(f"Error preloading model {weights}: {e}", file=sys.stderr)
+        return [key[0] for key in self._models]
+
+def handle_job(job, cache):
+    """Выполняет одну задачу и возвращает (код завершения, флаг остановки)"""
+    script = SCRIPTS.get(job.get('script', 'detect'))
+    if script is None:
+        print(f"Unknown script: {job.get('script')}", file=sys.stderr)
+        return 2, False
+
+    try:
+        args = script.build_parser().parse_args(job.get('args', []))
+    except SystemExit as e:
+        # argparse сам печатает ошибку в stderr
+        return e.code or 2, False
+
+    try:
+        stopped = script.run(args, load_model=cache.get)
+        return 0, bool(stopped)
+    except Exception:
+        traceback.print_exc()
+        return 1, False
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models-dir', type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'),
+                        help='Directory with *.pt weights to preload')
+    parser.add_argument('--preload', action='store_true', help='Load all models from --models-dir at startup')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help='Backend for preloaded models (default: YOLO_BACKEND env or pytorch)')
+    args = parser.parse_args()
+
+    # stdout уходит в pipe: строки должны доходить до Node сразу, а не блоками
+    sys.stdout.reconfigure(line_buffering=True)
+
+    cache = ModelCache()
+    loaded = cache.preload(args.models_dir, args.backend) if args.preload else []
+    send_message({'status': 'worker_ready', 'models': [os.path.basename(m) for m in loaded]})
+
+    # Задачи приходят по stdin в виде JSON строк:
+    # {"id": "...", "script": "detect" | "quick_detect", "args": [...аргументы detect.py...]}
+    for raw_line in sys.stdin:
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Bad job JSON: {e}", file=sys.stderr)
+            continue
+
+        start_time = time.time()
+        code, stopped = handle_job(job, cache)
+        send_message({
+            'status': 'job_done',
+            'id': job.get('id'),
+            'code': code,
+            'stopped': stopped,
+            'elapsed': round(time.time() - start_time, 3)
+        })
+
+if __name__ == '__main__':
+    main()